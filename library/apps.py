@@ -1,6 +1,20 @@
 from django.apps import AppConfig
+from django.db import connections
+from django.db.models.signals import post_migrate
+
+
+def install_search_index(sender, using, **kwargs):
+    # SQLite migrations that rebuild library_book drop its triggers
+    from library.search import install_search_index
+
+    install_search_index(connections[using])
 
 
 class LibraryConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'library'
+
+    def ready(self):
+        from library import signals  # noqa: F401 connects signal receivers
+
+        post_migrate.connect(install_search_index, sender=self)
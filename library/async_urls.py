@@ -0,0 +1,18 @@
+from django.urls import path
+from library import async_views
+
+app_name = "async"
+
+# the same urls as library.urls, served by the async views
+urlpatterns = [
+    path("", async_views.all_books, name="your_all_books"),
+
+    path("book/<str:book_title> by <str:author>/", async_views.book, name="your_book"),
+
+    path("users/", async_views.users_list, name="users_list"),
+    path("users/<str:username>/", async_views.all_books, name="someones_all_books"),
+    path("users/<str:username>/<str:category>/", async_views.category, name="someones_category"),
+    path("users/<str:username>/book/<str:book_title> by <str:author>/", async_views.book, name="someones_book"),
+
+    path("<str:category>/", async_views.category, name="your_category"),
+]
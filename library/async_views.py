@@ -0,0 +1,192 @@
+'''Async versions of the read-only library views for ASGI.
+
+They are served under async/ (see my_lib/urls.py) and render the same
+templates with the same shelf cache as library.views. Independent
+queries(e.g. the viewed user and the shelves) are run concurrently.
+
+On Django 4.2 the async ORM still runs every query with sync_to_async,
+so the queries of one request take turns in its thread. They pay off
+with the database backends that get native async support.
+'''
+from django.contrib.auth.views import redirect_to_login
+from django.http import Http404
+from django.shortcuts import render
+
+from asgiref.sync import sync_to_async
+
+from library.models import BookCategory, Book
+from library.caching import aget_or_compute_shelves
+from library.pagination import ShelfPage, afirst_pages_by_category, apaginate_shelf
+from library.directory import aget_directory_page
+
+from users.models import User
+
+from collections import OrderedDict
+from functools import wraps
+import asyncio
+
+
+def async_login_required(view):
+    '''login_required for the async views.
+
+    Django 4.2 has no request.auser(), so the lazy request.user is loaded
+    with one sync_to_async call and is usable in the view after that'''
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        is_authenticated = await sync_to_async(lambda: request.user.is_authenticated)()
+        if not is_authenticated:
+            return redirect_to_login(request.get_full_path())
+
+        return await view(request, *args, **kwargs)
+
+    return wrapper
+
+
+async def _gather(*awaitables):
+    '''asyncio.gather() that cancels the rest if one of them fails,
+    e.g. raises Http404'''
+    tasks = [asyncio.ensure_future(awaitable) for awaitable in awaitables]
+    try:
+        return await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        raise
+
+
+async def _aget_or_404(queryset, **kwargs):
+    try:
+        return await queryset.aget(**kwargs)
+    except queryset.model.DoesNotExist:
+        raise Http404(f"No {queryset.model._meta.object_name} matches the given query.")
+
+
+async def _aget_viewed_user(username):
+    if username is None:
+        return None
+
+    return await _aget_or_404(User.objects, username=username)
+
+
+def _owner_pk(request, username):
+    # username is the primary key, so the owner's books and the shelf
+    # cache don't need the owner to be loaded first
+    return request.user.pk if username is None else username
+
+
+async def _asort_user_books_by_categories(user_pk):
+    '''Async version of library.views._sort_user_books_by_categories()'''
+    category_objs = await _alist(BookCategory.objects.filter(user_id=user_pk).order_by("position"))
+    books = Book.objects.select_related("user", "category")
+    # the first pages are read shelf by shelf, so they need the categories first
+    pages = await afirst_pages_by_category(books, [category_obj.pk for category_obj in category_objs])
+
+    books_by_categories = OrderedDict()
+    for category_obj in category_objs:
+        page = pages.get(category_obj.pk, ShelfPage())
+        page.total = category_obj.books_count
+        books_by_categories[category_obj.category_name] = page
+
+    return books_by_categories
+
+
+async def _asort_existing_user_books_by_categories(user_pk):
+    '''_asort_user_books_by_categories() of another user, raises Http404
+    if there is no such user, so no empty shelves are cached for it'''
+    exists, books_by_categories = await _gather(
+        User.objects.filter(pk=user_pk).aexists(),
+        _asort_user_books_by_categories(user_pk),
+    )
+    if not exists:
+        raise Http404("No User matches the given query.")
+
+    return books_by_categories
+
+
+async def _alist(queryset):
+    return [obj async for obj in queryset]
+
+
+@async_login_required
+async def all_books(request, username=None):
+    owner_pk = _owner_pk(request, username)
+    viewed_user, books_by_categories = await _gather(
+        _aget_viewed_user(username),
+        aget_or_compute_shelves(owner_pk, "all_books", lambda: (
+            _asort_user_books_by_categories(owner_pk) if username is None
+            else _asort_existing_user_books_by_categories(owner_pk)
+        )),
+    )
+
+    context = {
+        "user": request.user,
+
+        "viewed_user": viewed_user,
+        "books_by_categories": books_by_categories,
+    }
+
+    return render(request, "all_books.html", context=context)
+
+
+@async_login_required
+async def category(request, category, username=None):
+    owner_pk = _owner_pk(request, username)
+    cursor = request.GET.get("after")
+
+    async def load_category_page():
+        category_obj = await _aget_or_404(
+            BookCategory.objects, user_id=owner_pk, category_name=category,
+        )
+        page = await apaginate_shelf(category_obj.book_set.select_related("user"), cursor=cursor)
+        page.total = category_obj.books_count
+        return page
+
+    if cursor:
+        # only the first pages are cached, the cursors are chosen by the client
+        load_books = load_category_page()
+    else:
+        load_books = aget_or_compute_shelves(owner_pk, f"category:{category}", load_category_page)
+    viewed_user, books = await _gather(_aget_viewed_user(username), load_books)
+
+    context = {
+        "user": request.user,
+
+        "viewed_user": viewed_user,
+        "category": category,
+        "books": books,
+    }
+
+    return render(request, "category.html", context=context)
+
+
+@async_login_required
+async def book(request, book_title, author, username=None):
+    owner_pk = _owner_pk(request, username)
+    viewed_user, book = await _gather(
+        _aget_viewed_user(username),
+        _aget_or_404(
+            Book.objects.select_related("user", "category"),
+            user_id=owner_pk, title=book_title, author=author,
+        ),
+    )
+
+    context = {
+        "user": request.user,
+
+        "viewed_user": viewed_user,
+        "book": book,
+    }
+
+    return render(request, "book.html", context=context)
+
+
+async def users_list(request):
+    query = request.GET.get("q", "").strip()
+    users = await aget_directory_page(prefix=query, after=request.GET.get("after"))
+
+    context = {
+        "query": query,
+        "users": users,
+    }
+
+    return render(request, "users_list.html", context=context)
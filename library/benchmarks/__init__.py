@@ -0,0 +1,81 @@
+'''Benchmarks of the library.
+
+They are not run with the tests, run them with:
+
+    python manage.py test library.benchmarks --pattern "bench_*.py"
+
+If BENCHMARK_OUTPUT environment variable is set, all the results are also
+written to this file as JSON sorted by benchmark name, so the files of
+two commits can be diffed.
+'''
+from django.db import connection
+from django.test import TestCase, tag
+from django.test.utils import CaptureQueriesContext
+
+import json
+import os
+import statistics
+import time
+
+# {benchmark name: result} of all the benchmarks run by this process
+RESULTS = {}
+
+
+def write_results(path):
+    with open(path, "w") as file:
+        json.dump(RESULTS, file, indent=2, sort_keys=True)
+        file.write("\n")
+
+
+@tag("benchmark")
+class BenchmarkCase(TestCase):
+    '''TestCase with measure() to time the code and print the results
+    after all the benchmarks of the class'''
+    REPEAT = 5
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.results = []
+
+    @classmethod
+    def tearDownClass(cls):
+        for result in cls.results:
+            print(
+                f"\n{result['name']}: median {result['median_ms']:.2f}ms, "
+                f"min {result['min_ms']:.2f}ms, {result['queries']} queries",
+                end="",
+            )
+
+        output = os.environ.get("BENCHMARK_OUTPUT")
+        if output:
+            write_results(output)
+
+        super().tearDownClass()
+
+    def measure(self, name, func, repeat=None, setup=None):
+        '''Calls func repeat times and records how long it took.
+        setup is called before every call of func and is not timed.
+
+        Returns the result dict'''
+        timings = []
+        for _ in range(repeat or self.REPEAT):
+            if setup is not None:
+                setup()
+
+            with CaptureQueriesContext(connection) as captured:
+                start = time.perf_counter()
+                func()
+                timings.append((time.perf_counter() - start) * 1000)
+
+        result = {
+            "name": name,
+            "median_ms": round(statistics.median(timings), 3),
+            "min_ms": round(min(timings), 3),
+            "repeat": len(timings),
+            "queries": len(captured),
+        }
+        self.results.append(result)
+        RESULTS[name] = {key: value for key, value in result.items() if key != "name"}
+
+        return result
@@ -0,0 +1,77 @@
+from django.urls import reverse
+
+from asgiref.sync import async_to_sync
+
+from users.models import User
+from library.benchmarks import BenchmarkCase
+from library.caching import bump_shelves_version
+from library.generators import generate_libraries
+
+import asyncio
+
+
+class AsyncViewsBenchmark(BenchmarkCase):
+    '''Times REQUESTS requests to the sync views through the WSGI test
+    client against the same number of concurrent requests to the async
+    views through the in-process ASGI test client(AsyncClient).
+    Every batch starts with a cold shelf cache'''
+    BOOKS = 1000
+    REQUESTS = 20
+
+    @classmethod
+    def setUpTestData(cls):
+        prefix = "benchasync_"
+        generate_libraries(
+            num_users=2,
+            categories_per_user=5,
+            books_per_user=cls.BOOKS,
+            followings_per_user=1,
+            prefix=prefix,
+        )
+        cls.user = User.objects.get(username=f"{prefix}0")
+        cls.other_user = User.objects.get(username=f"{prefix}1")
+
+    def setUp(self):
+        self.client.force_login(self.user)
+        self.async_client.force_login(self.user)
+
+    def cold(self):
+        bump_shelves_version(self.user.pk)
+        bump_shelves_version(self.other_user.pk)
+
+    def wsgi_requests(self, url):
+        for _ in range(self.REQUESTS):
+            self.assertEqual(self.client.get(url).status_code, 200)
+
+    def asgi_requests(self, url):
+        async def requests():
+            return await asyncio.gather(*[self.async_client.get(url) for _ in range(self.REQUESTS)])
+
+        for response in async_to_sync(requests)():
+            self.assertEqual(response.status_code, 200)
+
+    def compare(self, view, *args):
+        sync_url = reverse(view, args=args)
+        async_url = reverse(f"async:{view}", args=args)
+
+        self.measure(f"{view} WSGI x{self.REQUESTS}", lambda: self.wsgi_requests(sync_url), setup=self.cold)
+        self.measure(
+            f"{view} ASGI x{self.REQUESTS} concurrent",
+            lambda: self.asgi_requests(async_url),
+            setup=self.cold,
+        )
+
+    def test_all_books(self):
+        self.compare("your_all_books")
+
+    def test_someones_all_books(self):
+        self.compare("someones_all_books", self.other_user.username)
+
+    def test_category(self):
+        self.compare("your_category", "reading")
+
+    def test_book(self):
+        self.compare("your_book", "book 1", self.user.books.get(title="book 1").author)
+
+    def test_users_list(self):
+        self.compare("users_list")
@@ -0,0 +1,45 @@
+from users.models import User
+from library.models import BookCategory
+from library.benchmarks import BenchmarkCase
+
+
+class MoveCategoryBenchmark(BenchmarkCase):
+    CATEGORIES = 500
+    # must not depend on CATEGORIES
+    MAX_QUERIES = 10
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username="mover",
+            email="mover@gmail.com",
+            password="password1",
+        )
+        BookCategory.objects.bulk_create([
+            BookCategory(user=cls.user, category_name=f"category {i}", position=i)
+            for i in range(1, cls.CATEGORIES + 1)
+        ])
+
+    def category_at(self, position):
+        return BookCategory.objects.get(user=self.user, position=position)
+
+    def test_move_first_to_last(self):
+        result = self.measure(
+            f"move first of {self.CATEGORIES} categories to the end",
+            lambda: self.category_at(1).move_to(self.CATEGORIES),
+        )
+        self.assertLessEqual(result["queries"], self.MAX_QUERIES)
+
+    def test_move_last_to_first(self):
+        result = self.measure(
+            f"move last of {self.CATEGORIES} categories to the start",
+            lambda: self.category_at(self.CATEGORIES).move_to(1),
+        )
+        self.assertLessEqual(result["queries"], self.MAX_QUERIES)
+
+    def test_swap_first_and_last(self):
+        result = self.measure(
+            f"swap first and last of {self.CATEGORIES} categories",
+            lambda: self.category_at(1).swap_position(self.CATEGORIES),
+        )
+        self.assertLessEqual(result["queries"], self.MAX_QUERIES)
@@ -0,0 +1,49 @@
+from django.contrib.auth.hashers import make_password
+from django.urls import reverse
+
+from users.models import User
+from library.benchmarks import BenchmarkCase
+
+
+class DirectoryBenchmark(BenchmarkCase):
+    '''users_list pages of USERS users, every fourth of them is hidden.
+    The time must not grow with USERS'''
+    USERS = 100_000
+    MAX_QUERIES = 2
+
+    @classmethod
+    def setUpTestData(cls):
+        password = make_password("password1")
+        User.objects.bulk_create(
+            [
+                User(
+                    username=f"dir{i:06}",
+                    email=f"dir{i:06}@gmail.com",
+                    password=password,
+                    to_show=bool(i % 4),
+                )
+                for i in range(cls.USERS)
+            ],
+            batch_size=5000,
+        )
+
+    def get(self, data=None):
+        self.assertEqual(self.client.get(reverse("users_list"), data).status_code, 200)
+
+    def test_first_page(self):
+        result = self.measure(f"users_list of {self.USERS} users", self.get)
+        self.assertLessEqual(result["queries"], self.MAX_QUERIES)
+
+    def test_last_page(self):
+        result = self.measure(
+            f"users_list of {self.USERS} users, last page",
+            lambda: self.get({"after": f"dir{self.USERS - 10:06}"}),
+        )
+        self.assertLessEqual(result["queries"], self.MAX_QUERIES)
+
+    def test_search(self):
+        result = self.measure(
+            f"users_list of {self.USERS} users, search",
+            lambda: self.get({"q": "dir0999"}),
+        )
+        self.assertLessEqual(result["queries"], self.MAX_QUERIES)
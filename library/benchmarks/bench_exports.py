@@ -0,0 +1,43 @@
+from users.models import User
+from library.benchmarks import BenchmarkCase
+from library.exports import CSV, JSON_LINES, export_library
+from library.generators import generate_libraries
+
+import tracemalloc
+
+
+class ExportBenchmark(BenchmarkCase):
+    '''Streaming export of a library of BOOKS books'''
+    BOOKS = 100000
+    REPEAT = 3
+    # bytes, the peak must not depend on the number of books
+    MAX_PEAK_MEMORY = 2 * 2**20
+
+    @classmethod
+    def setUpTestData(cls):
+        generate_libraries(
+            num_users=1, categories_per_user=5, books_per_user=cls.BOOKS,
+            followings_per_user=0, prefix="benchexport_",
+        )
+        cls.user = User.objects.get(username="benchexport_0")
+
+    def export(self, file_format):
+        for _ in export_library(self.user, file_format):
+            pass
+
+    def test_csv(self):
+        self.measure(f"csv export of {self.BOOKS} books", lambda: self.export(CSV))
+
+    def test_json_lines(self):
+        self.measure(f"jsonl export of {self.BOOKS} books", lambda: self.export(JSON_LINES))
+
+    def test_peak_memory(self):
+        tracemalloc.start()
+        try:
+            self.export(CSV)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        print(f"\ncsv export of {self.BOOKS} books: peak memory {peak / 2**20:.2f}MB", end="")
+        self.assertLess(peak, self.MAX_PEAK_MEMORY)
@@ -0,0 +1,74 @@
+from django.urls import reverse
+from django.utils import timezone
+
+from users.models import User, UserFollowing
+from library.benchmarks import BenchmarkCase
+from library.feed import get_feed_page
+from library.generators import generate_libraries
+from library.models import Book, BookActivity
+
+import datetime
+import random
+
+
+class FeedBenchmark(BenchmarkCase):
+    '''Following feed of a user who follows FOLLOWEES of 2 * FOLLOWEES users.
+    Every book has an activity in the last 60 days, half of them are older
+    than LIBRARY_FEED_MAX_AGE'''
+    FOLLOWEES = 10_000
+    BOOKS_PER_USER = 3
+    MAX_QUERIES = 2
+
+    @classmethod
+    def setUpTestData(cls):
+        users = generate_libraries(
+            num_users=2 * cls.FOLLOWEES + 1,
+            categories_per_user=1,
+            books_per_user=cls.BOOKS_PER_USER,
+            followings_per_user=0,
+            prefix="benchfeed_",
+        )
+        cls.user = users[0]
+        UserFollowing.objects.bulk_create(
+            [UserFollowing(who_follows=cls.user, whom_follows=user) for user in users[1:cls.FOLLOWEES + 1]],
+            batch_size=1000,
+        )
+
+        rand = random.Random(0)
+        now = timezone.now()
+        BookActivity.objects.bulk_create(
+            [
+                BookActivity(
+                    user_id=user_id,
+                    book_id=book_id,
+                    kind=BookActivity.ADDED,
+                    created=now - datetime.timedelta(seconds=rand.randrange(60 * 24 * 60 * 60)),
+                )
+                for book_id, user_id in Book.objects.values_list("id", "user_id").iterator()
+            ],
+            batch_size=1000,
+        )
+        cls.cursor = get_feed_page(cls.user).next_cursor
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def test_first_page(self):
+        result = self.measure(
+            f"following feed of {self.FOLLOWEES} followees",
+            lambda: self.client.get(reverse("following_feed")),
+        )
+        self.assertLessEqual(result["queries"], self.MAX_QUERIES)
+
+    def test_next_page(self):
+        result = self.measure(
+            f"following feed of {self.FOLLOWEES} followees, next page",
+            lambda: self.client.get(reverse("following_feed"), {"after": self.cursor}),
+        )
+        self.assertLessEqual(result["queries"], self.MAX_QUERIES)
+
+    def test_query(self):
+        self.measure(
+            f"following feed query of {self.FOLLOWEES} followees",
+            lambda: get_feed_page(self.user),
+        )
@@ -0,0 +1,60 @@
+from django.core.cache import cache
+from django.urls import reverse
+
+from users.models import User
+from library.benchmarks import BenchmarkCase
+from library.generators import generate_libraries
+from library.groups import get_group_stats, paginate_group_shelf
+from library.models import LibraryGroup
+
+
+class GroupBenchmark(BenchmarkCase):
+    '''Group of MEMBERS members with BOOKS_PER_MEMBER books each,
+    as many users with books are not in the group'''
+    MEMBERS = 500
+    BOOKS_PER_MEMBER = 200
+    # session(cache is cleared), user, group, shelf and 4 aggregates
+    MAX_QUERIES = 8
+
+    @classmethod
+    def setUpTestData(cls):
+        prefix = "benchgroup_"
+        generate_libraries(
+            num_users=2 * cls.MEMBERS,
+            categories_per_user=3,
+            books_per_user=cls.BOOKS_PER_MEMBER,
+            followings_per_user=0,
+            num_groups=1,
+            members_per_group=cls.MEMBERS,
+            prefix=prefix,
+        )
+        cls.user = User.objects.get(username=f"{prefix}0")
+        cls.group = LibraryGroup.objects.get(name=f"{prefix} group 0")
+        cls.cursor = paginate_group_shelf(cls.group).next_cursor
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def get(self, data=None):
+        self.assertEqual(self.client.get(reverse("group", args=[self.group.name]), data).status_code, 200)
+
+    def test_group_page(self):
+        books = self.MEMBERS * self.BOOKS_PER_MEMBER
+        result = self.measure(f"group page of {self.MEMBERS} members, {books} books", self.get, setup=cache.clear)
+        self.assertLessEqual(result["queries"], self.MAX_QUERIES)
+
+        self.measure(f"group page of {self.MEMBERS} members, {books} books, cached stats", self.get)
+        self.measure(
+            f"group page of {self.MEMBERS} members, {books} books, next page",
+            lambda: self.get({"after": self.cursor}),
+        )
+
+    def test_stats(self):
+        self.measure(
+            f"group stats of {self.MEMBERS} members",
+            lambda: get_group_stats(self.group),
+            setup=cache.clear,
+        )
+
+    def test_shelf(self):
+        self.measure(f"group shelf of {self.MEMBERS} members", lambda: paginate_group_shelf(self.group))
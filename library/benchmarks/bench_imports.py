@@ -0,0 +1,61 @@
+from library.benchmarks import BenchmarkCase
+from library.imports import CSV, import_books
+from library.models import Book, BookCategory
+from library.tests.test_views import add_user
+
+from io import StringIO
+
+
+def library_csv(num_books):
+    rows = [
+        f"book {i},author {i % 1000},category {i % 5},2020-01-01,2020-02-01,{i % 10 + 1},comment {i}\n"
+        for i in range(num_books)
+    ]
+    return "title,author,category,started,finished,rating,comment\n" + "".join(rows)
+
+
+class ImportBenchmark(BenchmarkCase):
+    '''Import of a CSV file of BOOKS books'''
+    BOOKS = 50000
+    REPEAT = 3
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = add_user("benchimport")
+        cls.csv = library_csv(cls.BOOKS)
+
+    def delete_library(self):
+        Book.objects.filter(user=self.user).delete()
+        BookCategory.objects.filter(user=self.user).delete()
+
+    def import_csv(self, text):
+        result = import_books(StringIO(text), self.user, CSV)
+        self.assertEqual(result.error_count, 0)
+
+    def test_import(self):
+        self.measure(
+            f"import of {self.BOOKS} new books",
+            lambda: self.import_csv(self.csv),
+            setup=self.delete_library,
+        )
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.books_count, self.BOOKS)
+
+    def test_one_by_one(self):
+        # what the import replaces: a validated save() per book, like new_book does
+        books = 1000
+
+        def save_books():
+            category = BookCategory.objects.create(user=self.user, category_name="one by one")
+            for i in range(books):
+                book = Book(user=self.user, category=category, title=f"book {i}", author="author")
+                book.full_clean()
+                book.save()
+
+        self.measure(f"{books} books saved one by one", save_books, repeat=1, setup=self.delete_library)
+
+    def test_reimport(self):
+        self.import_csv(self.csv)
+
+        self.measure(f"import of {self.BOOKS} existing books", lambda: self.import_csv(self.csv))
+        self.assertEqual(Book.objects.filter(user=self.user).count(), self.BOOKS)
@@ -0,0 +1,50 @@
+from users.models import User
+from library.benchmarks import BenchmarkCase
+from library.generators import generate_libraries
+from library.search import FOLLOWING, search_books
+
+
+class SearchBenchmark(BenchmarkCase):
+    '''Full-text search over USERS * BOOKS_PER_USER generated books.
+    The user follows FOLLOWINGS users'''
+    USERS = 1000
+    BOOKS_PER_USER = 1000
+    FOLLOWINGS = 100
+    MAX_QUERIES = 2
+
+    @classmethod
+    def setUpTestData(cls):
+        generate_libraries(
+            num_users=cls.USERS,
+            categories_per_user=3,
+            books_per_user=cls.BOOKS_PER_USER,
+            followings_per_user=cls.FOLLOWINGS,
+            prefix="benchsearch_",
+        )
+        cls.user = User.objects.get(username="benchsearch_0")
+
+    def search(self, name, query, scope="own"):
+        books = self.USERS * self.BOOKS_PER_USER
+        result = self.measure(
+            f"search {name} in {books} books, {scope}",
+            lambda: search_books(query, self.user, scope=scope),
+        )
+        self.assertLessEqual(result["queries"], self.MAX_QUERIES)
+
+    def test_rare_word(self):
+        # "book 12" matches "book 12" only as a phrase, 12 is in a few titles
+        self.search("rare word", "12")
+
+    def test_common_word(self):
+        # every title is "book <i>"
+        self.search("common word", "book")
+
+    def test_two_words(self):
+        # every author is "author <i>"
+        self.search("two words", "book author")
+
+    def test_following_rare_word(self):
+        self.search("rare word", "12", scope=FOLLOWING)
+
+    def test_following_common_word(self):
+        self.search("common word", "book", scope=FOLLOWING)
@@ -0,0 +1,47 @@
+from django.core.cache import cache
+
+from users.models import User
+from library.benchmarks import BenchmarkCase
+from library.generators import generate_libraries
+from library.stats import finished_per_month, get_reading_stats
+
+
+class StatsBenchmark(BenchmarkCase):
+    '''Reading stats of a library of BOOKS books, among the books of OTHER_USERS users'''
+    BOOKS = 100000
+    OTHER_USERS = 100
+    # summary months, shelves and authors
+    MAX_QUERIES = 3
+
+    @classmethod
+    def setUpTestData(cls):
+        generate_libraries(
+            num_users=1, categories_per_user=5, books_per_user=cls.BOOKS,
+            followings_per_user=0, prefix="benchstats_",
+        )
+        generate_libraries(
+            num_users=cls.OTHER_USERS, categories_per_user=3, books_per_user=1000,
+            followings_per_user=0, prefix="benchstats_other_",
+        )
+        cls.user = User.objects.get(username="benchstats_0")
+
+    def test_stats(self):
+        result = self.measure(
+            f"reading stats of {self.BOOKS} books",
+            lambda: get_reading_stats(self.user),
+            setup=cache.clear,
+        )
+        self.assertLessEqual(result["queries"], self.MAX_QUERIES)
+
+    def test_summary_months(self):
+        result = self.measure(
+            f"monthly summaries of {self.BOOKS} books",
+            lambda: finished_per_month(self.user),
+        )
+        self.assertEqual(result["queries"], 1)
+
+    def test_cached_stats(self):
+        get_reading_stats(self.user)
+
+        result = self.measure(f"reading stats of {self.BOOKS} books, cached", lambda: get_reading_stats(self.user))
+        self.assertEqual(result["queries"], 0)
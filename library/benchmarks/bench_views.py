@@ -0,0 +1,134 @@
+from django.test import override_settings
+from django.urls import reverse
+
+from users.models import User
+from library.benchmarks import BenchmarkCase
+from library.caching import bump_shelves_version
+from library.generators import generate_libraries
+
+import itertools
+
+
+class ViewsBenchmarkMixin():
+    '''Times the views through the test client for a user
+    with BOOKS books'''
+    BOOKS = None
+    CATEGORIES = 5
+
+    @classmethod
+    def setUpTestData(cls):
+        prefix = f"bench{cls.BOOKS}_"
+        generate_libraries(
+            num_users=2,
+            categories_per_user=cls.CATEGORIES,
+            books_per_user=cls.BOOKS,
+            followings_per_user=1,
+            prefix=prefix,
+        )
+        cls.user = User.objects.get(username=f"{prefix}0")
+        cls.other_user = User.objects.get(username=f"{prefix}1")
+        cls.new_titles = itertools.count()
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def name(self, view):
+        return f"{view} [{self.BOOKS} books]"
+
+    def cold(self):
+        bump_shelves_version(self.user.pk)
+        bump_shelves_version(self.other_user.pk)
+
+    def get(self, url, data=None):
+        response = self.client.get(url, data)
+        self.assertEqual(response.status_code, 200)
+
+    def test_all_books(self):
+        url = reverse("your_all_books")
+        self.measure(self.name("all_books"), lambda: self.get(url), setup=self.cold)
+        self.measure(self.name("all_books cached"), lambda: self.get(url))
+
+    def test_someones_all_books(self):
+        url = reverse("someones_all_books", args=[self.other_user.username])
+        self.measure(self.name("someones_all_books"), lambda: self.get(url), setup=self.cold)
+
+    def test_category(self):
+        url = reverse("your_category", args=["reading"])
+        self.measure(self.name("category"), lambda: self.get(url), setup=self.cold)
+        self.measure(self.name("category cached"), lambda: self.get(url))
+
+    def test_book(self):
+        url = reverse("your_book", args=["book 1", self.user.books.get(title="book 1").author])
+        self.measure(self.name("book"), lambda: self.get(url))
+
+    def test_categories_order(self):
+        url = reverse("categories_order")
+        self.measure(self.name("categories_order"), lambda: self.get(url), setup=self.cold)
+
+    def test_new_book_form(self):
+        url = reverse("new_book")
+        self.measure(self.name("new_book GET"), lambda: self.get(url, {"category": "reading"}))
+
+    def test_new_book(self):
+        url = reverse("new_book")
+        category = self.user.book_categories.get(category_name="reading")
+
+        def post():
+            self.client.post(url, {
+                "title": f"new book {next(self.new_titles)}",
+                "author": "new author",
+                "category": category.pk,
+            })
+
+        self.measure(self.name("new_book POST"), post)
+
+
+class SmallLibraryViewsBenchmark(ViewsBenchmarkMixin, BenchmarkCase):
+    BOOKS = 50
+
+
+class MediumLibraryViewsBenchmark(ViewsBenchmarkMixin, BenchmarkCase):
+    BOOKS = 1000
+
+
+class LargeLibraryViewsBenchmark(ViewsBenchmarkMixin, BenchmarkCase):
+    BOOKS = 10000
+
+
+# small pages, so the shelves of the small library are full too and both
+# libraries render the same number of books
+@override_settings(LIBRARY_SHELF_PAGE_SIZE=5)
+class LibrarySizeViewsBenchmark(BenchmarkCase):
+    '''Cold all_books of a small and a large library. Only the first
+    pages of the shelves are read, so the large one must not be slower'''
+    SIZES = [50, 10000]
+    # the large library may be this much slower, for the noise of the timings
+    MAX_SLOWDOWN = 1.5
+    REPEAT = 15
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = {}
+        for books in cls.SIZES:
+            cls.users[books], = generate_libraries(
+                num_users=1,
+                categories_per_user=ViewsBenchmarkMixin.CATEGORIES,
+                books_per_user=books,
+                followings_per_user=0,
+                prefix=f"size{books}_",
+            )
+
+    def test_all_books_does_not_depend_on_library_size(self):
+        url = reverse("your_all_books")
+        medians = {}
+        for books, user in self.users.items():
+            self.client.force_login(user)
+            result = self.measure(
+                f"all_books [{books} books, size check]",
+                lambda: self.assertEqual(self.client.get(url).status_code, 200),
+                setup=lambda: bump_shelves_version(user.pk),
+            )
+            medians[books] = result["median_ms"]
+
+        small, large = (medians[books] for books in self.SIZES)
+        self.assertLess(large, small * self.MAX_SLOWDOWN)
@@ -0,0 +1,93 @@
+'''Per-user cache of the shelves.
+
+Every cache key of the user contains the user's shelves version.
+When anything in the user's library changes the version is bumped,
+so the old entries are never read again and just expire.
+
+The version is bumped at the change and again when its transaction is
+committed: till then other connections still read the old rows and can
+cache them under the bumped version.
+'''
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+import hashlib
+import time
+
+
+def _version_key(username):
+    return f"library:shelves_version:{username}"
+
+
+def get_shelves_version(username):
+    '''Returns current shelves version of the user.
+
+    If the version is missing(first visit or evicted from the cache) it is
+    initialized with the current time, so it is always bigger than any
+    version that could have been used before'''
+    version = cache.get(_version_key(username))
+    if version is None:
+        cache.add(_version_key(username), time.time_ns(), timeout=None)
+        version = cache.get(_version_key(username))
+
+    return version
+
+
+async def aget_shelves_version(username):
+    '''Async version of get_shelves_version()'''
+    version = await cache.aget(_version_key(username))
+    if version is None:
+        await cache.aadd(_version_key(username), time.time_ns(), timeout=None)
+        version = await cache.aget(_version_key(username))
+
+    return version
+
+
+def _incr_shelves_version(username):
+    try:
+        cache.incr(_version_key(username))
+    except ValueError:
+        # version is not in the cache yet, the next get_shelves_version
+        # will start a new one
+        pass
+
+
+def bump_shelves_version(username):
+    '''Makes all the cached shelves of the user stale, now(for the rest of
+    the transaction) and after the commit(for the other connections)'''
+    _incr_shelves_version(username)
+    if transaction.get_connection().in_atomic_block:
+        transaction.on_commit(lambda: _incr_shelves_version(username))
+
+
+def _shelves_key(username, version, key):
+    # key can have any characters(e.g. a category name with spaces) and
+    # length, the cache backends(memcached) only take short keys without spaces
+    return f"library:shelves:{username}:{version}:{hashlib.sha256(key.encode()).hexdigest()}"
+
+
+def get_or_compute_shelves(username, key, compute):
+    '''Returns cached value of the user's shelves key or calls compute()
+    and caches its result for LIBRARY_SHELF_CACHE_TIMEOUT seconds'''
+    cache_key = _shelves_key(username, get_shelves_version(username), key)
+
+    value = cache.get(cache_key)
+    if value is None:
+        value = compute()
+        cache.set(cache_key, value, timeout=settings.LIBRARY_SHELF_CACHE_TIMEOUT)
+
+    return value
+
+
+async def aget_or_compute_shelves(username, key, compute):
+    '''Async version of get_or_compute_shelves(), compute() must return
+    an awaitable'''
+    cache_key = _shelves_key(username, await aget_shelves_version(username), key)
+
+    value = await cache.aget(cache_key)
+    if value is None:
+        value = await compute()
+        await cache.aset(cache_key, value, timeout=settings.LIBRARY_SHELF_CACHE_TIMEOUT)
+
+    return value
@@ -0,0 +1,155 @@
+'''Denormalized counters of User and BookCategory.
+
+Counts of the followers, followings, books and finished books are stored
+in the counted rows' users and categories, so the pages show them
+without COUNT(*). The signals of Book and UserFollowing(library.signals)
+add the deltas with UPDATE ... SET count = count + delta, so concurrent
+changes don't lose each other's updates.
+
+update(), bulk_create() and raw saves send no signals and the saves of
+the books that were not loaded from the database can't be compared with
+the old values, so the counters can drift. repair_counters(the
+repair_counters management command) recomputes them.
+'''
+from django.db.models import Count, F, IntegerField, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest
+
+from users.models import User, UserFollowing
+from library.models import Book, BookCategory
+
+from collections import defaultdict
+
+# {counter model: {counter field: (counted model, its foreign key to the counter model, condition)}}
+COUNTERS = {
+    User: {
+        "followers_count": (UserFollowing, "whom_follows", Q()),
+        "following_count": (UserFollowing, "who_follows", Q()),
+        "books_count": (Book, "user", Q()),
+        "finished_books_count": (Book, "user", Q(finished__isnull=False)),
+    },
+    BookCategory: {
+        "books_count": (Book, "category", Q()),
+    },
+}
+
+
+def count_subquery(model, foreign_key, condition=Q()):
+    '''Subquery counting the model rows of the outer row'''
+    return Coalesce(
+        Subquery(
+            model.objects
+            .filter(condition, **{foreign_key: OuterRef("pk")})
+            .order_by()
+            .values(foreign_key)
+            .annotate(count=Count("*"))
+            .values("count"),
+            output_field=IntegerField(),
+        ),
+        0,
+    )
+
+
+def add_to_counters(model, pk, **deltas):
+    '''Adds the deltas to the counter fields of one row with one UPDATE.
+    Counters never go below 0, even if they have drifted'''
+    deltas = {field: delta for field, delta in deltas.items() if delta}
+    if not deltas:
+        return
+
+    model.objects.filter(pk=pk).update(**{
+        field: Greatest(F(field) + delta, Value(0)) for field, delta in deltas.items()
+    })
+
+
+def book_deltas(book, sign):
+    '''Returns {(model, pk): {field: delta}} for adding(sign=1)
+    or removing(sign=-1) the book'''
+    finished = int(book.finished is not None)
+    return {
+        (User, book.user_id): {"books_count": sign, "finished_books_count": sign * finished},
+        (BookCategory, book.category_id): {"books_count": sign},
+    }
+
+
+def merge_deltas(*all_deltas):
+    '''Sums the deltas of the same rows and fields'''
+    merged = defaultdict(lambda: defaultdict(int))
+    for deltas in all_deltas:
+        for row, fields in deltas.items():
+            for field, delta in fields.items():
+                merged[row][field] += delta
+
+    return merged
+
+
+def _apply(deltas):
+    for (model, pk), fields in deltas.items():
+        add_to_counters(model, pk, **fields)
+
+
+def book_saved(book, created):
+    if created:
+        _apply(book_deltas(book, 1))
+        return
+
+    loaded = getattr(book, "_loaded_values", None)
+    if loaded is None:
+        return
+
+    old_book = Book(
+        user_id=loaded.get("user_id", book.user_id),
+        category_id=loaded.get("category_id", book.category_id),
+        finished=loaded.get("finished", book.finished),
+    )
+    # zero deltas are skipped, an unchanged book takes no queries
+    _apply(merge_deltas(book_deltas(old_book, -1), book_deltas(book, 1)))
+
+
+def book_deleted(book):
+    _apply(book_deltas(book, -1))
+
+
+def following_changed(following, sign):
+    add_to_counters(User, following.who_follows_id, following_count=sign)
+    add_to_counters(User, following.whom_follows_id, followers_count=sign)
+
+
+def repair_counters(model, batch_size=1000, rows=None):
+    '''Recomputes the counters of the model rows in batches of batch_size
+    rows, every batch is one UPDATE of the drifted rows.
+    rows is a queryset of the model to limit it to, all the rows by default.
+
+    Returns number of the repaired rows'''
+    counters = {
+        field: count_subquery(*counted) for field, counted in COUNTERS[model].items()
+    }
+    drifted = Q()
+    for field in counters:
+        drifted |= ~Q(**{field: F(f"actual_{field}")})
+
+    if rows is None:
+        rows = model.objects.all()
+    repaired = 0
+    last_pk = None
+    while True:
+        batch = rows if last_pk is None else rows.filter(pk__gt=last_pk)
+        batch = list(batch.order_by("pk").values_list("pk", flat=True)[:batch_size])
+        if not batch:
+            return repaired
+
+        repaired += (
+            model.objects
+            .filter(pk__in=batch)
+            .alias(**{f"actual_{field}": counter for field, counter in counters.items()})
+            .filter(drifted)
+            .update(**counters)
+        )
+        last_pk = batch[-1]
+
+
+def repair_all_counters(batch_size=1000):
+    '''Returns {model name: number of the repaired rows}'''
+    return {
+        model._meta.label: repair_counters(model, batch_size=batch_size)
+        for model in COUNTERS
+    }
@@ -0,0 +1,66 @@
+'''Public directory of the users(users_list view).
+
+Only active users with to_show=True are listed, ordered by username.
+Pages are cut by a keyset cursor: the username of the last user of the
+previous page, so the page after any cursor is a range read of the
+users_user_listed_idx partial index.
+
+Counts of the books, finished books and followers are the counter
+fields of User(library.counters), so a page is one plain query.
+'''
+from django.conf import settings
+
+from users.models import User
+from library.pagination import ShelfPage
+
+
+def get_page_size():
+    return settings.LIBRARY_DIRECTORY_PAGE_SIZE
+
+
+def listed_users():
+    return User.objects.filter(to_show=True, is_active=True)
+
+
+def filter_prefix(users, prefix):
+    '''Users whose username starts with prefix(case sensitive, as usernames are).
+
+    username__startswith is LIKE, which SQLite can't answer with an index
+    because its LIKE is case insensitive, so a range is used instead'''
+    if not prefix:
+        return users
+
+    upper_bound = prefix[:-1] + chr(min(ord(prefix[-1]) + 1, 0x10FFFF))
+    return users.filter(username__gte=prefix, username__lt=upper_bound)
+
+
+def directory_queryset(prefix=None, after=None, page_size=None):
+    '''Returns queryset of page_size + 1 listed users after the username
+    "after", the extra one is only fetched to know if there is a next page'''
+    page_size = page_size or get_page_size()
+    users = filter_prefix(listed_users(), prefix)
+    if after:
+        users = users.filter(username__gt=after)
+
+    return users.order_by("username")[:page_size + 1]
+
+
+def make_page(users, page_size=None):
+    '''Returns ShelfPage(the same interface as the shelves) of the users,
+    next_cursor is the username to pass as "after"'''
+    page_size = page_size or get_page_size()
+    users = list(users)
+    if len(users) <= page_size:
+        return ShelfPage(users)
+
+    users = users[:page_size]
+    return ShelfPage(users, next_cursor=users[-1].username)
+
+
+def get_directory_page(prefix=None, after=None, page_size=None):
+    return make_page(directory_queryset(prefix, after, page_size), page_size)
+
+
+async def aget_directory_page(prefix=None, after=None, page_size=None):
+    users = directory_queryset(prefix, after, page_size)
+    return make_page([user async for user in users], page_size)
@@ -0,0 +1,155 @@
+'''Responses for downloading the stored files(Book.file).
+
+Files are streamed in chunks and single byte ranges are supported, so a
+download of a large book can be resumed. With LIBRARY_DOWNLOAD_SENDFILE
+set, only the headers are returned and the file is sent by the web server:
+
+    "X-Sendfile"        Apache(mod_xsendfile), lighttpd: the file path is sent
+    "X-Accel-Redirect"  nginx: LIBRARY_DOWNLOAD_ACCEL_PREFIX + the file name
+                        is sent, it must be an internal location of MEDIA_ROOT
+'''
+from django.conf import settings
+from django.http import FileResponse, Http404, HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import content_disposition_header, http_date, quote_etag
+
+from urllib.parse import quote
+import mimetypes
+import os
+import re
+
+RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+def parse_range(header, size):
+    '''Returns (start, end) of the requested bytes, end is inclusive,
+    or None if the whole file must be sent.
+
+    Several ranges are not supported, the whole file is sent instead.
+    raises RangeNotSatisfiable if the range is out of the file'''
+    match = RANGE_RE.match(header.strip())
+    if match is None:
+        return None
+
+    start, end = match.groups()
+    if start == "" and end == "":
+        return None
+
+    if start == "":
+        # bytes=-500 is the last 500 bytes
+        suffix = int(end)
+        if suffix == 0:
+            raise RangeNotSatisfiable
+        return max(size - suffix, 0), size - 1
+
+    start = int(start)
+    end = size - 1 if end == "" else min(int(end), size - 1)
+    if start > end:
+        if start < size:
+            # bytes=10-5 is invalid, so it's ignored
+            return None
+        raise RangeNotSatisfiable
+
+    return start, end
+
+
+def file_etag(size, modified):
+    # strong, the stored file is only ever replaced, not changed in place
+    return quote_etag(f"{size:x}-{int(modified.timestamp() * 10**6):x}")
+
+
+def _read_range(file, start, length, chunk_size):
+    try:
+        file.seek(start)
+        while length > 0:
+            chunk = file.read(min(chunk_size, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+    finally:
+        file.close()
+
+
+def _sendfile_response(storage, name):
+    response = HttpResponse()
+    if settings.LIBRARY_DOWNLOAD_SENDFILE == "X-Accel-Redirect":
+        response["X-Accel-Redirect"] = quote(settings.LIBRARY_DOWNLOAD_ACCEL_PREFIX + name)
+    else:
+        response[settings.LIBRARY_DOWNLOAD_SENDFILE] = storage.path(name)
+    # the content type is left to the web server
+    del response["Content-Type"]
+
+    return response
+
+
+def file_response(request, field_file):
+    '''Returns response with the whole file, its requested range
+    or 304 Not Modified, raises Http404 if the stored file is missing'''
+    storage, name = field_file.storage, field_file.name
+    try:
+        size = storage.size(name)
+        modified = storage.get_modified_time(name)
+    except FileNotFoundError:
+        raise Http404("The book file is missing")
+    etag = file_etag(size, modified)
+
+    response = get_conditional_response(
+        request, etag=etag, last_modified=int(modified.timestamp()),
+    )
+    if response is not None:
+        # 304 Not Modified or 412 Precondition Failed
+        return response
+
+    filename = os.path.basename(name)
+    if settings.LIBRARY_DOWNLOAD_SENDFILE:
+        response = _sendfile_response(storage, name)
+    else:
+        response = _streaming_response(request, storage, name, size, etag)
+
+    response["ETag"] = etag
+    response["Last-Modified"] = http_date(modified.timestamp())
+    response["Content-Disposition"] = content_disposition_header(True, filename)
+    return response
+
+
+def _streaming_response(request, storage, name, size, etag):
+    byte_range = None
+    range_header = request.headers.get("Range")
+    # If-Range: the range is only valid for the same version of the file
+    if range_header and request.headers.get("If-Range", etag) == etag:
+        try:
+            byte_range = parse_range(range_header, size)
+        except RangeNotSatisfiable:
+            response = HttpResponse(status=416)
+            response["Content-Range"] = f"bytes */{size}"
+            return response
+
+    content_type = mimetypes.guess_type(name)[0] or "application/octet-stream"
+    chunk_size = settings.LIBRARY_DOWNLOAD_CHUNK_SIZE
+    try:
+        file = storage.open(name, "rb")
+    except FileNotFoundError:
+        # deleted after it was checked
+        raise Http404("The book file is missing")
+
+    if byte_range is None:
+        response = FileResponse(file, content_type=content_type)
+        response.block_size = chunk_size
+    else:
+        start, end = byte_range
+        length = end - start + 1
+        response = FileResponse(
+            _read_range(file, start, length, chunk_size),
+            status=206,
+            content_type=content_type,
+        )
+        response["Content-Length"] = length
+        response["Content-Range"] = f"bytes {start}-{end}/{size}"
+
+    response["Accept-Ranges"] = "bytes"
+    return response
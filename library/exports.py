@@ -0,0 +1,205 @@
+'''Streaming export of the user's library.
+
+    csv     the books as a CSV file, the one library.imports reads back
+    jsonl   the same as JSON Lines
+    zip     books.csv(with the file and cover columns) and the files
+            and covers of the books under their stored names
+
+The books are read with QuerySet.iterator() in LIBRARY_EXPORT_CHUNK_SIZE
+rows and the output is yielded as soon as LIBRARY_DOWNLOAD_CHUNK_SIZE of
+it is written, so the response starts at once and memory doesn't grow
+with the library.
+
+The ZIP is written to a stream that only keeps what was written since
+the last yield: the files are read in LIBRARY_DOWNLOAD_CHUNK_SIZE chunks
+and the sizes and checksums are written after them(data descriptors),
+so nothing is written to the disk and the archive is never in memory,
+only zipfile's directory entry of every file is kept till the end.
+Files and covers are stored without compression, they are compressed
+already. Files missing from the storage are left out of the archive.
+'''
+from django.conf import settings
+from django.db.models import F
+from django.http import StreamingHttpResponse
+from django.utils.http import content_disposition_header
+
+from library.imports import CSV, FIELDS, JSON_LINES
+from library.models import Book
+
+import csv
+import datetime
+import io
+import json
+import zipfile
+
+ZIP = "zip"
+FORMATS = [CSV, JSON_LINES, ZIP]
+
+CONTENT_TYPES = {
+    CSV: "text/csv; charset=utf-8",
+    JSON_LINES: "application/jsonl; charset=utf-8",
+    ZIP: "application/zip",
+}
+
+FILE_FIELDS = ["file", "cover"]
+ZIP_MANIFEST = "books.csv"
+
+
+def get_chunk_size():
+    return settings.LIBRARY_EXPORT_CHUNK_SIZE
+
+
+def book_rows(user, with_files=False):
+    '''Yields dict of FIELDS(and FILE_FIELDS) of every book of the user,
+    values are what the import reads back'''
+    fields = [field_name for field_name in FIELDS if field_name != "category"]
+    if with_files:
+        fields += FILE_FIELDS
+    books = (
+        Book.objects
+        .filter(user=user)
+        .order_by("id")
+        .values(*fields, category_name=F("category__category_name"))
+        .iterator(chunk_size=get_chunk_size())
+    )
+    for book in books:
+        book["category"] = book.pop("category_name")
+        for field_name in ["started", "finished"]:
+            if book[field_name] is not None:
+                book[field_name] = book[field_name].isoformat()
+        yield book
+
+
+class _Pipe():
+    '''Write-only stream, pop() returns what was written since the last pop()'''
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def pop(self):
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def export_csv(user, with_files=False):
+    '''Yields the lines of the CSV file'''
+    pipe = io.StringIO()
+    columns = FIELDS + FILE_FIELDS if with_files else FIELDS
+    writer = csv.DictWriter(pipe, columns)
+
+    def pop():
+        line = pipe.getvalue()
+        pipe.seek(0)
+        pipe.truncate()
+        return line
+
+    writer.writeheader()
+    yield pop()
+    for row in book_rows(user, with_files):
+        writer.writerow(row)
+        yield pop()
+
+
+def export_json_lines(user):
+    for row in book_rows(user):
+        yield json.dumps(row, ensure_ascii=False) + "\n"
+
+
+def _zip_info(name, modified=None, compress_type=zipfile.ZIP_STORED):
+    date_time = (modified or datetime.datetime.now()).timetuple()[:6]
+    info = zipfile.ZipInfo(name, date_time=date_time)
+    info.compress_type = compress_type
+    return info
+
+
+def _stored_files(user):
+    '''Yields (storage, name) of the files and covers of the user's books'''
+    storages = {field_name: Book._meta.get_field(field_name).storage for field_name in FILE_FIELDS}
+    names = (
+        Book.objects
+        .filter(user=user)
+        .order_by("id")
+        .values_list(*FILE_FIELDS)
+        .iterator(chunk_size=get_chunk_size())
+    )
+    for book_names in names:
+        for field_name, name in zip(FILE_FIELDS, book_names):
+            if name:
+                yield storages[field_name], name
+
+
+def export_zip(user):
+    '''Yields the bytes of the ZIP archive'''
+    pipe = _Pipe()
+    chunk_size = settings.LIBRARY_DOWNLOAD_CHUNK_SIZE
+    # the pipe can't seek, so zipfile writes data descriptors
+    with zipfile.ZipFile(pipe, "w") as archive:
+        with archive.open(_zip_info(ZIP_MANIFEST, compress_type=zipfile.ZIP_DEFLATED), "w") as entry:
+            for line in export_csv(user, with_files=True):
+                entry.write(line.encode())
+                yield pipe.pop()
+
+        for storage, name in _stored_files(user):
+            try:
+                file = storage.open(name, "rb")
+                modified = storage.get_modified_time(name)
+            except FileNotFoundError:
+                continue
+
+            with file, archive.open(_zip_info(name, modified), "w", force_zip64=True) as entry:
+                while chunk := file.read(chunk_size):
+                    entry.write(chunk)
+                    yield pipe.pop()
+
+    # the central directory
+    yield pipe.pop()
+
+
+def _joined(chunks):
+    '''Joins the small chunks(one per row) into ones of at least
+    LIBRARY_DOWNLOAD_CHUNK_SIZE, so the server doesn't write every row separately'''
+    size = settings.LIBRARY_DOWNLOAD_CHUNK_SIZE
+    buffer = []
+    buffered = 0
+    for chunk in chunks:
+        buffer.append(chunk)
+        buffered += len(chunk)
+        if buffered >= size:
+            yield buffer[0][:0].join(buffer)
+            buffer = []
+            buffered = 0
+
+    if buffered:
+        yield buffer[0][:0].join(buffer)
+
+
+EXPORTERS = {
+    CSV: export_csv,
+    JSON_LINES: export_json_lines,
+    ZIP: export_zip,
+}
+
+
+def export_library(user, file_format):
+    '''Returns iterator of the chunks(str or bytes) of the exported library'''
+    if file_format not in EXPORTERS:
+        raise ValueError(f"Unknown format {file_format!r}, expected one of {', '.join(FORMATS)}")
+
+    return _joined(EXPORTERS[file_format](user))
+
+
+def export_response(user, file_format):
+    response = StreamingHttpResponse(
+        export_library(user, file_format), content_type=CONTENT_TYPES[file_format],
+    )
+    response["Content-Disposition"] = content_disposition_header(
+        as_attachment=True, filename=f"{user.pk}_library.{file_format}",
+    )
+    return response
@@ -0,0 +1,135 @@
+'''Following feed: recent book activity of the users someone follows.
+
+Activities are written once, as BookActivity rows of the book's owner
+(record_activities, called by the post_save signal of Book). The feed is
+read by one merged, time ordered query over the activities of all the
+followed users, so following and unfollowing take effect at once and
+nothing is copied per follower.
+
+Every followed user's activities are a range of the (user, created, id)
+index, and only the ones newer than LIBRARY_FEED_MAX_AGE are read, so
+the cost of a page depends on the recent activity of the followed users,
+not on their whole history.
+
+update(), bulk_create() and raw saves send no signals,
+so they don't record activities.
+'''
+from django.conf import settings
+from django.core.exceptions import BadRequest
+from django.db.models import F, Q
+from django.utils import timezone
+from django.utils.http import urlsafe_base64_encode, urlsafe_base64_decode
+
+from users.models import UserFollowing
+from library.models import BookActivity
+from library.pagination import ShelfPage
+
+import datetime
+
+FEED_ORDERING = (F("created").desc(), F("id").desc())
+
+
+def get_page_size():
+    return settings.LIBRARY_FEED_PAGE_SIZE
+
+
+def _changed_activities(book, loaded):
+    if book.started is not None and book.started != loaded.get("started", book.started):
+        yield BookActivity.STARTED, None
+    if book.finished is not None and book.finished != loaded.get("finished", book.finished):
+        yield BookActivity.FINISHED, None
+    if book.rating is not None and book.rating != loaded.get("rating", book.rating):
+        yield BookActivity.RATED, book.rating
+
+
+def _created_activities(book):
+    yield BookActivity.ADDED, None
+    if book.finished is not None:
+        yield BookActivity.FINISHED, None
+    if book.rating is not None:
+        yield BookActivity.RATED, book.rating
+
+
+def book_activities(book, created):
+    '''Returns unsaved BookActivity list of what was done by saving the book.
+
+    A new book is added(and finished or rated if it was added so). For the
+    loaded books the fields are compared with the values they were loaded
+    with, a book that wasn't loaded from the database has no old values
+    to compare with, so it gets nothing'''
+    if created:
+        activities = _created_activities(book)
+    else:
+        loaded = getattr(book, "_loaded_values", None)
+        if loaded is None:
+            return []
+        activities = _changed_activities(book, loaded)
+
+    now = timezone.now()
+    return [
+        BookActivity(user_id=book.user_id, book=book, kind=kind, rating=rating, created=now)
+        for kind, rating in activities
+    ]
+
+
+def record_activities(book, created):
+    activities = book_activities(book, created)
+    if activities:
+        BookActivity.objects.bulk_create(activities)
+
+    return activities
+
+
+def encode_cursor(activity):
+    return urlsafe_base64_encode(f"{activity.created.isoformat()}_{activity.id}".encode())
+
+
+def decode_cursor(cursor):
+    '''Returns (created, id) of the last activity of the previous page
+
+    raises django.core.exceptions.BadRequest if cursor is malformed'''
+    try:
+        created, activity_id = urlsafe_base64_decode(cursor).decode().split("_")
+        return datetime.datetime.fromisoformat(created), int(activity_id)
+    except ValueError:
+        raise BadRequest("Invalid cursor")
+
+
+def feed_queryset(user, cursor=None, page_size=None, max_age=None):
+    '''Returns queryset of page_size + 1 newest activities of the users
+    followed by the user, after the cursor'''
+    page_size = page_size or get_page_size()
+    if max_age is None:
+        max_age = settings.LIBRARY_FEED_MAX_AGE
+
+    followed = UserFollowing.objects.filter(who_follows=user).values("whom_follows")
+    activities = BookActivity.objects.filter(
+        user__in=followed,
+        created__gte=timezone.now() - datetime.timedelta(seconds=max_age),
+    )
+    if cursor:
+        created, activity_id = decode_cursor(cursor)
+        activities = activities.filter(
+            Q(created__lt=created) | Q(created=created, id__lt=activity_id)
+        )
+
+    return (
+        activities
+        .select_related("book")
+        .order_by(*FEED_ORDERING)[:page_size + 1]
+    )
+
+
+def make_page(activities, page_size=None):
+    '''Returns ShelfPage of the activities(the same interface as the shelves)'''
+    page_size = page_size or get_page_size()
+    activities = list(activities)
+    if len(activities) <= page_size:
+        return ShelfPage(activities)
+
+    activities = activities[:page_size]
+    return ShelfPage(activities, next_cursor=encode_cursor(activities[-1]))
+
+
+def get_feed_page(user, cursor=None, page_size=None, max_age=None):
+    return make_page(feed_queryset(user, cursor, page_size, max_age), page_size)
@@ -1,12 +1,18 @@
-from django.forms import ModelForm
+from django.forms import FileField, Form, ModelForm
 from library.models import Book, BookCategory
 
 
 class NewBookForm(ModelForm):
+    def __init__(self, *args, user=None, **kwargs):
+        '''user limits the category choices to their categories'''
+        super().__init__(*args, **kwargs)
+        if user is not None:
+            self.fields["category"].queryset = user.book_categories.order_by("position")
+
     class Meta:
         model = Book
         fields = ["title", "author", "category", "file",
-                  "started", "finished", "rating", "comment"]
+                  "started", "finished", "rating", "pages", "comment"]
 
         exclude = ["user"]
 
@@ -15,3 +21,7 @@ class NewCategoryForm(ModelForm):
     class Meta:
         model = BookCategory
         fields = ["category_name"]
+
+
+class ImportBooksForm(Form):
+    file = FileField(help_text="CSV, JSON or JSON Lines file, e.g. Goodreads export")
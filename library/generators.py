@@ -0,0 +1,134 @@
+'''Synthetic libraries for load testing and benchmarks.
+
+Everything is written with bulk_create, so no signals are sent
+and the shelf caches of the generated users are not invalidated.
+The counters(library.counters) and the reading summaries
+(library.summaries) are recomputed at the end.
+Generate only new users.
+'''
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+
+from users.models import User, UserFollowing
+from library.models import Book, BookCategory, LibraryGroup, DEFAULT_BOOK_CATEGORIES
+from library.counters import repair_counters
+from library.summaries import rebuild_reading_summaries
+
+import datetime
+import random
+
+BATCH_SIZE = 1000
+
+
+def _generate_books(user, categories, num_books, rand):
+    for i in range(num_books):
+        started = datetime.date(2015, 1, 1) + datetime.timedelta(days=rand.randrange(3000))
+        finished = None
+        rating = None
+        if rand.random() < 0.5:
+            finished = started + datetime.timedelta(days=rand.randrange(1, 120))
+            rating = rand.randint(1, 10)
+
+        yield Book(
+            user=user,
+            category=categories[i % len(categories)],
+            title=f"book {i}",
+            author=f"author {rand.randrange(max(num_books // 5, 1))}",
+            started=started,
+            finished=finished,
+            rating=rating,
+            pages=rand.randint(50, 1000),
+            comment=f"comment on book {i}" if rand.random() < 0.2 else "",
+        )
+
+
+def _category_names(num_categories):
+    names = DEFAULT_BOOK_CATEGORIES[:num_categories]
+    return names + [f"category {i}" for i in range(len(names), num_categories)]
+
+
+def _in_batches(objs, batch_size=BATCH_SIZE):
+    batch = []
+    for obj in objs:
+        batch.append(obj)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+@transaction.atomic
+def generate_libraries(
+    num_users,
+    categories_per_user=3,
+    books_per_user=100,
+    followings_per_user=10,
+    num_groups=0,
+    members_per_group=10,
+    prefix="user",
+    password="password1",
+    seed=0,
+):
+    '''Creates num_users users named "<prefix><number>" with their
+    categories and books, makes every user follow the next
+    followings_per_user users and puts consecutive users into num_groups
+    library groups.
+
+    Returns the list of created users'''
+    rand = random.Random(seed)
+    # hashing is slow, so all the users share the same hash
+    password_hash = make_password(password)
+
+    users = User.objects.bulk_create([
+        User(
+            username=f"{prefix}{i}",
+            email=f"{prefix}{i}@example.com",
+            password=password_hash,
+        )
+        for i in range(num_users)
+    ], batch_size=BATCH_SIZE)
+
+    category_names = _category_names(categories_per_user)
+    for users_batch in _in_batches(users, max(BATCH_SIZE // max(categories_per_user, 1), 1)):
+        categories = BookCategory.objects.bulk_create([
+            BookCategory(user=user, category_name=category_name, position=position)
+            for user in users_batch
+            for position, category_name in enumerate(category_names, start=1)
+        ])
+
+        for user_number, user in enumerate(users_batch):
+            user_categories = categories[
+                user_number * categories_per_user:(user_number + 1) * categories_per_user
+            ]
+            if not user_categories:
+                continue
+            for books_batch in _in_batches(_generate_books(user, user_categories, books_per_user, rand)):
+                Book.objects.bulk_create(books_batch)
+
+    followings = (
+        UserFollowing(who_follows=user, whom_follows=users[(i + shift) % num_users])
+        for i, user in enumerate(users)
+        for shift in range(1, min(followings_per_user, num_users - 1) + 1)
+    )
+    for batch in _in_batches(followings):
+        UserFollowing.objects.bulk_create(batch)
+
+    groups = LibraryGroup.objects.bulk_create([
+        LibraryGroup(name=f"{prefix} group {i}", creator=users[i * members_per_group % num_users])
+        for i in range(num_groups if num_users else 0)
+    ])
+    Membership = LibraryGroup.users.through
+    memberships = (
+        Membership(librarygroup=group, user=users[(i * members_per_group + j) % num_users])
+        for i, group in enumerate(groups)
+        for j in range(min(members_per_group, num_users))
+    )
+    for batch in _in_batches(memberships):
+        Membership.objects.bulk_create(batch)
+
+    repair_counters(User, rows=User.objects.filter(username__startswith=prefix))
+    repair_counters(BookCategory, rows=BookCategory.objects.filter(user__username__startswith=prefix))
+    rebuild_reading_summaries(users=User.objects.filter(username__startswith=prefix))
+
+    return users
@@ -0,0 +1,117 @@
+'''Shared library of a LibraryGroup: the books of all its members.
+
+Access is decided together with loading the group: the group is
+annotated with an EXISTS over the membership table, which is a lookup
+of its unique (librarygroup_id, user_id) index.
+
+The merged shelf and the aggregates are queries over the books of the
+members(user_id IN the group's members), so nothing is loaded per
+member. The aggregates read every book of the group, so they are cached
+for LIBRARY_GROUP_STATS_CACHE_TIMEOUT seconds and may be that old.
+'''
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import PermissionDenied
+from django.db.models import Avg, Count, Exists, OuterRef, Sum
+from django.http import Http404
+
+from users.models import User
+from library.models import Book, LibraryGroup
+from library.pagination import paginate_shelf
+
+# number of the authors and books in the aggregates
+TOP_SIZE = 10
+
+Membership = LibraryGroup.users.through
+
+
+def is_member(user):
+    '''Expression for LibraryGroup querysets: True if the user is a member'''
+    return Exists(Membership.objects.filter(librarygroup=OuterRef("pk"), user=user.pk))
+
+
+def get_group_for_member(name, user):
+    '''Returns the group if the user is its member or creator, takes one query
+
+    raises Http404 if there is no such group
+    and PermissionDenied if the user can't see it'''
+    group = (
+        LibraryGroup.objects
+        .annotate(is_member=is_member(user))
+        .filter(name=name)
+        .first()
+    )
+    if group is None:
+        raise Http404("No LibraryGroup matches the given query.")
+    if not (group.is_member or group.creator_id == user.pk):
+        raise PermissionDenied("Only members can see the group's library")
+
+    return group
+
+
+def members(group):
+    return User.objects.filter(library_group=group.pk)
+
+
+def group_books(group):
+    # the subquery reads the group's part of the membership index
+    member_pks = Membership.objects.filter(librarygroup=group.pk).values("user")
+    return Book.objects.filter(user__in=member_pks)
+
+
+def paginate_group_shelf(group, cursor=None, page_size=None):
+    '''Returns ShelfPage of the books of all the members,
+    in the same order as the shelves'''
+    books = group_books(group).select_related("user", "category")
+    return paginate_shelf(books, cursor=cursor, page_size=page_size)
+
+
+def _compute_group_stats(group):
+    totals = members(group).aggregate(
+        members=Count("pk"),
+        # counters of library.counters, not COUNT(*) of the books
+        books=Sum("books_count", default=0),
+        finished_books=Sum("finished_books_count", default=0),
+    )
+
+    books = group_books(group).order_by()
+    most_read_authors = list(
+        books
+        .filter(finished__isnull=False)
+        .exclude(author="")
+        .values("author")
+        .annotate(finished=Count("pk"), readers=Count("user", distinct=True))
+        .order_by("-finished", "author")[:TOP_SIZE]
+    )
+    top_rated_books = list(
+        books
+        .filter(rating__isnull=False)
+        .values("title", "author")
+        .annotate(average_rating=Avg("rating"), ratings=Count("pk"))
+        .order_by("-average_rating", "-ratings", "title", "author")[:TOP_SIZE]
+    )
+    average_rating = books.aggregate(average=Avg("rating"))["average"]
+
+    return {
+        **totals,
+        "average_rating": average_rating,
+        "most_read_authors": most_read_authors,
+        "top_rated_books": top_rated_books,
+    }
+
+
+def _stats_key(group):
+    return f"library:group_stats:{group.pk}"
+
+
+def get_group_stats(group):
+    '''Returns dict of the group-wide aggregates:
+    members, books, finished_books, average_rating,
+    most_read_authors: [{"author", "finished", "readers"}],
+    top_rated_books: [{"title", "author", "average_rating", "ratings"}]'''
+    stats = cache.get(_stats_key(group))
+    if stats is None:
+        stats = _compute_group_stats(group)
+        cache.set(_stats_key(group), stats, timeout=settings.LIBRARY_GROUP_STATS_CACHE_TIMEOUT)
+
+    return stats
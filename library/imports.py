@@ -0,0 +1,424 @@
+'''Bulk import of the books from CSV, JSON and JSON Lines files.
+
+Columns(keys of the JSON objects) are the fields of Book:
+
+    title, author, category, started, finished, rating, pages, comment
+
+only title is required, dates are YYYY-MM-DD. Rows without category go to
+"finished", "reading" or "to-read" by their dates. Goodreads exports are
+recognized by their header, see GOODREADS_COLUMNS.
+
+The file is read row by row. Every LIBRARY_IMPORT_BATCH_SIZE rows are
+validated together, their missing categories are created and they are
+written with one bulk_create(update_conflicts=True): books with the
+title and author the user already has are updated instead of inserted.
+Only the columns of the file are updated, so a file of titles and
+authors(or without category) doesn't clear the user's ratings, comments
+or shelves.
+So memory doesn't grow with the file and a batch takes a few queries,
+not a few per book.
+
+Invalid rows are skipped and reported, the rest is imported. That
+includes the rows that would leave an existing book finished before it
+was started: with only one of the dates in the file the other one is
+taken from the book, so they are checked against the stored books
+before the batch is written.
+
+bulk_create sends no signals, so the import recomputes the user's
+counters and reading summaries and invalidates the shelves itself and
+no BookActivity is recorded. The search index is kept in sync by its
+triggers.
+'''
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import transaction
+
+from users.models import User
+from library.caching import bump_shelves_version
+from library.counters import repair_counters
+from library.models import Book, BookCategory
+from library.summaries import rebuild_reading_summaries
+
+from dataclasses import dataclass, field
+import csv
+import io
+import json
+
+CSV = "csv"
+JSON = "json"
+JSON_LINES = "jsonl"
+FORMATS = [CSV, JSON, JSON_LINES]
+
+FINISHED_BEFORE_STARTED = "finished: The book can't be finished before it was started."
+
+FIELDS = ["title", "author", "category", "started", "finished", "rating", "pages", "comment"]
+# fields of the existing books that are overwritten by the imported rows
+# that have them, the rest are kept
+UPDATE_FIELDS = ["category", "started", "finished", "rating", "pages", "comment"]
+
+# {Goodreads column: field}
+GOODREADS_COLUMNS = {
+    "Title": "title",
+    "Author": "author",
+    "Exclusive Shelf": "category",
+    "Date Read": "finished",
+    "My Rating": "rating",
+    "Number of Pages": "pages",
+    "My Review": "comment",
+}
+# {Goodreads exclusive shelf: category}
+GOODREADS_SHELVES = {
+    "read": "finished",
+    "currently-reading": "reading",
+    "to-read": "to-read",
+}
+
+JSON_READ_SIZE = 64 * 2**10
+# an object of the JSON array can't be bigger, so a broken file isn't read into memory
+JSON_MAX_OBJECT_SIZE = 2**20
+
+
+class ImportFormatError(ValueError):
+    '''The file can't be read at all, not just some of its rows.
+
+    result is ImportResult of the rows before the broken part, they stay
+    imported, None if nothing was read'''
+    def __init__(self, message, result=None):
+        super().__init__(message)
+        self.result = result
+
+
+@dataclass
+class RowError:
+    # line of CSV and JSON Lines files, number of the object in JSON arrays
+    row: int
+    message: str
+
+
+@dataclass
+class ImportResult:
+    # rows written, new and updated books
+    imported: int = 0
+    created: int = 0
+    created_categories: int = 0
+    error_count: int = 0
+    # only the first LIBRARY_IMPORT_MAX_ERRORS errors are kept
+    errors: list = field(default_factory=list)
+
+    @property
+    def updated(self):
+        return self.imported - self.created
+
+
+def get_batch_size():
+    return settings.LIBRARY_IMPORT_BATCH_SIZE
+
+
+def format_of(filename):
+    '''Returns import format by the file extension, None if it's unknown'''
+    extension = filename.rsplit(".", 1)[-1].lower()
+    return extension if extension in FORMATS else None
+
+
+def _from_goodreads(row):
+    rating = row["My Rating"].strip()
+    shelf = row["Exclusive Shelf"].strip()
+    values = {
+        "title": row["Title"],
+        "author": row["Author"],
+        "category": GOODREADS_SHELVES.get(shelf, shelf),
+        "finished": row["Date Read"].strip().replace("/", "-"),
+        # Goodreads rates from 1 to 5, 0 is not rated
+        "rating": int(rating) * 2 if rating.isdigit() and rating != "0" else None,
+        "comment": row["My Review"],
+    }
+    # older exports have no pages
+    if "Number of Pages" in row:
+        values["pages"] = row["Number of Pages"]
+    return values
+
+
+def read_csv(stream):
+    '''Yields (line, row dict) of the CSV file with the header'''
+    reader = csv.DictReader(stream)
+    goodreads = set(GOODREADS_COLUMNS) - {"Number of Pages"} <= set(reader.fieldnames or [])
+    for row in reader:
+        yield reader.line_num, _from_goodreads(row) if goodreads else row
+
+
+def read_json_lines(stream):
+    '''Yields (line, object) of the file with one JSON object per line'''
+    for line_number, line in enumerate(stream, start=1):
+        if not line.strip():
+            continue
+        try:
+            yield line_number, json.loads(line)
+        except json.JSONDecodeError as error:
+            yield line_number, ValidationError(f"Invalid JSON: {error.msg}")
+
+
+def read_json(stream):
+    '''Yields (number, object) of the JSON array.
+
+    The array is decoded one item at a time from JSON_READ_SIZE chunks,
+    so the whole file is never in memory'''
+    decoder = json.JSONDecoder()
+    buffer = ""
+    position = 0
+    eof = False
+
+    def skip(chars):
+        nonlocal buffer, position, eof
+        while True:
+            while position < len(buffer) and buffer[position] in chars:
+                position += 1
+            if position < len(buffer) or eof:
+                return
+            chunk = stream.read(JSON_READ_SIZE)
+            buffer, position, eof = buffer[position:] + chunk, 0, not chunk
+
+    skip(" \t\r\n")
+    if buffer[position:position + 1] != "[":
+        raise ImportFormatError("The JSON file must be an array of objects")
+    position += 1
+
+    number = 0
+    while True:
+        skip(" \t\r\n")
+        if buffer[position:position + 1] == "]":
+            return
+        if number:
+            if buffer[position:position + 1] != ",":
+                raise ImportFormatError(f"Invalid JSON after the object {number}")
+            position += 1
+            skip(" \t\r\n")
+
+        while True:
+            try:
+                item, end = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                end = None
+            # an item at the end of the buffer may continue in the next chunk
+            if eof or (end is not None and end < len(buffer)):
+                break
+            if len(buffer) - position > JSON_MAX_OBJECT_SIZE:
+                raise ImportFormatError(f"Invalid JSON at the object {number + 1}")
+            chunk = stream.read(JSON_READ_SIZE)
+            buffer, position, eof = buffer[position:] + chunk, 0, not chunk
+
+        if end is None:
+            raise ImportFormatError(f"Invalid JSON at the object {number + 1}")
+        number += 1
+        position = end
+        yield number, item
+
+
+READERS = {
+    CSV: read_csv,
+    JSON: read_json,
+    JSON_LINES: read_json_lines,
+}
+
+
+def _clean_field(model, field_name, value):
+    if isinstance(value, str):
+        value = value.strip()
+    if value is None or value == "":
+        value = "" if field_name in ("title", "author", "comment") else None
+    try:
+        return model._meta.get_field(field_name).clean(value, None)
+    except ValidationError as error:
+        raise ValidationError(f"{field_name}: {' '.join(error.messages)}")
+
+
+def clean_row(row):
+    '''Returns dict of the valid values of FIELDS from the row,
+    doesn't query the database
+
+    raises ValidationError if the row is invalid'''
+    if isinstance(row, ValidationError):
+        raise row
+    if not isinstance(row, dict):
+        raise ValidationError("The row must be an object")
+
+    values = {
+        field_name: _clean_field(Book, field_name, row.get(field_name))
+        for field_name in FIELDS
+        if field_name != "category"
+    }
+    if not values["title"]:
+        raise ValidationError("title: The title is required.")
+    if values["started"] and values["finished"] and values["started"] > values["finished"]:
+        raise ValidationError(FINISHED_BEFORE_STARTED)
+
+    category = row.get("category") or default_category(values["started"], values["finished"])
+    values["category"] = _clean_field(BookCategory, "category_name", category)
+
+    return values
+
+
+def updated_fields(row):
+    '''Returns tuple of UPDATE_FIELDS the row has(the columns of the file),
+    only they are overwritten in the existing books'''
+    return tuple(field_name for field_name in UPDATE_FIELDS if field_name in row)
+
+
+def default_category(started, finished):
+    if finished is not None:
+        return "finished"
+    if started is not None:
+        return "reading"
+    return "to-read"
+
+
+class BookImporter():
+    '''Imports the rows of one file into the user's library, see import_books()'''
+    def __init__(self, user, batch_size=None, max_errors=None):
+        self.user = user
+        self.batch_size = batch_size or get_batch_size()
+        self.max_errors = max_errors if max_errors is not None else settings.LIBRARY_IMPORT_MAX_ERRORS
+        self.result = ImportResult()
+        self.categories = None
+
+    def _error(self, row_number, message):
+        self.result.error_count += 1
+        if len(self.result.errors) < self.max_errors:
+            self.result.errors.append(RowError(row_number, message))
+
+    def _category(self, name):
+        if name not in self.categories:
+            category = BookCategory(user=self.user, category_name=name)
+            category.save()
+            self.categories[name] = category
+            self.result.created_categories += 1
+
+        return self.categories[name]
+
+    def _check_dates(self, rows):
+        '''Returns the rows of the batch that keep started before finished,
+        the rest are reported.
+
+        A row with only one of the dates is merged with the stored book(or
+        the previous row of the same book), a row that would break the
+        finished_before_started constraint would fail the whole batch'''
+        keys = {
+            (values["title"], values["author"])
+            for _, update_fields, values in rows
+            if ("started" in update_fields) != ("finished" in update_fields)
+        }
+        # {(title, author): (started, finished)} as they will be after the rows before
+        dates = {}
+        if keys:
+            stored = Book.objects.filter(user=self.user, title__in={title for title, _ in keys})
+            for title, author, started, finished in stored.values_list("title", "author", "started", "finished"):
+                if (title, author) in keys:
+                    dates[title, author] = (started, finished)
+
+        valid = []
+        for row_number, update_fields, values in rows:
+            key = (values["title"], values["author"])
+            started, finished = values["started"], values["finished"]
+            if key in dates:
+                if "started" not in update_fields:
+                    started = dates[key][0]
+                if "finished" not in update_fields:
+                    finished = dates[key][1]
+            if started and finished and started > finished:
+                self._error(row_number, FINISHED_BEFORE_STARTED)
+                continue
+
+            dates[key] = (started, finished)
+            valid.append((row_number, update_fields, values))
+
+        return valid
+
+    def _write(self, rows):
+        '''rows are (number, updated_fields(), clean_row()) of the batch'''
+        # {updated fields: {(title, author): Book}}, the rows with the same
+        # columns are written by one INSERT. The last of the rows with the
+        # same title and author wins, one INSERT can't update the same book twice
+        books = {}
+        # the categories created by a rolled back batch don't exist
+        categories, created_categories = dict(self.categories), self.result.created_categories
+        try:
+            with transaction.atomic():
+                for _, update_fields, values in self._check_dates(rows):
+                    category = self._category(values.pop("category"))
+                    books.setdefault(update_fields, {})[values["title"], values["author"]] = Book(
+                        user=self.user, category=category, **values,
+                    )
+
+                for update_fields, same_columns in books.items():
+                    if update_fields:
+                        Book.objects.bulk_create(
+                            same_columns.values(),
+                            update_conflicts=True,
+                            unique_fields=["user", "title", "author"],
+                            update_fields=update_fields,
+                        )
+                    else:
+                        # only title and author, the existing books stay as they are
+                        Book.objects.bulk_create(same_columns.values(), ignore_conflicts=True)
+        except Exception:
+            self.categories, self.result.created_categories = categories, created_categories
+            raise
+
+        self.result.imported += sum(len(same_columns) for same_columns in books.values())
+
+    def run(self, rows):
+        '''rows are (number, row) of the reader'''
+        self.categories = {
+            category.category_name: category
+            for category in BookCategory.objects.filter(user=self.user)
+        }
+        books_before = Book.objects.filter(user=self.user).count()
+
+        try:
+            batch = []
+            for row_number, row in rows:
+                try:
+                    batch.append((row_number, updated_fields(row), clean_row(row)))
+                except ValidationError as error:
+                    self._error(row_number, " ".join(error.messages))
+                    continue
+
+                if len(batch) == self.batch_size:
+                    self._write(batch)
+                    batch = []
+            if batch:
+                self._write(batch)
+        finally:
+            # the written batches stay even if the rest of the file is broken
+            self.result.created = Book.objects.filter(user=self.user).count() - books_before
+            repair_counters(User, rows=User.objects.filter(pk=self.user.pk))
+            repair_counters(BookCategory, rows=BookCategory.objects.filter(user=self.user))
+            rebuild_reading_summaries(users=User.objects.filter(pk=self.user.pk))
+            bump_shelves_version(self.user.pk)
+
+        return self.result
+
+
+def text_stream(binary_file):
+    '''Text stream of the uploaded file for import_books(),
+    BOM of the files saved by spreadsheets is skipped'''
+    return io.TextIOWrapper(binary_file, encoding="utf-8-sig", newline="")
+
+
+def import_books(stream, user, file_format, batch_size=None, max_errors=None):
+    '''Imports the books of the text stream into the user's library.
+    file_format is one of FORMATS. Only the columns the file has are
+    overwritten in the books the user already has, the books of a file
+    without category stay on their shelves.
+
+    Returns ImportResult, raises ImportFormatError if the file can't be read'''
+    if file_format not in READERS:
+        raise ImportFormatError(f"Unknown format {file_format!r}, expected one of {', '.join(FORMATS)}")
+
+    importer = BookImporter(user, batch_size=batch_size, max_errors=max_errors)
+    try:
+        return importer.run(READERS[file_format](stream))
+    except ImportFormatError as error:
+        error.result = importer.result
+        raise
+    except (csv.Error, UnicodeDecodeError) as error:
+        raise ImportFormatError(f"The file can't be read: {error}", importer.result)
@@ -0,0 +1,46 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from library.media import collect_media, relocate_all_book_files
+
+
+class Command(BaseCommand):
+    help = "Deletes the files of MEDIA_ROOT that are not referenced and the expired uploads"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--min-age", type=int, default=settings.LIBRARY_MEDIA_GC_MIN_AGE,
+            help="seconds, newer files are kept",
+        )
+        parser.add_argument(
+            "--upload-expiration", type=int, default=settings.LIBRARY_UPLOAD_EXPIRATION,
+            help="seconds, uploads that weren't continued for longer are deleted",
+        )
+        parser.add_argument("--batch-size", type=int, default=500, help="files checked by one query")
+        parser.add_argument("--dry-run", action="store_true", help="only list the files to delete")
+        parser.add_argument(
+            "--relocate", action="store_true",
+            help="move the files of the renamed books first",
+        )
+
+    def handle(self, *args, **options):
+        if options["relocate"] and not options["dry_run"]:
+            relocated = relocate_all_book_files(batch_size=options["batch_size"])
+            self.stdout.write(f"Moved files of {relocated} books")
+
+        report = None
+        if options["dry_run"] or options["verbosity"] > 1:
+            report = self.stdout.write
+
+        result = collect_media(
+            min_age=options["min_age"],
+            upload_expiration=options["upload_expiration"],
+            batch_size=options["batch_size"],
+            dry_run=options["dry_run"],
+            report=report,
+        )
+
+        action = "Would delete" if options["dry_run"] else "Deleted"
+        self.stdout.write(self.style.SUCCESS(
+            f"{action} {result.deleted} files({result.deleted_bytes} bytes), kept {result.kept}"
+        ))
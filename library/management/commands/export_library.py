@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from users.models import User
+from library import exports
+
+
+class Command(BaseCommand):
+    help = "Exports the user's library as CSV, JSON Lines or ZIP with the files and covers"
+
+    def add_arguments(self, parser):
+        parser.add_argument("username")
+        parser.add_argument("path")
+        parser.add_argument("--format", choices=exports.FORMATS, help="by the file extension by default")
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(pk=options["username"])
+        except User.DoesNotExist:
+            raise CommandError(f"No user {options['username']!r}")
+
+        file_format = options["format"] or options["path"].rsplit(".", 1)[-1].lower()
+        if file_format not in exports.FORMATS:
+            raise CommandError(f"Unknown format of {options['path']}, pass --format")
+
+        with open(options["path"], "wb") as file:
+            for chunk in exports.export_library(user, file_format):
+                file.write(chunk.encode() if isinstance(chunk, str) else chunk)
+
+        self.stdout.write(self.style.SUCCESS(f"Exported {user.books_count} books to {options['path']}"))
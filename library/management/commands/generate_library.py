@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+
+from library.generators import generate_libraries
+
+
+class Command(BaseCommand):
+    help = "Generates users with synthetic libraries for load testing"
+
+    def add_arguments(self, parser):
+        parser.add_argument("users", type=int, help="number of users to create")
+        parser.add_argument("--categories", type=int, default=3, help="categories per user")
+        parser.add_argument("--books", type=int, default=100, help="books per user")
+        parser.add_argument("--followings", type=int, default=10, help="users followed by every user")
+        parser.add_argument("--groups", type=int, default=0, help="number of library groups")
+        parser.add_argument("--members", type=int, default=10, help="members per library group")
+        parser.add_argument("--prefix", default="user", help="username prefix of the created users")
+        parser.add_argument("--password", default="password1", help="password of all the created users")
+        parser.add_argument("--seed", type=int, default=0, help="random seed")
+
+    def handle(self, *args, **options):
+        users = generate_libraries(
+            num_users=options["users"],
+            categories_per_user=options["categories"],
+            books_per_user=options["books"],
+            followings_per_user=options["followings"],
+            num_groups=options["groups"],
+            members_per_group=options["members"],
+            prefix=options["prefix"],
+            password=options["password"],
+            seed=options["seed"],
+        )
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {len(users)} users with {options['books']} books each"
+        ))
@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from users.models import User
+from library import imports
+
+
+class Command(BaseCommand):
+    help = "Imports books from a CSV, JSON or JSON Lines file(or a Goodreads export) into the user's library"
+
+    def add_arguments(self, parser):
+        parser.add_argument("username")
+        parser.add_argument("path")
+        parser.add_argument("--format", choices=imports.FORMATS, help="by the file extension by default")
+        parser.add_argument("--batch-size", type=int, default=None, help="rows written by one query")
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(pk=options["username"])
+        except User.DoesNotExist:
+            raise CommandError(f"No user {options['username']!r}")
+
+        file_format = options["format"] or imports.format_of(options["path"])
+        if file_format is None:
+            raise CommandError(f"Unknown format of {options['path']}, pass --format")
+
+        with open(options["path"], "rb") as binary_file:
+            try:
+                result = imports.import_books(
+                    imports.text_stream(binary_file), user, file_format,
+                    batch_size=options["batch_size"],
+                )
+            except imports.ImportFormatError as error:
+                if error.result is not None and error.result.imported:
+                    self.stderr.write(
+                        f"Imported {error.result.imported} books before the error: "
+                        f"{error.result.created} new, {error.result.updated} updated"
+                    )
+                raise CommandError(str(error))
+
+        for error in result.errors:
+            self.stderr.write(f"row {error.row}: {error.message}")
+        if result.error_count > len(result.errors):
+            self.stderr.write(f"and {result.error_count - len(result.errors)} more invalid rows")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {result.imported} books: {result.created} new, {result.updated} updated, "
+            f"skipped {result.error_count} invalid rows"
+        ))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from library.summaries import rebuild_reading_summaries
+
+
+class Command(BaseCommand):
+    help = "Recomputes the monthly reading summaries of the users from their books"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000, help="users rebuilt by one transaction")
+
+    def handle(self, *args, **options):
+        inserted = rebuild_reading_summaries(batch_size=options["batch_size"])
+
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {inserted} reading summary rows"))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from library.search import get_search_backend
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the full-text search index of the books"
+
+    def handle(self, *args, **options):
+        backend = get_search_backend()
+        if backend is None:
+            raise CommandError("The database has no full-text search backend")
+
+        backend.rebuild()
+        self.stdout.write(self.style.SUCCESS("Rebuilt the search index"))
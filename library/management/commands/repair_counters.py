@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from library.counters import repair_all_counters
+
+
+class Command(BaseCommand):
+    help = "Recomputes the denormalized counters of the users and categories and fixes the drifted ones"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000, help="rows updated by one query")
+
+    def handle(self, *args, **options):
+        repaired = repair_all_counters(batch_size=options["batch_size"])
+
+        for model_name, count in repaired.items():
+            self.stdout.write(self.style.SUCCESS(f"Repaired {count} {model_name} rows"))
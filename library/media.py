@@ -0,0 +1,365 @@
+'''Files of MEDIA_ROOT that belong to the models.
+
+The upload paths contain the user, author and title of the book, so the
+files are moved when the book is renamed(relocate_book_files), and they
+are deleted with the book(delete_files). Both run after the commit of
+the transaction that changed the book, see library.signals.
+
+Files that are left anyway(e.g. by a crash between saving a file and
+the commit) are deleted by collect_media, which is run by the
+collect_media management command. It walks MEDIA_ROOT and checks the
+found files against the database in batches, so its memory doesn't
+grow with the number of files.
+'''
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+from users.models import User
+from library.caching import bump_shelves_version
+from library.models import Book, BookUpload
+from library.storage import ContentAddressedStorage, get_book_file_storage
+from library.thumbnails import delete_thumbnails
+from library.uploads import staging_path
+
+from dataclasses import dataclass
+import datetime
+import errno
+import os
+import time
+import uuid
+
+# (model, file field) of all the files stored in MEDIA_ROOT
+MEDIA_FIELDS = [
+    (Book, "file"),
+    (Book, "cover"),
+    (User, "profile_picture"),
+]
+BOOK_FILE_FIELDS = ["file", "cover"]
+THUMBNAILS_DIR = "thumbnails"
+
+
+def _expected_name(field_file, instance):
+    return field_file.field.generate_filename(instance, os.path.basename(field_file.name))
+
+
+def misplaced_fields(book):
+    '''Returns {field name: expected name} of the book's files that are not
+    in the directory their upload_to gives for the book now'''
+    misplaced = {}
+    for field_name in BOOK_FILE_FIELDS:
+        field_file = getattr(book, field_name)
+        if not field_file:
+            continue
+
+        expected = _expected_name(field_file, book)
+        if os.path.dirname(expected) != os.path.dirname(field_file.name):
+            misplaced[field_name] = expected
+
+    return misplaced
+
+
+def _remove_empty_dir(path):
+    try:
+        os.rmdir(path)
+    except OSError:
+        pass
+
+
+def _copy(storage, old_name, new_name):
+    '''Stores the file under the new name too, the old name is kept.
+    Returns the new name'''
+    new_name = storage.get_available_name(new_name)
+    try:
+        old_path, new_path = storage.path(old_name), storage.path(new_name)
+    except NotImplementedError:
+        # not a local storage
+        old_path = None
+
+    if old_path is not None:
+        os.makedirs(os.path.dirname(new_path), exist_ok=True)
+        try:
+            # one more hard link to the blob of ContentAddressedStorage
+            os.link(old_path, new_path)
+            return new_name
+        except OSError as error:
+            if error.errno not in (errno.EXDEV, errno.EPERM, errno.ENOTSUP, errno.EMLINK):
+                raise
+
+    with storage.open(old_name, "rb") as file:
+        return storage.save(new_name, file)
+
+
+def _delete(storage, name):
+    storage.delete(name)
+    try:
+        directory = os.path.dirname(storage.path(name))
+    except NotImplementedError:
+        return
+
+    _remove_empty_dir(os.path.join(directory, THUMBNAILS_DIR))
+    _remove_empty_dir(directory)
+
+
+def relocate_book_files(book_pk):
+    '''Moves the book's files to the paths of its current user, author
+    and title. Returns {field name: new name} of the moved files.
+
+    The files are copied(hard linked) to the new names, the book is
+    updated and only then the old names are deleted, so the book always
+    references an existing file. A crash leaves an unreferenced name for
+    collect_media, never a book without its file'''
+    book = Book.objects.select_related("user").filter(pk=book_pk).first()
+    if book is None:
+        return {}
+
+    moved = {}
+    old_names = {}
+    storages = {}
+    try:
+        for field_name, expected in misplaced_fields(book).items():
+            field_file = getattr(book, field_name)
+            old_names[field_name] = field_file.name
+            storages[field_name] = field_file.storage
+            moved[field_name] = _copy(field_file.storage, field_file.name, expected)
+
+        # only if the files weren't changed meanwhile
+        updated = bool(moved) and Book.objects.filter(pk=book.pk, **old_names).update(**moved)
+    except BaseException:
+        for field_name, new_name in moved.items():
+            _delete(storages[field_name], new_name)
+        raise
+
+    if not updated:
+        for field_name, new_name in moved.items():
+            _delete(storages[field_name], new_name)
+        return {}
+
+    for field_name, old_name in old_names.items():
+        delete_thumbnails(getattr(book, field_name))
+        _delete(storages[field_name], old_name)
+
+    bump_shelves_version(book.user_id)
+    return moved
+
+
+def delete_files(field_files):
+    '''Deletes the stored files and their thumbnails if no model
+    references them'''
+    for field_file in field_files:
+        if field_file and not referenced_names([field_file.name]):
+            delete_thumbnails(field_file)
+            field_file.storage.delete(field_file.name)
+
+
+def referenced_names(names):
+    '''Returns set of the names referenced by MEDIA_FIELDS,
+    takes one query for every field'''
+    referenced = set()
+    for model, field_name in MEDIA_FIELDS:
+        referenced.update(
+            model.objects
+            .filter(**{f"{field_name}__in": names})
+            .values_list(field_name, flat=True)
+        )
+
+    return referenced
+
+
+@dataclass
+class CollectedMedia:
+    deleted: int = 0
+    deleted_bytes: int = 0
+    kept: int = 0
+
+
+class MediaCollector():
+    '''Deletes the files of MEDIA_ROOT that are older than min_age seconds
+    and are not referenced.
+
+    report(name) is called for every deleted file'''
+    def __init__(self, min_age, batch_size=500, dry_run=False, report=None):
+        self.root = os.path.abspath(settings.MEDIA_ROOT)
+        self.blobs = os.path.join(self.root, ContentAddressedStorage.BLOBS_DIR)
+        self.staging = os.path.abspath(settings.LIBRARY_UPLOAD_STAGING_DIR)
+        self.created_before = time.time() - min_age
+        self.batch_size = batch_size
+        self.dry_run = dry_run
+        self.report = report
+        self.result = CollectedMedia()
+
+    def _is_old(self, stat):
+        # ctime is changed by linking too, mtime of a new link to an old blob is old
+        return stat.st_ctime < self.created_before
+
+    def _is_excluded(self, dirpath):
+        return any(
+            dirpath == top or dirpath.startswith(top + os.sep)
+            for top in (self.blobs, self.staging)
+        )
+
+    def _delete(self, path, stat):
+        self.result.deleted += 1
+        self.result.deleted_bytes += stat.st_size
+        if self.report is not None:
+            self.report(os.path.relpath(path, self.root))
+        if self.dry_run:
+            return
+
+        if stat.st_nlink > 1 and not self._is_excluded(os.path.dirname(path)):
+            # a name of ContentAddressedStorage, its blob is deleted with the last name
+            get_book_file_storage().delete(os.path.relpath(path, self.root))
+        else:
+            os.remove(path)
+
+    def _walk(self, topdown=True):
+        '''Yields (dirpath, filenames) of MEDIA_ROOT except blobs and staging.
+        Bottom-up walk skips MEDIA_ROOT itself'''
+        if topdown:
+            for dirpath, dirnames, filenames in os.walk(self.root):
+                dirnames[:] = [
+                    name for name in dirnames
+                    if not self._is_excluded(os.path.join(dirpath, name))
+                ]
+                yield dirpath, filenames
+            return
+
+        if not os.path.isdir(self.root):
+            return
+        for entry in os.scandir(self.root):
+            if entry.is_dir(follow_symlinks=False) and not self._is_excluded(entry.path):
+                for dirpath, _, filenames in os.walk(entry.path, topdown=False):
+                    yield dirpath, filenames
+
+    def _candidates(self):
+        '''Yields (name, path, stat) of the old files, except the thumbnails'''
+        for dirpath, filenames in self._walk():
+            if os.path.basename(dirpath) == THUMBNAILS_DIR:
+                continue
+            for filename in filenames:
+                path = os.path.join(dirpath, filename)
+                stat = os.lstat(path)
+                if not self._is_old(stat):
+                    self.result.kept += 1
+                    continue
+                name = os.path.relpath(path, self.root).replace(os.sep, "/")
+                yield name, path, stat
+
+    def _collect_batch(self, batch):
+        referenced = referenced_names([name for name, _, _ in batch])
+        for name, path, stat in batch:
+            if name in referenced:
+                self.result.kept += 1
+            else:
+                self._delete(path, stat)
+
+    def collect_files(self):
+        batch = []
+        for candidate in self._candidates():
+            batch.append(candidate)
+            if len(batch) >= self.batch_size:
+                self._collect_batch(batch)
+                batch = []
+        if batch:
+            self._collect_batch(batch)
+
+    def collect_thumbnails_and_dirs(self):
+        '''Deletes the thumbnails of the directories without originals,
+        then the empty directories'''
+        for dirpath, filenames in self._walk(topdown=False):
+            if os.path.basename(dirpath) == THUMBNAILS_DIR:
+                parent = os.path.dirname(dirpath)
+                if any(entry.is_file() for entry in os.scandir(parent)):
+                    self.result.kept += len(filenames)
+                    continue
+                for filename in filenames:
+                    path = os.path.join(dirpath, filename)
+                    self._delete(path, os.lstat(path))
+
+            if not self.dry_run:
+                _remove_empty_dir(dirpath)
+
+    def collect_blobs(self):
+        '''Deletes the blobs without names, they are left if the process
+        died between storing the blob and linking its name'''
+        for dirpath, _, filenames in os.walk(self.blobs):
+            for filename in filenames:
+                path = os.path.join(dirpath, filename)
+                stat = os.lstat(path)
+                if self._is_old(stat) and stat.st_nlink == 1:
+                    self._delete(path, stat)
+
+    def collect_uploads(self, expiration):
+        '''Deletes the uploads that weren't continued for expiration seconds
+        and the staging files without uploads'''
+        expired = BookUpload.objects.filter(
+            updated__lt=timezone.now() - datetime.timedelta(seconds=expiration),
+        )
+        for upload in expired.iterator():
+            path = staging_path(upload)
+            if os.path.exists(path):
+                self._delete(path, os.lstat(path))
+        if not self.dry_run:
+            expired.delete()
+
+        if not os.path.isdir(self.staging):
+            return
+
+        batch = []
+        for entry in os.scandir(self.staging):
+            batch.append(entry)
+            if len(batch) >= self.batch_size:
+                self._collect_staging_batch(batch)
+                batch = []
+        if batch:
+            self._collect_staging_batch(batch)
+
+    def _collect_staging_batch(self, entries):
+        upload_ids = {}
+        for entry in entries:
+            try:
+                upload_ids[entry] = uuid.UUID(entry.name.split(".")[0])
+            except ValueError:
+                continue
+
+        existing = set(
+            BookUpload.objects.filter(pk__in=upload_ids.values()).values_list("pk", flat=True)
+        )
+        for entry, upload_id in upload_ids.items():
+            stat = entry.stat()
+            if upload_id not in existing and self._is_old(stat):
+                self._delete(entry.path, stat)
+
+    def collect(self, upload_expiration):
+        self.collect_uploads(upload_expiration)
+        self.collect_files()
+        self.collect_thumbnails_and_dirs()
+        self.collect_blobs()
+
+        return self.result
+
+
+def collect_media(min_age=None, upload_expiration=None, batch_size=500, dry_run=False, report=None):
+    '''Deletes the unreferenced files of MEDIA_ROOT and the expired uploads.
+
+    Returns CollectedMedia'''
+    if min_age is None:
+        min_age = settings.LIBRARY_MEDIA_GC_MIN_AGE
+    if upload_expiration is None:
+        upload_expiration = settings.LIBRARY_UPLOAD_EXPIRATION
+
+    collector = MediaCollector(min_age, batch_size=batch_size, dry_run=dry_run, report=report)
+    return collector.collect(upload_expiration)
+
+
+def relocate_all_book_files(batch_size=500):
+    '''Moves the misplaced files of all the books, e.g. of the books
+    renamed before the files were relocated on save.
+    Returns number of the books with moved files'''
+    books = Book.objects.filter(Q(file__gt="") | Q(cover__gt="")).select_related("user")
+    relocated = 0
+    for book in books.iterator(chunk_size=batch_size):
+        if misplaced_fields(book) and relocate_book_files(book.pk):
+            relocated += 1
+
+    return relocated
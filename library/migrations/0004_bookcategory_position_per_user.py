@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-18 05:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0003_bookcategory_library_bookcategory_user_and_postion_unique'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='bookcategory',
+            name='position',
+            field=models.PositiveIntegerField(blank=True, help_text='position in the list of categories', verbose_name='position'),
+        ),
+    ]
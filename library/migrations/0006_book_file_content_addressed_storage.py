@@ -0,0 +1,20 @@
+# Generated by Django 4.2.30 on 2026-10-18 06:09
+
+from django.db import migrations, models
+import library.models
+import library.storage
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0005_book_shelf_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='book',
+            name='file',
+            field=models.FileField(blank=True, default=None, help_text='book file to upload', null=True, storage=library.storage.get_book_file_storage, upload_to=library.models.Book._get_bookfile_upload_path, verbose_name='book file'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 4.2.30 on 2026-10-18 06:15
+
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0006_book_file_content_addressed_storage'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BookUpload',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('filename', models.CharField(help_text='name of the uploaded file', max_length=255, verbose_name='file name')),
+                ('size', models.PositiveBigIntegerField(help_text='size of the whole file in bytes', verbose_name='size')),
+                ('offset', models.PositiveBigIntegerField(default=0, help_text='bytes received so far, the next chunk starts here', verbose_name='offset')),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('updated', models.DateTimeField(auto_now=True)),
+                ('book', models.ForeignKey(help_text='book that gets the file when the upload is finished', on_delete=django.db.models.deletion.CASCADE, related_name='uploads', related_query_name='upload', to='library.book', verbose_name='book')),
+            ],
+        ),
+    ]
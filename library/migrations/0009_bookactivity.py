@@ -0,0 +1,31 @@
+# Generated by Django 4.2.30 on 2026-10-18 06:32
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('library', '0008_media_file_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BookActivity',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('added', 'added'), ('started', 'started reading'), ('finished', 'finished'), ('rated', 'rated')], help_text='what was done with the book', max_length=10, verbose_name='kind')),
+                ('rating', models.PositiveIntegerField(blank=True, default=None, help_text='rating given to the book, only for rated', null=True, verbose_name='rating')),
+                ('created', models.DateTimeField(default=django.utils.timezone.now, verbose_name='created')),
+                ('book', models.ForeignKey(help_text='book it was done with', on_delete=django.db.models.deletion.CASCADE, related_name='activities', related_query_name='activity', to='library.book', verbose_name='book')),
+                ('user', models.ForeignKey(db_index=False, help_text='user who did it, the owner of the book', on_delete=django.db.models.deletion.CASCADE, related_name='book_activities', related_query_name='book_activity', to=settings.AUTH_USER_MODEL, verbose_name='user')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'created', 'id'], name='library_activity_user_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 4.2.30 on 2026-10-18 06:35
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+
+
+def _count(model, foreign_key, condition=Q()):
+    return Coalesce(
+        Subquery(
+            model.objects
+            .filter(condition, **{foreign_key: OuterRef("pk")})
+            .order_by()
+            .values(foreign_key)
+            .annotate(count=Count("*"))
+            .values("count"),
+            output_field=IntegerField(),
+        ),
+        0,
+    )
+
+
+def count_existing_rows(apps, schema_editor):
+    '''Counters of the existing users and categories,
+    later they are kept up to date by library.counters'''
+    User = apps.get_model("users", "User")
+    UserFollowing = apps.get_model("users", "UserFollowing")
+    Book = apps.get_model("library", "Book")
+    BookCategory = apps.get_model("library", "BookCategory")
+
+    User.objects.update(
+        followers_count=_count(UserFollowing, "whom_follows"),
+        following_count=_count(UserFollowing, "who_follows"),
+        books_count=_count(Book, "user"),
+        finished_books_count=_count(Book, "user", Q(finished__isnull=False)),
+    )
+    BookCategory.objects.update(books_count=_count(Book, "category"))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0004_user_counters'),
+        ('library', '0009_bookactivity'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bookcategory',
+            name='books_count',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='number of books in the category', verbose_name='books count'),
+        ),
+        migrations.RunPython(count_existing_rows, migrations.RunPython.noop),
+    ]
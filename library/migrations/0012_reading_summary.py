@@ -0,0 +1,82 @@
+# Generated by Django 4.2.30 on 2026-10-18 07:22
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, DurationField, ExpressionWrapper, F, Sum
+from django.db.models.functions import Coalesce, ExtractMonth, ExtractYear
+import django.db.models.deletion
+
+
+def _days(reading_time):
+    return reading_time.days if reading_time is not None else 0
+
+
+def summarize_existing_books(apps, schema_editor):
+    '''Summaries of the existing books,
+    later they are kept up to date by library.summaries'''
+    Book = apps.get_model("library", "Book")
+    ReadingSummary = apps.get_model("library", "ReadingSummary")
+
+    reading_time = ExpressionWrapper(F("finished") - F("started"), output_field=DurationField())
+    months = (
+        Book.objects
+        .filter(finished__isnull=False)
+        .order_by()
+        .annotate(year=ExtractYear("finished"), month=ExtractMonth("finished"))
+        .values("user", "year", "month")
+        .annotate(
+            finished_count=Count("pk"),
+            rated_count=Count("rating"),
+            rating_sum=Coalesce(Sum("rating"), 0),
+            timed_count=Count("started"),
+            reading_time=Sum(reading_time),
+        )
+    )
+    ReadingSummary.objects.bulk_create(
+        (
+            ReadingSummary(
+                user_id=month.pop("user"),
+                days_sum=_days(month.pop("reading_time")),
+                **month,
+            )
+            for month in months.iterator()
+        ),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('library', '0011_book_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='book',
+            name='pages',
+            field=models.PositiveIntegerField(blank=True, default=None, help_text='number of pages of the book', null=True, verbose_name='pages'),
+        ),
+        migrations.CreateModel(
+            name='ReadingSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('year', models.PositiveSmallIntegerField(verbose_name='year')),
+                ('month', models.PositiveSmallIntegerField(verbose_name='month')),
+                ('finished_count', models.IntegerField(default=0, help_text='number of the books finished in the month', verbose_name='finished count')),
+                ('rated_count', models.IntegerField(default=0, help_text='number of the finished books with rating', verbose_name='rated count')),
+                ('rating_sum', models.IntegerField(default=0, help_text='sum of the ratings of the finished books', verbose_name='rating sum')),
+                ('pages_count', models.IntegerField(default=0, help_text='number of the finished books with pages', verbose_name='pages count')),
+                ('pages_sum', models.IntegerField(default=0, help_text='sum of the pages of the finished books', verbose_name='pages sum')),
+                ('timed_count', models.IntegerField(default=0, help_text='number of the finished books with started date', verbose_name='timed count')),
+                ('days_sum', models.IntegerField(default=0, help_text='sum of the days from started to finished of the finished books', verbose_name='days sum')),
+                ('user', models.ForeignKey(db_index=False, help_text='user who finished the books', on_delete=django.db.models.deletion.CASCADE, related_name='reading_summaries', related_query_name='reading_summary', to=settings.AUTH_USER_MODEL, verbose_name='user')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='readingsummary',
+            constraint=models.UniqueConstraint(fields=('user', 'year', 'month'), name='library_readingsummary_user_month_unique'),
+        ),
+        migrations.RunPython(summarize_existing_books, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 4.2.30 on 2026-10-18 07:40
+
+from django.db import migrations, models
+import library.models
+
+# library.models.RESERVED_CATEGORY_NAMES when the migration was written
+RESERVED_CATEGORY_NAMES = ["async"]
+
+
+def rename_reserved_categories(apps, schema_editor):
+    '''Existing categories with the reserved names get a free
+    "<name>_<number>" name, so they can be opened again'''
+    BookCategory = apps.get_model("library", "BookCategory")
+
+    for category in BookCategory.objects.filter(category_name__in=RESERVED_CATEGORY_NAMES):
+        taken = set(
+            BookCategory.objects
+            .filter(user_id=category.user_id)
+            .values_list("category_name", flat=True)
+        )
+        number = 1
+        while f"{category.category_name}_{number}" in taken:
+            number += 1
+
+        category.category_name = f"{category.category_name}_{number}"
+        category.save(update_fields=["category_name"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0012_reading_summary'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='bookcategory',
+            name='category_name',
+            field=models.CharField(help_text='category of the book(fantasy, horror, etc.)', max_length=20, validators=[library.models.validate_category_name], verbose_name='category_name'),
+        ),
+        migrations.RunPython(rename_reserved_categories, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,38 @@
+from django.db import migrations
+
+# library.models.RESERVED_CATEGORY_NAMES when the migration was written
+RESERVED_CATEGORY_NAMES = [
+    "admin", "async", "login", "logout",
+    "new_book", "new_category", "import", "export", "categories_order",
+    "feed", "groups", "search", "stats", "users",
+]
+
+
+def rename_reserved_categories(apps, schema_editor):
+    '''Existing categories with the reserved names get a free
+    "<name>_<number>" name, so they can be opened again'''
+    BookCategory = apps.get_model("library", "BookCategory")
+
+    for category in BookCategory.objects.filter(category_name__in=RESERVED_CATEGORY_NAMES):
+        taken = set(
+            BookCategory.objects
+            .filter(user_id=category.user_id)
+            .values_list("category_name", flat=True)
+        )
+        number = 1
+        while f"{category.category_name}_{number}" in taken:
+            number += 1
+
+        category.category_name = f"{category.category_name}_{number}"
+        category.save(update_fields=["category_name"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0013_reserved_category_names'),
+    ]
+
+    operations = [
+        migrations.RunPython(rename_reserved_categories, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 4.2.30 on 2026-10-18 07:45
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('library', '0014_more_reserved_category_names'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='book',
+            name='category',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='library.bookcategory', verbose_name='category'),
+        ),
+        migrations.AlterField(
+            model_name='book',
+            name='user',
+            field=models.ForeignKey(db_index=False, help_text='user who has this book in their library', on_delete=django.db.models.deletion.CASCADE, related_name='books', related_query_name='book', to=settings.AUTH_USER_MODEL, verbose_name='user'),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 4.2.30 on 2026-10-18 08:06
+
+from django.db import migrations, models
+
+import hashlib
+
+
+def digest_covers(apps, schema_editor):
+    '''The stored covers get their content hash, the missing files keep ""'''
+    Book = apps.get_model("library", "Book")
+
+    stored = Book.objects.exclude(cover="").exclude(cover=None).values_list("pk", "cover")
+    # the rows are updated while they are read, so they are fetched first
+    for pk, name in list(stored):
+        field_file = Book(pk=pk, cover=name).cover
+        digest = hashlib.sha256()
+        try:
+            with field_file.open("rb") as file:
+                for chunk in file.chunks():
+                    digest.update(chunk)
+        except FileNotFoundError:
+            continue
+
+        Book.objects.filter(pk=pk, cover=name).update(cover_digest=digest.hexdigest())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0015_drop_book_fk_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='book',
+            name='cover_digest',
+            field=models.CharField(blank=True, default='', editable=False, max_length=64),
+        ),
+        migrations.RunPython(digest_covers, migrations.RunPython.noop),
+    ]
@@ -1,16 +1,34 @@
-from django.db import models, transaction
+from django.db import models, transaction, connection, IntegrityError
+from django.db.models.functions import Coalesce
 from django.core.validators import (
     MaxValueValidator,
     MinValueValidator,
 )
 from django.core.exceptions import ValidationError
 from django.conf import settings
+from django.utils import timezone
 
 from users.models import User
+from library.caching import bump_shelves_version
+from library.storage import get_book_file_storage
 
 import datetime
+import uuid
 
 DEFAULT_BOOK_CATEGORIES = ["to-read", "reading", "finished"]
+# paths that are matched before <category>/ and users/<username>/<category>/
+# (see my_lib.urls, users.urls and library.urls), a category with such
+# name couldn't be opened
+RESERVED_CATEGORY_NAMES = [
+    "admin", "async", "login", "logout",
+    "new_book", "new_category", "import", "export", "categories_order",
+    "feed", "groups", "search", "stats", "users",
+]
+
+
+def validate_category_name(value):
+    if value in RESERVED_CATEGORY_NAMES:
+        raise ValidationError(f"{value!r} is reserved and can't be a category name", code="reserved")
 
 
 class Book(models.Model):
@@ -23,6 +41,8 @@ class Book(models.Model):
         related_query_name="book",
         null=False,
         blank=False,
+        # user_shelf_idx starts with it
+        db_index=False,
     )
 
     title = models.CharField(
@@ -73,6 +93,14 @@ class Book(models.Model):
         validators=[MaxValueValidator(10), MinValueValidator(1)],
     )
 
+    pages = models.PositiveIntegerField(
+        verbose_name="pages",
+        help_text="number of pages of the book",
+        blank=True,
+        null=True,
+        default=None,
+    )
+
     comment = models.TextField(
         verbose_name="comment",
         help_text="comment on this book. Is it bad? Good?",
@@ -84,15 +112,19 @@ class Book(models.Model):
         "BookCategory",
         on_delete=models.CASCADE,
         verbose_name="category",
+        # shelf_idx starts with it
+        db_index=False,
     )
 
-    # TODO change filepath when changed inside view
+    # files are moved when the path changes, see library.media
     def _get_bookfile_upload_path(instance, filename):
         return f"books/{instance.user}/{instance.author}_{instance.title}/{filename}"
+    # the same files uploaded by different users are stored once
     file = models.FileField(
         verbose_name="book file",
         help_text="book file to upload",
         upload_to=_get_bookfile_upload_path,
+        storage=get_book_file_storage,
         blank=True,
         null=True,
         default=None,
@@ -100,7 +132,6 @@ class Book(models.Model):
 
     def _get_coverfile_upload_path(instance, filename):
         return f"books/{instance.user}/{instance.author}_{instance.title}/{filename}"
-    # TODO change filepath when updated inside view
     cover = models.ImageField(
         verbose_name="cover image",
         help_text="image of the cover of the book",
@@ -109,6 +140,30 @@ class Book(models.Model):
         null=True,
         default=None,
     )
+    # sha256 of the cover, set when it is saved, see library.thumbnails
+    cover_digest = models.CharField(max_length=64, blank=True, default="", editable=False)
+
+    # post_save signals compare these fields with the values they were
+    # loaded with to record BookActivity(library.feed), to update
+    # the counters(library.counters) and the ReadingSummary(library.summaries)
+    TRACKED_FIELDS = ["user_id", "category_id", "started", "finished", "rating", "pages"]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = {
+            field_name: getattr(instance, field_name)
+            for field_name in cls.TRACKED_FIELDS
+            if field_name in field_names
+        }
+        return instance
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        # the next save is compared with the saved values
+        self._loaded_values = {
+            field_name: getattr(self, field_name) for field_name in self.TRACKED_FIELDS
+        }
 
     def __str__(self):
         return f"{self.user}:{self.title} by {self.author}"
@@ -135,29 +190,156 @@ class Book(models.Model):
                 name="%(app_label)s_%(class)s_user_title_author_unique",
             )
         ]
+        # (user, title, author) lookups use the index of the UniqueConstraint
+        indexes = [
+            # one shelf in library.pagination.SHELF_ORDERING
+            models.Index(
+                fields=["category", "started", "id"],
+                name="%(app_label)s_%(class)s_shelf_idx",
+            ),
+            # first pages of all the user's shelves
+            models.Index(
+                fields=["user", "category", "started", "id"],
+                name="%(app_label)s_%(class)s_user_shelf_idx",
+            ),
+            # referenced files lookups of library.media
+            models.Index(fields=["file"], name="%(app_label)s_%(class)s_file_idx"),
+            models.Index(fields=["cover"], name="%(app_label)s_%(class)s_cover_idx"),
+        ]
 
 
 # TODO: add tests
 class BookCategory(models.Model):
+    # how many times to retry inserting a category if another category
+    # of the same user took its position concurrently
+    POSITION_ALLOCATION_ATTEMPTS = 5
+
+    # position used to have this default, it is only kept for the old migrations
     def _last_position():
         field = "position"
         _dict = BookCategory.objects.aggregate(models.Max(field, default=0))
 
         return _dict[f"{field}__max"] + 1
 
+    def _next_position(self):
+        '''Returns expression for the position after the last position
+        of this category's user.
+
+        It is evaluated inside of the INSERT statement, so the position can't
+        be taken between reading the last position and inserting.
+        Only reads the last entry of the (user, position) index'''
+        last_position = (
+            BookCategory.objects
+            .filter(user_id=self.user_id)
+            .order_by("-position")
+            .values("position")[:1]
+        )
+        return Coalesce(models.Subquery(last_position), 0) + 1
+
+    def _lock_user(self):
+        '''Serializes position allocation for the user on databases with
+        row locking. On SQLite writes are serialized by the database itself'''
+        if connection.features.has_select_for_update:
+            list(User.objects.select_for_update().filter(pk=self.user_id).values_list("pk"))
+
+    def _insert_with_next_position(self, *args, **kwargs):
+        for attempt in range(1, self.POSITION_ALLOCATION_ATTEMPTS + 1):
+            try:
+                with transaction.atomic():
+                    self._lock_user()
+                    self.position = self._next_position()
+                    super().save(*args, **kwargs)
+            except IntegrityError:
+                self.position = None
+                name_is_taken = BookCategory.objects.filter(
+                    user_id=self.user_id, category_name=self.category_name
+                ).exists()
+                if name_is_taken or attempt == self.POSITION_ALLOCATION_ATTEMPTS:
+                    raise
+            else:
+                self.refresh_from_db(fields=["position"])
+                return
+
+    def save(self, *args, **kwargs):
+        '''If position is not set, category is put after
+        the last category of its user'''
+        if self.position is None:
+            self._insert_with_next_position(*args, **kwargs)
+        else:
+            super().save(*args, **kwargs)
+
     def swap_position(self, new_position: int):
+        '''Swaps positions with the category of the same user
+        that is at new_position
+
+        raises BookCategory.DoesNotExist if the user has no category there'''
         with transaction.atomic():
-            if self.position == new_position:
+            other = (
+                BookCategory.objects
+                .select_for_update()
+                .get(user_id=self.user_id, position=new_position)
+            )
+            if other.pk == self.pk:
                 # no need to swap with itself
                 return
-            else:
-                book_category_to_swap_with = BookCategory.objects.get(position=new_position)
 
-                book_category_to_swap_with.position = self.position
+            self.refresh_from_db(fields=["position"])
+            BookCategory.set_positions({self: new_position, other: self.position})
+
+    def move_to(self, new_position: int):
+        '''Moves the category to new_position. Categories of the same user
+        that are between the old and the new positions are shifted by one
+        to take the freed place.
+
+        Takes the same number of statements however far the category is
+        moved: shifted categories are first moved after all the user's
+        positions, so no intermediate state violates (user, position)
+        UniqueConstraint, and then moved back shifted by one'''
+        if not isinstance(new_position, int) or new_position < 0:
+            raise ValidationError(f"Position must be a positive integer, not {new_position!r}")
+
+        with transaction.atomic():
+            user_categories = BookCategory.objects.select_for_update().filter(user_id=self.user_id)
+            positions = dict(user_categories.values_list("pk", "position"))
+            old_position = positions[self.pk]
+            if old_position == new_position:
                 self.position = new_position
+                return
+
+            if old_position < new_position:
+                between = models.Q(position__gt=old_position, position__lte=new_position)
+                shift = -1
+            else:
+                between = models.Q(position__gte=new_position, position__lt=old_position)
+                shift = 1
+
+            offset = max([*positions.values(), new_position]) + 1
+            user_categories.filter(between).update(position=models.F("position") + offset)
+            user_categories.filter(pk=self.pk).update(position=new_position)
+            user_categories.filter(position__gte=offset).update(
+                position=models.F("position") - offset + shift
+            )
+
+        self.position = new_position
+        bump_shelves_version(self.user_id)
 
-                self.save()
-                book_category_to_swap_with.save()
+    @staticmethod
+    def _validate_new_positions(categories_positions: dict):
+        '''Checks what can be checked without the database.
+        Returns username of the categories' user'''
+        usernames = {category.user_id for category in categories_positions}
+        if len(usernames) != 1:
+            raise ValidationError("Positions can only be set to the categories of one user")
+
+        positions = list(categories_positions.values())
+        if len(set(positions)) != len(positions):
+            raise ValidationError("Two categories can't have the same position")
+
+        for position in positions:
+            if not isinstance(position, int) or position < 0:
+                raise ValidationError(f"Position must be a positive integer, not {position!r}")
+
+        return usernames.pop()
 
     @staticmethod
     def set_positions(categories_positions: dict):
@@ -167,18 +349,47 @@ class BookCategory(models.Model):
 
         positions: Dict[BookCategory, int]
 
-        raises django.core.exceptions.ValidationErro
-        if there are 2 BookCategory objects with the same user and position'''
+        Not provided categories of the user keep their positions.
+        Takes the same number of statements for any number of categories:
+        the categories are first moved after all the user's positions
+        with one UPDATE and then bulk updated to their new positions,
+        so no intermediate state violates (user, position) UniqueConstraint.
+
+        raises django.core.exceptions.ValidationError
+        if there are 2 BookCategory objects with the same user and position
+        or the categories belong to different users'''
+        if not categories_positions:
+            return
+
+        username = BookCategory._validate_new_positions(categories_positions)
+        categories = list(categories_positions)
+        pks = {category.pk for category in categories}
+
         with transaction.atomic():
+            current_positions = dict(
+                BookCategory.objects
+                .select_for_update()
+                .filter(user_id=username)
+                .values_list("pk", "position")
+            )
+
+            if not pks <= current_positions.keys():
+                raise ValidationError("Only saved categories can be moved")
+
+            kept_positions = {
+                position for pk, position in current_positions.items() if pk not in pks
+            }
+            if kept_positions & set(categories_positions.values()):
+                raise ValidationError("Position is taken by another category of the user")
+
+            offset = max([*current_positions.values(), *categories_positions.values()]) + 1
+            BookCategory.objects.filter(pk__in=pks).update(position=models.F("position") + offset)
+
             for category, position in categories_positions.items():
                 category.position = position
-                category.save()
+            BookCategory.objects.bulk_update(categories, ["position"])
 
-            # check if UniqueConstraint for user and position is violated
-            # if it is violated rollback will be performed and positions
-            # of the categories will return to the previous state
-            for category in categories_positions:
-                category.validate_constraints()
+        bump_shelves_version(username)
 
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL,
@@ -195,16 +406,26 @@ class BookCategory(models.Model):
         blank=False,
         # don't set True if blank=True
         null=False,
+        validators=[validate_category_name],
     )
+    # set on save if empty, see BookCategory.save
     position = models.PositiveIntegerField(
-        default=_last_position,
         verbose_name="position",
         help_text="position in the list of categories",
-        blank=False,
+        blank=True,
         null=False,
     )
+    # kept up to date by library.counters
+    books_count = models.PositiveIntegerField(
+        verbose_name="books count",
+        help_text="number of books in the category",
+        default=0,
+        editable=False,
+    )
 
     class Meta:
+        # (user, category_name) and (user, position) lookups
+        # use the indexes of these UniqueConstraints
         constraints = [
             models.UniqueConstraint(
                 name="%(app_label)s_%(class)s_user_and_category_unique",
@@ -254,3 +475,178 @@ class LibraryGroup(models.Model):
 
     def __str__(self):
         return f"{self.name}"
+
+
+class BookUpload(models.Model):
+    '''File of the book that is being uploaded in chunks, see library.uploads'''
+    id = models.UUIDField(
+        primary_key=True,
+        default=uuid.uuid4,
+        editable=False,
+    )
+
+    book = models.ForeignKey(
+        Book,
+        verbose_name="book",
+        help_text="book that gets the file when the upload is finished",
+        on_delete=models.CASCADE,
+        related_name="uploads",
+        related_query_name="upload",
+    )
+
+    filename = models.CharField(
+        verbose_name="file name",
+        help_text="name of the uploaded file",
+        max_length=255,
+    )
+
+    size = models.PositiveBigIntegerField(
+        verbose_name="size",
+        help_text="size of the whole file in bytes",
+    )
+
+    offset = models.PositiveBigIntegerField(
+        verbose_name="offset",
+        help_text="bytes received so far, the next chunk starts here",
+        default=0,
+    )
+
+    created = models.DateTimeField(auto_now_add=True)
+    updated = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.book}: {self.filename} [{self.offset}/{self.size}]"
+
+
+class BookActivity(models.Model):
+    '''Something the user did with the book, shown in the feeds of the
+    user's followers, see library.feed'''
+    ADDED = "added"
+    STARTED = "started"
+    FINISHED = "finished"
+    RATED = "rated"
+    KINDS = [
+        (ADDED, "added"),
+        (STARTED, "started reading"),
+        (FINISHED, "finished"),
+        (RATED, "rated"),
+    ]
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        verbose_name="user",
+        help_text="user who did it, the owner of the book",
+        on_delete=models.CASCADE,
+        related_name="book_activities",
+        related_query_name="book_activity",
+        # (user, created, id) index starts with it
+        db_index=False,
+    )
+
+    book = models.ForeignKey(
+        Book,
+        verbose_name="book",
+        help_text="book it was done with",
+        on_delete=models.CASCADE,
+        related_name="activities",
+        related_query_name="activity",
+    )
+
+    kind = models.CharField(
+        verbose_name="kind",
+        help_text="what was done with the book",
+        max_length=10,
+        choices=KINDS,
+    )
+
+    rating = models.PositiveIntegerField(
+        verbose_name="rating",
+        help_text="rating given to the book, only for rated",
+        blank=True,
+        null=True,
+        default=None,
+    )
+
+    created = models.DateTimeField(
+        verbose_name="created",
+        default=timezone.now,
+    )
+
+    class Meta:
+        indexes = [
+            # time ordered activities of every followed user, see library.feed
+            models.Index(
+                fields=["user", "created", "id"],
+                name="library_activity_user_idx",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.user} {self.get_kind_display()} {self.book.title} by {self.book.author}"
+
+
+class ReadingSummary(models.Model):
+    '''Totals of the books the user finished in one month,
+    kept up to date by library.summaries'''
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        verbose_name="user",
+        help_text="user who finished the books",
+        on_delete=models.CASCADE,
+        related_name="reading_summaries",
+        related_query_name="reading_summary",
+        # (user, year, month) index starts with it
+        db_index=False,
+    )
+
+    year = models.PositiveSmallIntegerField(verbose_name="year")
+    month = models.PositiveSmallIntegerField(verbose_name="month")
+
+    # not positive: a drifted summary must not fail the saves of the books
+    finished_count = models.IntegerField(
+        verbose_name="finished count",
+        help_text="number of the books finished in the month",
+        default=0,
+    )
+    rated_count = models.IntegerField(
+        verbose_name="rated count",
+        help_text="number of the finished books with rating",
+        default=0,
+    )
+    rating_sum = models.IntegerField(
+        verbose_name="rating sum",
+        help_text="sum of the ratings of the finished books",
+        default=0,
+    )
+    pages_count = models.IntegerField(
+        verbose_name="pages count",
+        help_text="number of the finished books with pages",
+        default=0,
+    )
+    pages_sum = models.IntegerField(
+        verbose_name="pages sum",
+        help_text="sum of the pages of the finished books",
+        default=0,
+    )
+    timed_count = models.IntegerField(
+        verbose_name="timed count",
+        help_text="number of the finished books with started date",
+        default=0,
+    )
+    days_sum = models.IntegerField(
+        verbose_name="days sum",
+        help_text="sum of the days from started to finished of the finished books",
+        default=0,
+    )
+
+    class Meta:
+        # the user's rows are read in order from the index of this UniqueConstraint
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "year", "month"],
+                name="%(app_label)s_%(class)s_user_month_unique",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.user} {self.year}-{self.month:02}: {self.finished_count} finished"
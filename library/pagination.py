@@ -0,0 +1,152 @@
+from django.conf import settings
+from django.core.exceptions import BadRequest
+from django.db.models import F, Q
+from django.utils.http import urlsafe_base64_encode, urlsafe_base64_decode
+
+import datetime
+
+
+# shelves whose first pages are read by one query, every shelf adds
+# a subquery to the WHERE and SQLite limits the depth of expressions
+FIRST_PAGES_SHELVES_PER_QUERY = 100
+
+# Stable ordering of the books inside of a shelf.
+# Books without "started" date go first, id breaks the ties
+SHELF_ORDERING = (F("started").asc(nulls_first=True), F("id").asc())
+
+
+class ShelfPage(list):
+    '''List of the books of one shelf page.
+
+    next_cursor is None if it is the last page, otherwise it should be passed
+    as "after" to get the next page. total is the number of all the books
+    of the shelf(BookCategory.books_count) if it's known'''
+    def __init__(self, books=(), next_cursor=None, total=None):
+        super().__init__(books)
+        self.next_cursor = next_cursor
+        self.total = total
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+
+def get_page_size():
+    return settings.LIBRARY_SHELF_PAGE_SIZE
+
+
+def encode_cursor(book):
+    started = book.started.isoformat() if book.started is not None else ""
+    return urlsafe_base64_encode(f"{started}_{book.id}".encode())
+
+
+def decode_cursor(cursor):
+    '''Returns (started, id) of the last book of the previous page
+
+    raises django.core.exceptions.BadRequest if cursor is malformed'''
+    try:
+        started, book_id = urlsafe_base64_decode(cursor).decode().split("_")
+        started = datetime.date.fromisoformat(started) if started else None
+        return started, int(book_id)
+    except ValueError:
+        raise BadRequest("Invalid cursor")
+
+
+def filter_after_cursor(books, cursor):
+    '''Returns books that come after the cursor in SHELF_ORDERING'''
+    started, book_id = decode_cursor(cursor)
+    if started is None:
+        after = Q(started__isnull=True, id__gt=book_id) | Q(started__isnull=False)
+    else:
+        after = Q(started__gt=started) | Q(started=started, id__gt=book_id)
+
+    return books.filter(after)
+
+
+def make_page(books, page_size):
+    '''Makes ShelfPage from page_size + 1 books.
+
+    The extra book is only fetched to know if there is a next page'''
+    books = list(books)
+    if len(books) <= page_size:
+        return ShelfPage(books)
+
+    books = books[:page_size]
+    return ShelfPage(books, next_cursor=encode_cursor(books[-1]))
+
+
+def _page_queryset(books, cursor, page_size):
+    if cursor:
+        books = filter_after_cursor(books, cursor)
+
+    return books.order_by(*SHELF_ORDERING)[:page_size + 1]
+
+
+def paginate_shelf(books, cursor=None, page_size=None):
+    '''Returns ShelfPage of the books queryset starting after the cursor'''
+    page_size = page_size or get_page_size()
+    return make_page(_page_queryset(books, cursor, page_size), page_size)
+
+
+async def apaginate_shelf(books, cursor=None, page_size=None):
+    '''Async version of paginate_shelf()'''
+    page_size = page_size or get_page_size()
+    return make_page([book async for book in _page_queryset(books, cursor, page_size)], page_size)
+
+
+def _first_pages_querysets(books, category_ids, page_size):
+    '''Returns querysets of the first pages of the shelves. Every shelf
+    is a subquery with LIMIT that reads only its first page from the shelf
+    index and the books are looked up by their ids, so the query doesn't
+    depend on how many books the shelves have'''
+    category_ids = list(category_ids)
+    querysets = []
+    for start in range(0, len(category_ids), FIRST_PAGES_SHELVES_PER_QUERY):
+        first_pages = Q()
+        for category_id in category_ids[start:start + FIRST_PAGES_SHELVES_PER_QUERY]:
+            shelf = _page_queryset(books.filter(category_id=category_id), None, page_size)
+            first_pages |= Q(pk__in=shelf.values("pk"))
+        querysets.append(books.filter(first_pages).order_by("category_id", *SHELF_ORDERING))
+
+    return querysets
+
+
+def _group_first_pages(books, page_size):
+    books_by_category_id = {}
+    for book in books:
+        books_by_category_id.setdefault(book.category_id, []).append(book)
+
+    return {
+        category_id: make_page(category_books, page_size)
+        for category_id, category_books in books_by_category_id.items()
+    }
+
+
+def first_pages_by_category(books, category_ids, page_size=None):
+    '''Returns {category_id: ShelfPage} with the first page of every shelf
+    of category_ids, the shelves without books are missing.
+
+    books are only filtered by the shelves, e.g. Book.objects.select_related().
+    Don't filter them by the user of the shelves: SQLite would read all the
+    user's books for that filter instead of looking the pages up.
+
+    Takes one query for every FIRST_PAGES_SHELVES_PER_QUERY shelves: only
+    the first page_size + 1 books of each shelf are read'''
+    page_size = page_size or get_page_size()
+    books = [
+        book
+        for queryset in _first_pages_querysets(books, category_ids, page_size)
+        for book in queryset
+    ]
+    return _group_first_pages(books, page_size)
+
+
+async def afirst_pages_by_category(books, category_ids, page_size=None):
+    '''Async version of first_pages_by_category()'''
+    page_size = page_size or get_page_size()
+    books = [
+        book
+        for queryset in _first_pages_querysets(books, category_ids, page_size)
+        async for book in queryset
+    ]
+    return _group_first_pages(books, page_size)
@@ -0,0 +1,312 @@
+'''Full-text search over the titles, authors and comments of the books.
+
+The index depends on the database:
+
+    SQLite      FTS5 table library_book_fts of the columns of library_book,
+                kept in sync by triggers on library_book
+    PostgreSQL  GIN index of the tsvector of the same columns,
+                kept in sync by PostgreSQL itself
+
+Triggers(unlike signals) also see update() and bulk_create(). SQLite
+migrations that rebuild library_book drop its triggers, so install() is
+run after every migrate(see LibraryConfig.ready) and rebuilds the index
+if the triggers were missing. The rebuild_search_index command rebuilds
+it by hand.
+
+Results are ranked: matches in the title weigh more than in the author,
+and these more than in the comment. Ranking is the expensive part of a
+query, a common word matches most of the user's books, so SQLite ranks
+only the newest LIBRARY_SEARCH_CANDIDATES matches.
+'''
+from django.conf import settings
+from django.db import NotSupportedError, connection, transaction
+
+from users.models import UserFollowing
+from library.models import Book
+
+import re
+
+FTS_TABLE = "library_book_fts"
+TRIGGERS = ["library_book_fts_insert", "library_book_fts_delete", "library_book_fts_update"]
+# bm25 weights of the FTS columns: title, author, comment, owner
+BM25_WEIGHTS = "10.0, 5.0, 1.0, 0.0"
+
+WORD_RE = re.compile(r"\w+")
+
+OWN = "own"
+FOLLOWING = "following"
+
+
+def get_results_limit():
+    return settings.LIBRARY_SEARCH_RESULTS
+
+
+def get_candidates_limit():
+    return settings.LIBRARY_SEARCH_CANDIDATES
+
+
+def _words(query):
+    return WORD_RE.findall(query.lower())
+
+
+def _fts_phrase(text):
+    return '"' + text.replace('"', '""') + '"'
+
+
+def owner_token(username):
+    '''Token of the book's owner in the FTS index. Usernames would be split
+    into several tokens, their hex is one token of this user only'''
+    return "u" + username.encode().hex()
+
+
+class SQLiteSearchBackend():
+    '''FTS5 table without content(only the index), filled by the triggers.
+
+    Besides the searched columns it has the owner column with
+    owner_token() of the user, so the books of one user(or of the followed
+    users) are narrowed down by the index before ranking'''
+    _OWNER_SQL = "'u' || lower(hex({row}.user_id))"
+    _FTS_VALUES = "{row}.id, {row}.title, {row}.author, {row}.comment, " + _OWNER_SQL
+
+    INSTALL_SQL = [
+        f'''
+        CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+            title, author, comment, owner,
+            content='',
+            tokenize='unicode61 remove_diacritics 2'
+        )
+        ''',
+        f'''
+        CREATE TRIGGER IF NOT EXISTS library_book_fts_insert AFTER INSERT ON library_book BEGIN
+            INSERT INTO {FTS_TABLE}(rowid, title, author, comment, owner)
+            VALUES ({_FTS_VALUES.format(row="new")});
+        END
+        ''',
+        f'''
+        CREATE TRIGGER IF NOT EXISTS library_book_fts_delete AFTER DELETE ON library_book BEGIN
+            INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, author, comment, owner)
+            VALUES ('delete', {_FTS_VALUES.format(row="old")});
+        END
+        ''',
+        f'''
+        CREATE TRIGGER IF NOT EXISTS library_book_fts_update
+        AFTER UPDATE OF title, author, comment, user_id ON library_book BEGIN
+            INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, author, comment, owner)
+            VALUES ('delete', {_FTS_VALUES.format(row="old")});
+            INSERT INTO {FTS_TABLE}(rowid, title, author, comment, owner)
+            VALUES ({_FTS_VALUES.format(row="new")});
+        END
+        ''',
+    ]
+    UNINSTALL_SQL = [
+        *[f"DROP TRIGGER IF EXISTS {trigger}" for trigger in TRIGGERS],
+        f"DROP TABLE IF EXISTS {FTS_TABLE}",
+    ]
+    REBUILD_SQL = [
+        f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('delete-all')",
+        f'''
+        INSERT INTO {FTS_TABLE}(rowid, title, author, comment, owner)
+        SELECT {_FTS_VALUES.format(row="library_book")} FROM library_book
+        ''',
+    ]
+
+    def _missing_triggers(self, cursor):
+        cursor.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'trigger' AND tbl_name = 'library_book'"
+        )
+        return set(TRIGGERS) - {name for name, in cursor.fetchall()}
+
+    def install(self, connection):
+        '''Creates what is missing of the index, returns True if it had to be rebuilt'''
+        with connection.cursor() as cursor:
+            missing = self._missing_triggers(cursor)
+            if not missing:
+                return False
+
+            for sql in self.INSTALL_SQL:
+                cursor.execute(sql)
+            self._rebuild(cursor)
+
+        return True
+
+    def uninstall(self, connection):
+        with connection.cursor() as cursor:
+            for sql in self.UNINSTALL_SQL:
+                cursor.execute(sql)
+
+    def _rebuild(self, cursor):
+        for sql in self.REBUILD_SQL:
+            cursor.execute(sql)
+
+    def rebuild(self):
+        with transaction.atomic(), connection.cursor() as cursor:
+            self._rebuild(cursor)
+
+    def match_expression(self, query):
+        '''FTS5 query of all the words of the user's query,
+        None if there are no words'''
+        words = _words(query)
+        if not words:
+            return None
+
+        return "{title author comment} : (" + " AND ".join(map(_fts_phrase, words)) + ")"
+
+    def search(self, query, usernames=None, followed_by=None, limit=None):
+        '''Returns [(book id, rank)] best first'''
+        expression = self.match_expression(query)
+        if expression is None:
+            return []
+
+        if usernames is not None:
+            owners = " OR ".join(owner_token(username) for username in usernames)
+            match_sql = "%s"
+            params = [f"owner : ({owners}) AND {expression}"]
+        else:
+            # the owners are the followed users, the expression is built by the query.
+            # Without followed users it's "u", which is no one's owner token
+            match_sql = f'''(
+                SELECT 'owner : ('
+                    || coalesce(group_concat({self._OWNER_SQL.format(row="following")}, ' OR '), 'u')
+                    || ') AND ' || %s
+                FROM (
+                    SELECT whom_follows_id AS user_id FROM {UserFollowing._meta.db_table}
+                    WHERE who_follows_id = %s
+                ) AS following
+            )'''
+            params = [expression, followed_by]
+
+        # the index returns the matches by rowid without reading the rest,
+        # bm25 is computed only for the newest candidates
+        with connection.cursor() as cursor:
+            cursor.execute(f'''
+                SELECT rowid, rank FROM (
+                    SELECT rowid, bm25({FTS_TABLE}, {BM25_WEIGHTS}) AS rank
+                    FROM {FTS_TABLE}
+                    WHERE {FTS_TABLE} MATCH {match_sql}
+                    ORDER BY rowid DESC
+                    LIMIT %s
+                )
+                ORDER BY rank, rowid DESC
+                LIMIT %s
+            ''', [*params, get_candidates_limit(), limit])
+            # bm25 is lower for better matches
+            return [(book_id, -rank) for book_id, rank in cursor.fetchall()]
+
+
+class PostgresSearchBackend():
+    INDEX_NAME = "library_book_search_idx"
+    CONFIG = "simple"
+
+    def search_vector(self):
+        # imported here, it needs psycopg
+        from django.contrib.postgres.search import SearchVector
+
+        return (
+            SearchVector("title", weight="A", config=self.CONFIG)
+            + SearchVector("author", weight="B", config=self.CONFIG)
+            + SearchVector("comment", weight="D", config=self.CONFIG)
+        )
+
+    def _index(self):
+        from django.contrib.postgres.indexes import GinIndex
+
+        return GinIndex(self.search_vector(), name=self.INDEX_NAME)
+
+    def install(self, connection):
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1 FROM pg_indexes WHERE indexname = %s", [self.INDEX_NAME])
+            if cursor.fetchone():
+                return False
+
+        with connection.schema_editor() as schema_editor:
+            schema_editor.add_index(Book, self._index())
+        return True
+
+    def uninstall(self, connection):
+        with connection.schema_editor() as schema_editor:
+            schema_editor.remove_index(Book, self._index())
+
+    def rebuild(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f"REINDEX INDEX {self.INDEX_NAME}")
+
+    def search(self, query, usernames=None, followed_by=None, limit=None):
+        from django.contrib.postgres.search import SearchQuery, SearchRank
+
+        words = _words(query)
+        if not words:
+            return []
+
+        search_query = SearchQuery(" & ".join(words), search_type="raw", config=self.CONFIG)
+        books = Book.objects.all()
+        if usernames is not None:
+            books = books.filter(user__in=usernames)
+        elif followed_by is not None:
+            books = books.filter(user__follower__who_follows=followed_by)
+
+        vector = self.search_vector()
+        return list(
+            books
+            .annotate(search_vector=vector, rank=SearchRank(vector, search_query))
+            .filter(search_vector=search_query)
+            .order_by("-rank", "id")
+            .values_list("id", "rank")[:limit]
+        )
+
+
+BACKENDS = {
+    "sqlite": SQLiteSearchBackend,
+    "postgresql": PostgresSearchBackend,
+}
+
+
+def get_search_backend(vendor=None):
+    '''Returns the backend of the database or None if it has no full-text search here'''
+    backend = BACKENDS.get(vendor or connection.vendor)
+    return backend() if backend is not None else None
+
+
+def install_search_index(connection):
+    backend = get_search_backend(connection.vendor)
+    return backend.install(connection) if backend is not None else False
+
+
+def uninstall_search_index(connection):
+    backend = get_search_backend(connection.vendor)
+    if backend is not None:
+        backend.uninstall(connection)
+
+
+def rebuild_search_index():
+    get_search_backend().rebuild()
+
+
+def search_books(query, user, scope=OWN, limit=None):
+    '''Returns list of the books matching the query, best first,
+    every book has search_rank.
+
+    scope is OWN for the books of the user or FOLLOWING for the books of
+    the users the user follows. Takes 2 queries'''
+    limit = limit or get_results_limit()
+    backend = get_search_backend()
+    if backend is None:
+        raise NotSupportedError(f"No full-text search backend for {connection.vendor}")
+
+    if scope == OWN:
+        ranked = backend.search(query, usernames=[user.pk], limit=limit)
+    elif scope == FOLLOWING:
+        ranked = backend.search(query, followed_by=user.pk, limit=limit)
+    else:
+        raise ValueError(f"Unknown search scope {scope!r}")
+
+    if not ranked:
+        return []
+
+    books = Book.objects.select_related("user", "category").in_bulk([book_id for book_id, _ in ranked])
+    results = []
+    for book_id, rank in ranked:
+        if book_id in books:
+            books[book_id].search_rank = rank
+            results.append(books[book_id])
+
+    return results
@@ -0,0 +1,106 @@
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+
+from users.models import User, UserFollowing
+from library.caching import bump_shelves_version
+from library.models import Book, BookCategory
+from library.thumbnails import get_cached_thumbnail, schedule_thumbnail, update_image_digest
+from library import counters, feed, media, summaries
+
+
+@receiver(post_save, sender=Book)
+@receiver(post_delete, sender=Book)
+@receiver(post_save, sender=BookCategory)
+@receiver(post_delete, sender=BookCategory)
+def invalidate_user_shelves(sender, instance, **kwargs):
+    bump_shelves_version(instance.user_id)
+
+
+@receiver(pre_save, sender=Book)
+def digest_cover(sender, instance, raw=False, **kwargs):
+    if not raw:
+        update_image_digest(instance.cover)
+
+
+@receiver(pre_save, sender=User)
+def digest_profile_picture(sender, instance, raw=False, **kwargs):
+    if not raw:
+        update_image_digest(instance.profile_picture)
+
+
+def _schedule_thumbnail_on_commit(field_file, size_name):
+    if field_file and get_cached_thumbnail(field_file, size_name) is None:
+        transaction.on_commit(lambda: schedule_thumbnail(field_file, size_name))
+
+
+@receiver(post_save, sender=Book)
+def generate_cover_thumbnail(sender, instance, **kwargs):
+    _schedule_thumbnail_on_commit(instance.cover, "cover")
+
+
+@receiver(post_save, sender=User)
+def generate_profile_picture_thumbnail(sender, instance, **kwargs):
+    _schedule_thumbnail_on_commit(instance.profile_picture, "avatar")
+
+
+@receiver(post_save, sender=Book)
+def relocate_book_files(sender, instance, created, raw=False, **kwargs):
+    # the paths depend on the user, author and title, the check needs the
+    # user, so it's done after the commit too. Files of the new books are
+    # just saved to their paths
+    if not raw and not created and (instance.file or instance.cover):
+        transaction.on_commit(lambda: media.relocate_book_files(instance.pk))
+
+
+@receiver(post_save, sender=Book)
+def record_book_activity(sender, instance, created, raw=False, **kwargs):
+    if not raw:
+        feed.record_activities(instance, created)
+
+
+@receiver(post_save, sender=Book)
+def count_saved_book(sender, instance, created, raw=False, **kwargs):
+    if not raw:
+        counters.book_saved(instance, created)
+
+
+@receiver(post_delete, sender=Book)
+def count_deleted_book(sender, instance, **kwargs):
+    counters.book_deleted(instance)
+
+
+@receiver(post_save, sender=Book)
+def summarize_saved_book(sender, instance, created, raw=False, **kwargs):
+    if not raw:
+        summaries.book_saved(instance, created)
+
+
+@receiver(post_delete, sender=Book)
+def summarize_deleted_book(sender, instance, origin=None, **kwargs):
+    # the summaries of a deleted user are deleted before its books
+    if not isinstance(origin, User):
+        summaries.book_deleted(instance)
+
+
+@receiver(post_save, sender=UserFollowing)
+def count_new_following(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        counters.following_changed(instance, 1)
+
+
+@receiver(post_delete, sender=UserFollowing)
+def count_deleted_following(sender, instance, **kwargs):
+    counters.following_changed(instance, -1)
+
+
+@receiver(post_delete, sender=Book)
+def delete_book_files(sender, instance, **kwargs):
+    if instance.file or instance.cover:
+        transaction.on_commit(lambda: media.delete_files([instance.file, instance.cover]))
+
+
+@receiver(post_delete, sender=User)
+def delete_profile_picture(sender, instance, **kwargs):
+    if instance.profile_picture:
+        transaction.on_commit(lambda: media.delete_files([instance.profile_picture]))
@@ -0,0 +1,189 @@
+'''Reading statistics of a user's library.
+
+The finished books are counted from the monthly rollup(library.summaries),
+one indexed read of the user's ReadingSummary rows, not a scan of the
+books:
+
+    finished books per month and year
+    average days from started to finished
+    pages read
+    reading streaks                          months in a row with a finished
+                                             book, DENSE_RANK of the months
+
+The streaks are found in the months: a streak is a run of consecutive
+months, so month number - dense rank of the month is the same for all of
+its months and differs from the other streaks'. The years are summed from
+the months, both in one pass over the monthly rows.
+
+The shelves and authors are aggregated from the books by the database,
+the number of books and the average rating of all the rated books are
+summed from the shelves.
+The stats are cached with the shelves(library.caching), so they are
+invalidated by the same Book writes.
+'''
+from django.db.models import Avg, Count, F, Window
+from django.db.models.functions import DenseRank
+
+from library.caching import get_or_compute_shelves
+from library.models import Book, ReadingSummary
+from library.summaries import SUMMARY_FIELDS
+
+import datetime
+
+# number of the authors with the most books in the stats
+TOP_AUTHORS = 10
+
+
+def _average(total, count, digits=2):
+    return round(total / count, digits) if count else None
+
+
+def _rounded(average):
+    return round(average, 2) if average is not None else None
+
+
+def finished_per_month(user):
+    '''Returns [{"month", "rank", SUMMARY_FIELDS}] of the user's months
+    with finished books, oldest first, rank is the DENSE_RANK of the month'''
+    rows = (
+        ReadingSummary.objects
+        .filter(user=user, finished_count__gt=0)
+        .annotate(rank=Window(DenseRank(), order_by=[F("year").asc(), F("month").asc()]))
+        .order_by("year", "month")
+        .values_list("year", "month", "rank", *SUMMARY_FIELDS)
+    )
+    return [
+        {"month": datetime.date(year, month, 1), "rank": rank, **dict(zip(SUMMARY_FIELDS, sums))}
+        for year, month, rank, *sums in rows
+    ]
+
+
+def totals(months, shelves):
+    '''Returns the totals of the months of finished_per_month()
+    and the not rounded shelves of shelves()'''
+    sums = {field_name: sum(month[field_name] for month in months) for field_name in SUMMARY_FIELDS}
+    rated = sum(shelf["rated"] for shelf in shelves)
+    rating_sum = sum(shelf["average_rating"] * shelf["rated"] for shelf in shelves if shelf["rated"])
+    return {
+        "books": sum(shelf["books"] for shelf in shelves),
+        "finished": sums["finished_count"],
+        "rated": rated,
+        "average_rating": _average(rating_sum, rated),
+        "pages": sums["pages_sum"],
+        "average_days_to_finish": _average(sums["days_sum"], sums["timed_count"], digits=1),
+    }
+
+
+def _month_number(month):
+    return month.year * 12 + month.month
+
+
+def streaks(months):
+    '''Returns [{"start", "end", "months", "finished"}] of the months of
+    finished_per_month(), oldest first'''
+    result = []
+    streak_number = None
+    for month in months:
+        number = _month_number(month["month"]) - month["rank"]
+        if result and number == streak_number:
+            streak = result[-1]
+            streak["end"] = month["month"]
+            streak["months"] += 1
+            streak["finished"] += month["finished_count"]
+        else:
+            result.append({
+                "start": month["month"],
+                "end": month["month"],
+                "months": 1,
+                "finished": month["finished_count"],
+            })
+        streak_number = number
+
+    return result
+
+
+def finished_per_year(months):
+    '''Returns [{"year", "finished"}] of the months of finished_per_month()'''
+    years = {}
+    for month in months:
+        years[month["month"].year] = years.get(month["month"].year, 0) + month["finished_count"]
+
+    return [{"year": year, "finished": finished} for year, finished in years.items()]
+
+
+def shelves(books):
+    return list(
+        books
+        .values("category")
+        .annotate(
+            category_name=F("category__category_name"),
+            books=Count("pk"),
+            rated=Count("rating"),
+            average_rating=Avg("rating"),
+        )
+        .values("category_name", "books", "rated", "average_rating")
+        .order_by("category__position")
+    )
+
+
+def top_authors(books):
+    return list(
+        books
+        .exclude(author="")
+        .values("author")
+        .annotate(
+            books=Count("pk"),
+            finished=Count("finished"),
+            rated=Count("rating"),
+            average_rating=Avg("rating"),
+        )
+        .order_by("-books", "author")[:TOP_AUTHORS]
+    )
+
+
+def compute_stats(user):
+    books = Book.objects.filter(user=user).order_by()
+
+    months = finished_per_month(user)
+    user_shelves = shelves(books)
+    stats = {
+        **totals(months, user_shelves),
+        "finished_per_year": finished_per_year(months),
+        "finished_per_month": [
+            {"month": month["month"], "finished": month["finished_count"], "pages": month["pages_sum"]}
+            for month in months
+        ],
+        "streaks": streaks(months),
+        "shelves": user_shelves,
+        "top_authors": top_authors(books),
+    }
+    for row in stats["shelves"] + stats["top_authors"]:
+        row["average_rating"] = _rounded(row["average_rating"])
+
+    return stats
+
+
+def _previous_month(month):
+    return (month - datetime.timedelta(days=1)).replace(day=1)
+
+
+def get_reading_stats(user):
+    '''Returns dict of the user's stats:
+    books, finished, rated, average_rating, pages, average_days_to_finish,
+    finished_per_year: [{"year", "finished"}],
+    finished_per_month: [{"month", "finished", "pages"}],
+    streaks: [{"start", "end", "months", "finished"}],
+    longest_streak, current_streak: streak or None,
+    shelves: [{"category_name", "books", "rated", "average_rating"}],
+    top_authors: [{"author", "books", "finished", "rated", "average_rating"}]
+
+    The current streak is the one that goes on this or the previous month'''
+    stats = get_or_compute_shelves(user.pk, "stats", lambda: compute_stats(user))
+
+    this_month = datetime.date.today().replace(day=1)
+    last = stats["streaks"][-1] if stats["streaks"] else None
+    return {
+        **stats,
+        "longest_streak": max(stats["streaks"], key=lambda streak: streak["months"], default=None),
+        "current_streak": last if last and last["end"] >= _previous_month(this_month) else None,
+    }
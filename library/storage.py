@@ -0,0 +1,151 @@
+'''Content-addressed storage of the book files.
+
+Every distinct file content is stored once as
+
+    <MEDIA_ROOT>/blobs/<first 2 hash chars>/<next 2 hash chars>/<sha256>
+
+and the usual per-book names(see Book._get_bookfile_upload_path) are hard
+links to it. The number of hard links of the blob is its reference count:
+when the last per-book name is deleted, the blob is deleted too.
+If the file system can't hard link a name, the name is a copy of the
+blob. A copy doesn't reference its blob, so a blob without names is
+deleted right after it is copied.
+
+The hash is computed while the upload is written, so the file is read once.
+'''
+from django.core.files.storage import FileSystemStorage, storages
+
+import errno
+import hashlib
+import os
+import shutil
+import tempfile
+
+
+def get_book_file_storage():
+    '''Storage of Book.file, configured by "books" in STORAGES setting'''
+    return storages["books"]
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    BLOBS_DIR = "blobs"
+    CHUNK_SIZE = 64 * 2**10
+
+    def blob_path(self, digest):
+        return os.path.join(self.location, self.BLOBS_DIR, digest[:2], digest[2:4], digest)
+
+    def _write_temporary(self, content):
+        '''Writes content to a temporary file near the blobs.
+
+        Returns (temporary file path, sha256 of content)'''
+        temp_dir = os.path.join(self.location, self.BLOBS_DIR, "tmp")
+        os.makedirs(temp_dir, exist_ok=True)
+
+        digest = hashlib.sha256()
+        fd, temp_path = tempfile.mkstemp(dir=temp_dir)
+        try:
+            with os.fdopen(fd, "wb") as temp_file:
+                for chunk in content.chunks():
+                    if isinstance(chunk, str):
+                        chunk = chunk.encode()
+                    digest.update(chunk)
+                    temp_file.write(chunk)
+        except BaseException:
+            os.remove(temp_path)
+            raise
+
+        return temp_path, digest.hexdigest()
+
+    def _store_blob(self, content):
+        '''Returns path of the blob with the content, the blob is created
+        if there is no blob with the same content yet'''
+        temp_path, digest = self._write_temporary(content)
+        blob = self.blob_path(digest)
+        os.makedirs(os.path.dirname(blob), exist_ok=True)
+        try:
+            # link fails if the blob exists, so concurrent uploads of the
+            # same content can't overwrite each other
+            os.link(temp_path, blob)
+        except FileExistsError:
+            pass
+        else:
+            if self.file_permissions_mode is not None:
+                os.chmod(blob, self.file_permissions_mode)
+        finally:
+            os.remove(temp_path)
+
+        return blob
+
+    def _link(self, blob, full_path):
+        try:
+            os.link(blob, full_path)
+        except FileExistsError:
+            raise
+        except OSError as error:
+            if error.errno not in (errno.EXDEV, errno.EPERM, errno.ENOTSUP, errno.EMLINK):
+                raise
+            # the file system can't hard link, the file is stored
+            # without deduplication
+            with open(blob, "rb") as source, open(full_path, "xb") as target:
+                shutil.copyfileobj(source, target)
+            # no name links the blob, the copies could never free it
+            self._delete_unreferenced_blob(blob, os.stat(blob))
+
+    def _save(self, name, content):
+        blob = self._store_blob(content)
+
+        while True:
+            full_path = self.path(name)
+            os.makedirs(os.path.dirname(full_path), exist_ok=True)
+            try:
+                self._link(blob, full_path)
+            except FileExistsError:
+                # the name was taken after get_available_name
+                name = self.get_available_name(name)
+            else:
+                break
+
+        return str(name).replace("\\", "/")
+
+    def _file_digest(self, full_path):
+        digest = hashlib.sha256()
+        with open(full_path, "rb") as file:
+            for chunk in iter(lambda: file.read(self.CHUNK_SIZE), b""):
+                digest.update(chunk)
+
+        return digest.hexdigest()
+
+    def delete(self, name):
+        if not name:
+            raise ValueError("The name must be given to delete().")
+
+        full_path = self.path(name)
+        if os.path.isdir(full_path):
+            return super().delete(name)
+
+        try:
+            stat = os.stat(full_path)
+        except FileNotFoundError:
+            return
+
+        # 2 links are this name and the blob itself. Only the last
+        # reference is hashed to find its blob, the others are just unlinked.
+        # A name with 1 link is a copy(or its blob is gone), it has no blob
+        blob = None
+        if stat.st_nlink == 2:
+            blob = self.blob_path(self._file_digest(full_path))
+
+        os.remove(full_path)
+
+        if blob is not None:
+            self._delete_unreferenced_blob(blob, stat)
+
+    def _delete_unreferenced_blob(self, blob, removed_stat):
+        try:
+            blob_stat = os.stat(blob)
+        except FileNotFoundError:
+            return
+
+        # the blob could be replaced or referenced again meanwhile
+        if blob_stat.st_ino == removed_stat.st_ino and blob_stat.st_nlink == 1:
+            os.remove(blob)
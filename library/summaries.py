@@ -0,0 +1,163 @@
+'''Monthly rollup of the finished books, ReadingSummary.
+
+Every finished book adds to the row of its user and the (year, month) it
+was finished in: 1 to finished_count, its rating to rating_sum, pages to
+pages_sum and the days from started to finished to days_sum(and 1 to
+the counts of the books that have them). The profile stats(library.stats)
+read the user's rows of the (user, year, month) index, not the books.
+
+The signals of Book(library.signals) apply the difference between what
+the book added with the values it was loaded with and with the saved
+ones, as UPDATE ... SET sum = sum + delta, so concurrent saves don't
+lose each other's changes. The row of a month is inserted by its first
+book.
+
+Like the counters(library.counters), update(), bulk_create(), raw saves
+and the saves of the books that were not loaded from the database are
+not seen, so the rows can drift. rebuild_reading_summaries(the
+rebuild_reading_summaries management command) recomputes them from the
+books in bulk.
+'''
+from django.db import IntegrityError, transaction
+from django.db.models import Count, DurationField, ExpressionWrapper, F, Sum
+from django.db.models.functions import Coalesce, ExtractMonth, ExtractYear
+
+from users.models import User
+from library.counters import merge_deltas
+from library.models import Book, ReadingSummary
+
+SUMMARY_FIELDS = [
+    "finished_count", "rated_count", "rating_sum",
+    "pages_count", "pages_sum", "timed_count", "days_sum",
+]
+
+
+def book_deltas(book, sign):
+    '''Returns {(year, month): {field: delta}} for adding(sign=1)
+    or removing(sign=-1) the book'''
+    if book.finished is None:
+        return {}
+
+    deltas = {"finished_count": sign}
+    if book.rating is not None:
+        deltas.update(rated_count=sign, rating_sum=sign * book.rating)
+    if book.pages is not None:
+        deltas.update(pages_count=sign, pages_sum=sign * book.pages)
+    if book.started is not None:
+        deltas.update(timed_count=sign, days_sum=sign * (book.finished - book.started).days)
+
+    return {(book.finished.year, book.finished.month): deltas}
+
+
+def add_to_summary(user_id, year, month, **deltas):
+    '''Adds the deltas to the user's row of the month,
+    inserts the row if it's the first book of the month'''
+    deltas = {field: delta for field, delta in deltas.items() if delta}
+    if not deltas:
+        return
+
+    row = ReadingSummary.objects.filter(user_id=user_id, year=year, month=month)
+    increments = {field: F(field) + delta for field, delta in deltas.items()}
+    if row.update(**increments):
+        return
+    # only adding a book inserts the row, removing one from a missing row
+    # means the row drifted(or was deleted with the user)
+    if any(delta < 0 for delta in deltas.values()):
+        return
+
+    try:
+        with transaction.atomic():
+            ReadingSummary.objects.create(user_id=user_id, year=year, month=month, **deltas)
+    except IntegrityError:
+        # another book of the month inserted the row concurrently
+        row.update(**increments)
+
+
+def _apply(user_id, deltas):
+    for (year, month), fields in deltas.items():
+        add_to_summary(user_id, year, month, **fields)
+
+
+def book_saved(book, created):
+    if created:
+        _apply(book.user_id, book_deltas(book, 1))
+        return
+
+    loaded = getattr(book, "_loaded_values", None)
+    if loaded is None:
+        return
+
+    old_book = Book(**{
+        field_name: loaded.get(field_name, getattr(book, field_name))
+        for field_name in ["user_id", "started", "finished", "rating", "pages"]
+    })
+    if old_book.user_id != book.user_id:
+        # the book moved to another user's summaries
+        _apply(old_book.user_id, book_deltas(old_book, -1))
+        _apply(book.user_id, book_deltas(book, 1))
+        return
+
+    # zero deltas are skipped, a book whose tracked fields didn't change takes no queries
+    _apply(book.user_id, merge_deltas(book_deltas(old_book, -1), book_deltas(book, 1)))
+
+
+def book_deleted(book):
+    _apply(book.user_id, book_deltas(book, -1))
+
+
+def _days(reading_time):
+    # Sum of no durations is NULL
+    return reading_time.days if reading_time is not None else 0
+
+
+def summary_rows(books):
+    '''Returns unsaved ReadingSummary list of the books, aggregated by the database'''
+    reading_time = ExpressionWrapper(F("finished") - F("started"), output_field=DurationField())
+    months = (
+        books
+        .filter(finished__isnull=False)
+        .order_by()
+        .annotate(year=ExtractYear("finished"), month=ExtractMonth("finished"))
+        .values("user", "year", "month")
+        .annotate(
+            finished_count=Count("pk"),
+            rated_count=Count("rating"),
+            rating_sum=Coalesce(Sum("rating"), 0),
+            pages_count=Count("pages"),
+            pages_sum=Coalesce(Sum("pages"), 0),
+            timed_count=Count("started"),
+            reading_time=Sum(reading_time),
+        )
+    )
+    return [
+        ReadingSummary(
+            user_id=month.pop("user"),
+            days_sum=_days(month.pop("reading_time")),
+            **month,
+        )
+        for month in months
+    ]
+
+
+def rebuild_reading_summaries(batch_size=1000, users=None):
+    '''Recomputes the summaries of the users in batches of batch_size
+    users, every batch deletes their rows and inserts the new ones in one
+    transaction. users is a queryset of User, all the users by default.
+
+    Returns number of the inserted rows'''
+    if users is None:
+        users = User.objects.all()
+
+    inserted = 0
+    last_pk = None
+    while True:
+        batch = users if last_pk is None else users.filter(pk__gt=last_pk)
+        batch = list(batch.order_by("pk").values_list("pk", flat=True)[:batch_size])
+        if not batch:
+            return inserted
+
+        with transaction.atomic():
+            ReadingSummary.objects.filter(user__in=batch).delete()
+            rows = ReadingSummary.objects.bulk_create(summary_rows(Book.objects.filter(user__in=batch)))
+        inserted += len(rows)
+        last_pk = batch[-1]
@@ -0,0 +1,14 @@
+from django import template
+
+from library.thumbnails import get_thumbnail_url
+
+register = template.Library()
+
+
+@register.filter
+def thumbnail_url(field_file, size_name):
+    '''{{ book.cover|thumbnail_url:"cover" }}
+
+    url of the thumbnail of the image or of the image itself
+    while the thumbnail is being generated'''
+    return get_thumbnail_url(field_file, size_name)
@@ -0,0 +1,136 @@
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from library.caching import aget_or_compute_shelves
+from library.models import Book
+from library import async_views
+from library.async_views import _asort_user_books_by_categories
+from library.views import _sort_user_books_by_categories
+from library.tests.test_views import add_user, add_categories, add_books
+
+from asgiref.sync import async_to_sync, sync_to_async
+
+from unittest import mock
+import asyncio
+
+
+class AsyncViewsTest(TestCase):
+    '''The async views must render the same pages as the sync ones'''
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = add_user("asyncreader")
+        cls.other_user = add_user("asyncother")
+        for user in [cls.user, cls.other_user]:
+            to_read, reading = add_categories(user, "to-read", "reading")
+            add_books(user, to_read, 3)
+            add_books(user, reading, 30)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+        self.async_client.force_login(self.user)
+
+    async def assertSameAsSync(self, name, *args, data=None):
+        sync_response = await self.sync_get(reverse(name, args=args), data)
+        await cache.aclear()
+        async_response = await self.async_client.get(reverse(f"async:{name}", args=args), data)
+
+        self.assertEqual(async_response.status_code, sync_response.status_code)
+        self.assertEqual(async_response.content, sync_response.content)
+
+    async def not_cached(self):
+        return "not cached"
+
+    async def sync_get(self, url, data=None):
+        return await sync_to_async(self.client.get)(url, data)
+
+    async def test_all_books(self):
+        await self.assertSameAsSync("your_all_books")
+
+    async def test_someones_all_books(self):
+        await self.assertSameAsSync("someones_all_books", "asyncother")
+
+    async def test_category(self):
+        await self.assertSameAsSync("your_category", "reading")
+
+    async def test_category_next_page(self):
+        first_page = await self.async_client.get(reverse("async:your_category", args=["reading"]))
+        cursor = first_page.context["books"].next_cursor
+
+        await self.assertSameAsSync("your_category", "reading", data={"after": cursor})
+
+    async def test_someones_category(self):
+        await self.assertSameAsSync("someones_category", "asyncother", "reading")
+
+    async def test_book(self):
+        await self.assertSameAsSync("your_book", "reading book 1", "author 1")
+
+    async def test_someones_book(self):
+        await self.assertSameAsSync("someones_book", "asyncother", "reading book 1", "author 1")
+
+    async def test_users_list(self):
+        await self.assertSameAsSync("users_list")
+
+    async def test_not_found(self):
+        for url in [
+            reverse("async:someones_all_books", args=["nobody"]),
+            reverse("async:your_category", args=["missing"]),
+            reverse("async:your_book", args=["missing", "nobody"]),
+        ]:
+            with self.subTest(url=url):
+                response = await self.async_client.get(url)
+                self.assertEqual(response.status_code, 404)
+
+    async def test_nothing_is_cached_for_missing_user(self):
+        aget_viewed_user = async_views._aget_viewed_user
+
+        async def slow_aget_viewed_user(username):
+            # the shelves are loaded first
+            await asyncio.sleep(0.1)
+            return await aget_viewed_user(username)
+
+        with mock.patch("library.async_views._aget_viewed_user", slow_aget_viewed_user):
+            response = await self.async_client.get(reverse("async:someones_all_books", args=["nobody"]))
+
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(await aget_or_compute_shelves("nobody", "all_books", self.not_cached), "not cached")
+
+    async def test_login_required(self):
+        await sync_to_async(self.async_client.logout)()
+
+        response = await self.async_client.get(reverse("async:your_all_books"))
+
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(response.url.startswith("/login/"))
+
+    async def test_shelves_cache_is_shared_with_sync_views(self):
+        await self.sync_get(reverse("your_all_books"))
+
+        # served from the cache, only request.user is loaded
+        with override_settings(DEBUG=True):
+            response = await self.async_client.get(reverse("async:your_all_books"))
+
+        self.assertEqual(response["X-DB-Query-Count"], "1")
+
+    def test_shelves(self):
+        self.assertEqual(
+            async_to_sync(_asort_user_books_by_categories)(self.user.pk),
+            _sort_user_books_by_categories(self.user),
+        )
+
+    @override_settings(DEBUG=True)
+    async def test_query_stats(self):
+        response = await self.async_client.get(reverse("async:your_all_books"))
+
+        # user, categories, books
+        self.assertEqual(response["X-DB-Query-Count"], "3")
+
+    async def test_new_book_is_shown(self):
+        await self.async_client.get(reverse("async:your_all_books"))
+        category = await self.user.book_categories.aget(category_name="to-read")
+        await Book.objects.acreate(user=self.user, category=category, title="new", author="new")
+
+        response = await self.async_client.get(reverse("async:your_all_books"))
+
+        self.assertContains(response, "new by new")
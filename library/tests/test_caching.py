@@ -0,0 +1,196 @@
+from django.core.cache import cache
+from django.core.cache.backends.base import CacheKeyWarning
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from users.models import User
+from library.caching import (
+    bump_shelves_version,
+    get_or_compute_shelves,
+    get_shelves_version,
+)
+from library.models import Book, BookCategory
+
+from unittest import mock
+import shutil
+import tempfile
+import warnings
+
+
+class ShelfCacheTestMixin():
+    '''Cache tests that are run against every cache backend'''
+    # number of queries made by the cache backend to read cached shelves
+    cache_read_queries = 0
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username="cachedreader",
+            email="cachedreader@gmail.com",
+            password="password1",
+        )
+        cls.to_read = BookCategory.objects.create(user=cls.user, category_name="to-read")
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def add_book(self, title, category=None):
+        return Book.objects.create(
+            user=self.user,
+            category=category or self.to_read,
+            title=title,
+            author="author",
+        )
+
+    def all_books(self):
+        return self.client.get(reverse("your_all_books")).context["books_by_categories"]
+
+    def test_value_is_computed_once(self):
+        calls = []
+
+        def compute():
+            calls.append(1)
+            return ["value"]
+
+        self.assertEqual(get_or_compute_shelves(self.user.pk, "key", compute), ["value"])
+        self.assertEqual(get_or_compute_shelves(self.user.pk, "key", compute), ["value"])
+        self.assertEqual(len(calls), 1)
+
+    def test_bump_makes_values_stale(self):
+        get_or_compute_shelves(self.user.pk, "key", lambda: "old")
+        bump_shelves_version(self.user.pk)
+
+        self.assertEqual(get_or_compute_shelves(self.user.pk, "key", lambda: "new"), "new")
+
+    def test_values_cached_before_commit_are_stale_after_it(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.add_book("not committed yet")
+            # another connection doesn't see the book yet
+            get_or_compute_shelves(self.user.pk, "key", lambda: "before commit")
+
+        self.assertEqual(get_or_compute_shelves(self.user.pk, "key", lambda: "after commit"), "after commit")
+
+    def test_bump_without_version(self):
+        bump_shelves_version("nobody")
+        self.assertIsNotNone(get_shelves_version("nobody"))
+
+    def test_versions_are_per_user(self):
+        version = get_shelves_version(self.user.pk)
+        bump_shelves_version("someoneelse")
+
+        self.assertEqual(get_shelves_version(self.user.pk), version)
+
+    def test_cached_all_books_makes_no_library_queries(self):
+        self.add_book("cached")
+        self.all_books()
+
+        # user
+        with self.assertNumQueries(1 + self.cache_read_queries):
+            self.all_books()
+
+    def test_book_save_invalidates(self):
+        book = self.add_book("title")
+        self.all_books()
+
+        book.title = "new title"
+        book.save()
+
+        self.assertEqual(self.all_books()["to-read"][0].title, "new title")
+
+    def test_book_delete_invalidates(self):
+        book = self.add_book("to delete")
+        self.all_books()
+
+        book.delete()
+
+        self.assertEqual(self.all_books()["to-read"], [])
+
+    def test_category_save_and_delete_invalidate(self):
+        self.all_books()
+
+        category = BookCategory.objects.create(user=self.user, category_name="new")
+        self.assertIn("new", self.all_books())
+
+        category.delete()
+        self.assertNotIn("new", self.all_books())
+
+    def test_category_view_is_invalidated(self):
+        url = reverse("your_category", args=["to-read"])
+        self.client.get(url)
+
+        self.add_book("new one")
+
+        self.assertEqual(len(self.client.get(url).context["books"]), 1)
+
+    def test_only_first_category_page_is_cached(self):
+        shelf = BookCategory.objects.create(user=self.user, category_name="long shelf")
+        books = [self.add_book(f"book {i}", category=shelf) for i in range(3)]
+        url = reverse("your_category", args=["long shelf"])
+
+        with self.settings(LIBRARY_SHELF_PAGE_SIZE=2), warnings.catch_warnings():
+            # a category name with a space is a valid key of every backend
+            warnings.simplefilter("error", CacheKeyWarning)
+            self.client.get(url)
+            next_page = {"after": self.client.get(url).context["books"].next_cursor}
+            self.assertEqual(list(self.client.get(url, next_page).context["books"]), books[2:])
+
+            with self.assertNumQueries(1 + self.cache_read_queries):
+                self.client.get(url)
+            # the page after the cursor is loaded again
+            with mock.patch("library.views.get_or_compute_shelves") as get_or_compute:
+                self.assertEqual(list(self.client.get(url, next_page).context["books"]), books[2:])
+            get_or_compute.assert_not_called()
+
+    def test_set_positions_invalidates(self):
+        reading = BookCategory.objects.create(user=self.user, category_name="reading")
+        self.assertEqual(list(self.all_books()), ["to-read", "reading"])
+
+        BookCategory.set_positions({self.to_read: 100, reading: 99})
+
+        self.assertEqual(list(self.all_books()), ["reading", "to-read"])
+        self.assertEqual(
+            list(self.client.get(reverse("categories_order")).context["categories"]),
+            ["reading", "to-read"],
+        )
+
+
+class LocMemShelfCacheTest(ShelfCacheTestMixin, TestCase):
+    pass
+
+
+class FileBasedShelfCacheTest(ShelfCacheTestMixin, TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.cache_dir = tempfile.mkdtemp()
+        cls.settings_override = override_settings(CACHES={
+            "default": {
+                "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+                "LOCATION": cls.cache_dir,
+            }
+        })
+        cls.settings_override.enable()
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        cls.settings_override.disable()
+        shutil.rmtree(cls.cache_dir, ignore_errors=True)
+
+
+@override_settings(CACHES={
+    "default": {
+        "BACKEND": "django.core.cache.backends.db.DatabaseCache",
+        "LOCATION": "library_test_cache",
+    }
+})
+class DatabaseShelfCacheTest(ShelfCacheTestMixin, TestCase):
+    # session, version and value
+    cache_read_queries = 3
+
+    @classmethod
+    def setUpTestData(cls):
+        call_command("createcachetable", verbosity=0)
+        super().setUpTestData()
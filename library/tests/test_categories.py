@@ -0,0 +1,359 @@
+from django.apps import apps
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, connections
+from django.test import TestCase, TransactionTestCase
+from django.urls import reverse
+from unittest import mock
+
+from library.imports import CSV, import_books
+from library.models import RESERVED_CATEGORY_NAMES, BookCategory
+from library.tests.test_views import add_user
+
+from concurrent.futures import ThreadPoolExecutor
+from importlib import import_module
+from io import StringIO
+import threading
+
+
+class BookCategoryPositionTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = add_user("positions")
+
+    def test_positions_are_allocated_per_user(self):
+        other_user = add_user("otherpositions")
+        for i in range(3):
+            BookCategory.objects.create(user=other_user, category_name=f"other {i}")
+
+        categories = [
+            BookCategory.objects.create(user=self.user, category_name=f"category {i}")
+            for i in range(3)
+        ]
+
+        self.assertEqual([category.position for category in categories], [1, 2, 3])
+
+    def test_position_goes_after_the_last_one(self):
+        BookCategory.objects.create(user=self.user, category_name="far", position=40)
+        category = BookCategory.objects.create(user=self.user, category_name="next")
+
+        self.assertEqual(category.position, 41)
+
+    def test_explicit_position_is_kept(self):
+        category = BookCategory.objects.create(user=self.user, category_name="explicit", position=7)
+        category.refresh_from_db()
+
+        self.assertEqual(category.position, 7)
+
+    def test_position_is_allocated_inside_of_insert(self):
+        # savepoint, insert, select position, release savepoint
+        with self.assertNumQueries(4) as captured:
+            BookCategory.objects.create(user=self.user, category_name="one query")
+
+        insert = next(query["sql"] for query in captured if query["sql"].startswith("INSERT"))
+        self.assertIn('ORDER BY U0."position" DESC LIMIT 1', insert)
+
+    def test_taken_name_is_not_retried(self):
+        BookCategory.objects.create(user=self.user, category_name="taken")
+
+        real_next_position = BookCategory._next_position
+        calls = []
+
+        def next_position(category):
+            calls.append(category)
+            return real_next_position(category)
+
+        with mock.patch.object(BookCategory, "_next_position", next_position):
+            with self.assertRaises(IntegrityError):
+                BookCategory.objects.create(user=self.user, category_name="taken")
+
+        self.assertEqual(len(calls), 1)
+
+    def test_taken_position_is_retried(self):
+        # simulates the race of databases with row locking, where position
+        # can be taken by another transaction that was committed in between
+        taken = BookCategory.objects.create(user=self.user, category_name="first")
+        real_next_position = BookCategory._next_position
+        calls = []
+
+        def next_position(category):
+            calls.append(category)
+            if len(calls) == 1:
+                return taken.position
+            return real_next_position(category)
+
+        with mock.patch.object(BookCategory, "_next_position", next_position):
+            category = BookCategory.objects.create(user=self.user, category_name="second")
+
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(category.position, taken.position + 1)
+
+
+class ConcurrentBookCategoryCreationTest(TransactionTestCase):
+    THREADS = 8
+    CATEGORIES_PER_THREAD = 5
+
+    def create_categories(self, user, thread_number, barrier):
+        barrier.wait()
+        try:
+            for i in range(self.CATEGORIES_PER_THREAD):
+                BookCategory.objects.create(
+                    user=user, category_name=f"thread {thread_number} {i}",
+                )
+        finally:
+            connections.close_all()
+
+    def test_parallel_creations_get_unique_positions(self):
+        user = add_user("concurrent")
+        barrier = threading.Barrier(self.THREADS)
+
+        with ThreadPoolExecutor(max_workers=self.THREADS) as executor:
+            futures = [
+                executor.submit(self.create_categories, user, thread_number, barrier)
+                for thread_number in range(self.THREADS)
+            ]
+            for future in futures:
+                future.result()
+
+        positions = list(
+            BookCategory.objects.filter(user=user).order_by("position").values_list("position", flat=True)
+        )
+        self.assertEqual(positions, list(range(1, self.THREADS * self.CATEGORIES_PER_THREAD + 1)))
+
+
+class SetPositionsTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = add_user("reorderer")
+        BookCategory.objects.bulk_create([
+            BookCategory(user=cls.user, category_name=f"category {i}", position=i)
+            for i in range(1, 301)
+        ])
+        cls.other_user = add_user("notreordered")
+        cls.other_category = BookCategory.objects.create(user=cls.other_user, category_name="other")
+
+    def categories(self):
+        return list(BookCategory.objects.filter(user=self.user).order_by("position"))
+
+    def test_reverse_hundreds_of_categories(self):
+        categories = self.categories()
+        positions = {category: len(categories) - category.position + 1 for category in categories}
+
+        BookCategory.set_positions(positions)
+
+        self.assertEqual(
+            [category.category_name for category in self.categories()],
+            [category.category_name for category in reversed(categories)],
+        )
+
+    def test_number_of_queries_does_not_depend_on_number_of_categories(self):
+        categories = self.categories()
+
+        with self.assertNumQueries(5) as captured:
+            BookCategory.set_positions({categories[0]: 2, categories[1]: 1})
+        few = len(captured)
+
+        with self.assertNumQueries(few):
+            BookCategory.set_positions({
+                category: len(categories) - category.position + 1 for category in categories
+            })
+
+    def test_partial_reorder_keeps_other_positions(self):
+        categories = self.categories()
+
+        BookCategory.set_positions({categories[0]: 500, categories[-1]: 1})
+
+        positions = dict(BookCategory.objects.filter(user=self.user).values_list("pk", "position"))
+        self.assertEqual(positions[categories[0].pk], 500)
+        self.assertEqual(positions[categories[-1].pk], 1)
+        self.assertEqual(positions[categories[1].pk], 2)
+
+    def test_repeated_position(self):
+        categories = self.categories()
+
+        with self.assertRaises(ValidationError):
+            BookCategory.set_positions({categories[0]: 7, categories[1]: 7})
+
+    def test_position_taken_by_not_moved_category(self):
+        categories = self.categories()
+
+        with self.assertRaises(ValidationError):
+            BookCategory.set_positions({categories[0]: 2})
+
+        self.assertEqual(self.categories(), categories)
+
+    def test_categories_of_different_users(self):
+        with self.assertRaises(ValidationError):
+            BookCategory.set_positions({self.categories()[0]: 1000, self.other_category: 1001})
+
+    def test_negative_position(self):
+        with self.assertRaises(ValidationError):
+            BookCategory.set_positions({self.other_category: -1})
+
+    def test_in_memory_objects_get_new_positions(self):
+        categories = self.categories()
+
+        BookCategory.set_positions({categories[0]: 1000})
+
+        self.assertEqual(categories[0].position, 1000)
+
+
+class CategoriesOrderViewTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = add_user("orderview")
+        for category_name in ["to-read", "reading", "finished"]:
+            BookCategory.objects.create(user=cls.user, category_name=category_name)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def category_names(self):
+        return list(
+            BookCategory.objects.filter(user=self.user)
+            .order_by("position")
+            .values_list("category_name", flat=True)
+        )
+
+    def test_reorder(self):
+        response = self.client.post(reverse("categories_order"), {
+            "bookcategory_select_1": "finished",
+            "bookcategory_select_2": "to-read",
+            "bookcategory_select_3": "reading",
+        })
+
+        self.assertRedirects(response, reverse("your_all_books"))
+        self.assertEqual(self.category_names(), ["finished", "to-read", "reading"])
+
+    def test_same_category_twice(self):
+        response = self.client.post(reverse("categories_order"), {
+            "bookcategory_select_1": "finished",
+            "bookcategory_select_2": "finished",
+            "bookcategory_select_3": "reading",
+        })
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.context["errors"])
+        self.assertEqual(self.category_names(), ["to-read", "reading", "finished"])
+
+    def test_unknown_category(self):
+        response = self.client.post(reverse("categories_order"), {
+            "bookcategory_select_1": "unknown",
+        })
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.context["errors"])
+
+
+class MoveCategoryTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = add_user("mover")
+        cls.other_user = add_user("othermover")
+        for user in [cls.user, cls.other_user]:
+            for i in range(1, 6):
+                BookCategory.objects.create(user=user, category_name=f"category {i}")
+
+    def category_names(self, user=None):
+        return list(
+            BookCategory.objects.filter(user=user or self.user)
+            .order_by("position")
+            .values_list("category_name", flat=True)
+        )
+
+    def category(self, name, user=None):
+        return BookCategory.objects.get(user=user or self.user, category_name=name)
+
+    def test_swap_position_is_scoped_to_user(self):
+        self.category("category 1").swap_position(5)
+
+        self.assertEqual(self.category_names(), [
+            "category 5", "category 2", "category 3", "category 4", "category 1",
+        ])
+        self.assertEqual(self.category_names(self.other_user), [
+            "category 1", "category 2", "category 3", "category 4", "category 5",
+        ])
+
+    def test_swap_with_itself(self):
+        self.category("category 3").swap_position(3)
+        self.assertEqual(self.category("category 3").position, 3)
+
+    def test_swap_with_missing_position(self):
+        with self.assertRaises(BookCategory.DoesNotExist):
+            self.category("category 1").swap_position(100)
+
+    def test_swap_uses_current_position(self):
+        stale = self.category("category 1")
+        self.category("category 1").swap_position(2)
+
+        stale.swap_position(5)
+
+        self.assertEqual(self.category_names(), [
+            "category 2", "category 5", "category 3", "category 4", "category 1",
+        ])
+
+    def test_move_down(self):
+        self.category("category 2").move_to(4)
+
+        self.assertEqual(self.category_names(), [
+            "category 1", "category 3", "category 4", "category 2", "category 5",
+        ])
+        self.assertEqual(
+            list(BookCategory.objects.filter(user=self.user).values_list("position", flat=True).order_by("position")),
+            [1, 2, 3, 4, 5],
+        )
+
+    def test_move_up(self):
+        self.category("category 5").move_to(1)
+
+        self.assertEqual(self.category_names(), [
+            "category 5", "category 1", "category 2", "category 3", "category 4",
+        ])
+
+    def test_move_does_not_touch_other_users(self):
+        self.category("category 5").move_to(1)
+
+        self.assertEqual(self.category_names(self.other_user), [
+            "category 1", "category 2", "category 3", "category 4", "category 5",
+        ])
+
+    def test_move_after_the_last_position(self):
+        self.category("category 1").move_to(10)
+
+        self.assertEqual(self.category("category 1").position, 10)
+        self.assertEqual(self.category_names()[-1], "category 1")
+
+
+class ReservedCategoryNameTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = add_user("reserving")
+
+    def test_form_rejects_reserved_names(self):
+        self.client.force_login(self.user)
+
+        for category_name in RESERVED_CATEGORY_NAMES:
+            with self.subTest(category_name=category_name):
+                response = self.client.post(reverse("new_category"), {"category_name": category_name})
+
+                self.assertIn("category_name", response.context["errors"])
+        self.assertFalse(BookCategory.objects.filter(user=self.user).exists())
+
+    def test_reserved_name_is_not_imported(self):
+        result = import_books(StringIO("title,category\nDune,async\n"), self.user, CSV)
+
+        self.assertEqual(result.imported, 0)
+        self.assertIn("reserved", result.errors[0].message)
+
+    def test_existing_reserved_categories_are_renamed(self):
+        for category_name in ["stats", "stats_1", "search"]:
+            BookCategory.objects.create(user=self.user, category_name=category_name)
+        migration = import_module("library.migrations.0014_more_reserved_category_names")
+
+        migration.rename_reserved_categories(apps, None)
+
+        self.assertEqual(
+            sorted(BookCategory.objects.filter(user=self.user).values_list("category_name", flat=True)),
+            ["search_1", "stats_1", "stats_2"],
+        )
@@ -0,0 +1,41 @@
+from django.core.management import call_command
+from django.db.models import F
+from django.test import TestCase
+
+from users.models import User, UserFollowing
+from library.models import Book, BookCategory, LibraryGroup
+
+from io import StringIO
+
+
+class GenerateLibraryCommandTest(TestCase):
+    def generate(self, *args):
+        call_command("generate_library", *args, stdout=StringIO())
+
+    def test_generates_libraries(self):
+        self.generate(
+            "5", "--books", "20", "--categories", "4", "--followings", "2",
+            "--groups", "2", "--members", "3", "--prefix", "gen",
+        )
+
+        self.assertEqual(User.objects.filter(username__startswith="gen").count(), 5)
+        self.assertEqual(BookCategory.objects.filter(user__username="gen0").count(), 4)
+        self.assertEqual(Book.objects.filter(user__username="gen0").count(), 20)
+        self.assertEqual(UserFollowing.objects.filter(who_follows="gen0").count(), 2)
+        self.assertEqual(LibraryGroup.objects.count(), 2)
+        self.assertEqual(LibraryGroup.objects.get(name="gen group 0").users.count(), 3)
+
+    def test_books_are_in_users_categories(self):
+        self.generate("3", "--books", "10", "--prefix", "own")
+
+        self.assertFalse(Book.objects.exclude(category__user=F("user")).exists())
+
+    def test_generated_users_can_log_in(self):
+        self.generate("1", "--books", "1", "--prefix", "login", "--password", "secret12")
+
+        self.assertTrue(self.client.login(username="login0", password="secret12"))
+
+    def test_followings_are_capped_by_number_of_users(self):
+        self.generate("2", "--followings", "10", "--books", "0", "--prefix", "few")
+
+        self.assertEqual(UserFollowing.objects.filter(who_follows="few0").count(), 1)
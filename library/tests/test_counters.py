@@ -0,0 +1,147 @@
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+
+from users.models import User, UserFollowing
+from library.counters import repair_all_counters, repair_counters
+from library.models import Book, BookCategory
+from library.tests.test_views import add_user, add_categories, add_books
+
+from io import StringIO
+import datetime
+
+
+class CountersTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = add_user("counted")
+        cls.other_user = add_user("counting")
+        cls.reading, cls.finished = add_categories(cls.user, "reading", "finished")
+
+    def counters(self, user=None):
+        user = User.objects.get(pk=(user or self.user).pk)
+        return {
+            "books": user.books_count,
+            "finished": user.finished_books_count,
+            "followers": user.followers_count,
+            "following": user.following_count,
+        }
+
+    def shelf_count(self, category):
+        return BookCategory.objects.get(pk=category.pk).books_count
+
+    def add_book(self, title="book", category=None, **kwargs):
+        return Book.objects.create(
+            user=self.user, category=category or self.reading, title=title, author="author", **kwargs
+        )
+
+    def test_new_books(self):
+        self.add_book("first")
+        self.add_book("second", started=datetime.date(2024, 1, 1), finished=datetime.date(2024, 2, 1))
+
+        self.assertEqual(self.counters(), {"books": 2, "finished": 1, "followers": 0, "following": 0})
+        self.assertEqual(self.shelf_count(self.reading), 2)
+
+    def test_moved_and_finished_book(self):
+        self.add_book()
+        book = Book.objects.get(user=self.user)
+
+        book.category = self.finished
+        book.finished = datetime.date.today()
+        book.save()
+
+        self.assertEqual(self.counters()["finished"], 1)
+        self.assertEqual(self.shelf_count(self.reading), 0)
+        self.assertEqual(self.shelf_count(self.finished), 1)
+
+    def test_book_given_to_another_user(self):
+        self.add_book(finished=datetime.date(2024, 2, 1), started=None)
+        other_shelf, = add_categories(self.other_user, "finished")
+        book = Book.objects.get(user=self.user)
+
+        book.user = self.other_user
+        book.category = other_shelf
+        book.save()
+
+        self.assertEqual((self.counters()["books"], self.counters()["finished"]), (0, 0))
+        self.assertEqual(
+            (self.counters(self.other_user)["books"], self.counters(self.other_user)["finished"]), (1, 1),
+        )
+        self.assertEqual(self.shelf_count(self.reading), 0)
+        self.assertEqual(self.shelf_count(other_shelf), 1)
+
+    def test_unchanged_book_takes_no_queries(self):
+        self.add_book()
+        book = Book.objects.get(user=self.user)
+
+        book.comment = "comment"
+        # UPDATE of the book only
+        with self.assertNumQueries(1):
+            book.save()
+
+    def test_deleted_book(self):
+        self.add_book(started=datetime.date(2024, 1, 1), finished=datetime.date(2024, 2, 1)).delete()
+
+        self.assertEqual(self.counters()["books"], 0)
+        self.assertEqual(self.counters()["finished"], 0)
+        self.assertEqual(self.shelf_count(self.reading), 0)
+
+    def test_followings(self):
+        following = UserFollowing.objects.create(who_follows=self.other_user, whom_follows=self.user)
+
+        self.assertEqual(self.counters()["followers"], 1)
+        self.assertEqual(self.counters(self.other_user)["following"], 1)
+
+        following.delete()
+
+        self.assertEqual(self.counters()["followers"], 0)
+        self.assertEqual(self.counters(self.other_user)["following"], 0)
+
+    def test_counters_dont_go_below_zero(self):
+        book = self.add_book()
+        User.objects.filter(pk=self.user.pk).update(books_count=0)
+
+        book.delete()
+
+        self.assertEqual(self.counters()["books"], 0)
+
+    def test_repair(self):
+        # bulk_create sends no signals
+        add_books(self.user, self.reading, 3, started=datetime.date(2024, 1, 1), finished=datetime.date(2024, 2, 1))
+        UserFollowing.objects.bulk_create([UserFollowing(who_follows=self.other_user, whom_follows=self.user)])
+
+        repaired = repair_all_counters(batch_size=1)
+
+        self.assertEqual(repaired, {"users.User": 2, "library.BookCategory": 1})
+        self.assertEqual(self.counters(), {"books": 3, "finished": 3, "followers": 1, "following": 0})
+        self.assertEqual(self.counters(self.other_user)["following"], 1)
+        self.assertEqual(self.shelf_count(self.reading), 3)
+        # nothing has drifted now
+        self.assertEqual(repair_counters(User), 0)
+
+    def test_repair_batches(self):
+        add_books(self.user, self.reading, 3)
+
+        # for every batch: pks and UPDATE, then the empty batch
+        with self.assertNumQueries(2 * 2 + 1):
+            repair_counters(BookCategory, batch_size=1)
+
+    def test_command(self):
+        add_books(self.user, self.reading, 3)
+        stdout = StringIO()
+
+        call_command("repair_counters", stdout=stdout)
+
+        self.assertIn("Repaired 1 users.User rows", stdout.getvalue())
+        self.assertIn("Repaired 1 library.BookCategory rows", stdout.getvalue())
+
+    def test_headers_need_no_aggregates(self):
+        self.add_book()
+        UserFollowing.objects.create(who_follows=self.other_user, whom_follows=self.user)
+        self.client.force_login(self.other_user)
+
+        with self.assertNumQueries(4):
+            response = self.client.get(reverse("someones_all_books", args=[self.user.username]))
+
+        self.assertContains(response, "followers: 1")
+        self.assertContains(response, "(1)")
@@ -0,0 +1,102 @@
+from django.test import TestCase
+from django.urls import reverse
+
+from asgiref.sync import async_to_sync
+
+from users.models import User, UserFollowing
+from library.counters import repair_counters
+from library.directory import aget_directory_page, get_directory_page
+from library.tests.test_views import add_user, add_categories, add_books
+
+import datetime
+
+
+class DirectoryTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [add_user(f"reader{i}") for i in range(5)]
+        for username in ["hidden", "inactive"]:
+            add_user(username)
+        User.objects.filter(username="hidden").update(to_show=False)
+        User.objects.filter(username="inactive").update(is_active=False)
+
+        reading, finished = add_categories(cls.users[0], "reading", "finished")
+        add_books(cls.users[0], reading, 3)
+        add_books(
+            cls.users[0], finished, 2,
+            started=datetime.date(2023, 12, 1), finished=datetime.date(2024, 1, 1),
+        )
+        for follower in cls.users[1:3]:
+            UserFollowing.objects.create(who_follows=follower, whom_follows=cls.users[0])
+        # add_books() uses bulk_create, it doesn't update the counters
+        repair_counters(User)
+
+    def usernames(self, page):
+        return [user.username for user in page]
+
+    def test_only_listed_users(self):
+        page = get_directory_page()
+
+        self.assertEqual(self.usernames(page), [f"reader{i}" for i in range(5)])
+        self.assertFalse(page.has_next)
+
+    def test_prefix(self):
+        add_user("readers_club")
+        add_user("readeR")
+
+        page = get_directory_page(prefix="reader1")
+
+        self.assertEqual(self.usernames(page), ["reader1"])
+        self.assertEqual(self.usernames(get_directory_page(prefix="reader")), [
+            "reader0", "reader1", "reader2", "reader3", "reader4", "readers_club",
+        ])
+
+    def test_cursor(self):
+        first_page = get_directory_page(page_size=2)
+        second_page = get_directory_page(after=first_page.next_cursor, page_size=2)
+        last_page = get_directory_page(after=second_page.next_cursor, page_size=2)
+
+        self.assertEqual(self.usernames(first_page), ["reader0", "reader1"])
+        self.assertEqual(self.usernames(second_page), ["reader2", "reader3"])
+        self.assertEqual(self.usernames(last_page), ["reader4"])
+        self.assertFalse(last_page.has_next)
+
+    def test_cursor_of_exact_page(self):
+        page = get_directory_page(page_size=5)
+        self.assertFalse(page.has_next)
+
+    def test_counts(self):
+        reader0, reader1 = get_directory_page(page_size=2)
+
+        self.assertEqual(
+            (reader0.books_count, reader0.finished_books_count, reader0.followers_count),
+            (5, 2, 2),
+        )
+        self.assertEqual(
+            (reader1.books_count, reader1.finished_books_count, reader1.followers_count),
+            (0, 0, 0),
+        )
+
+    def test_one_query(self):
+        with self.assertNumQueries(1):
+            page = get_directory_page(prefix="reader", after="reader0")
+            [(user.books_count, user.followers_count) for user in page]
+
+    def test_async(self):
+        page = async_to_sync(aget_directory_page)(prefix="reader", page_size=2)
+
+        self.assertEqual(self.usernames(page), ["reader0", "reader1"])
+        self.assertEqual(page.next_cursor, "reader1")
+
+    def test_view(self):
+        response = self.client.get(reverse("users_list"), {"q": "reader", "after": "reader2"})
+
+        self.assertContains(response, 'href="/users/reader3/"')
+        self.assertNotContains(response, 'href="/users/reader2/"')
+        self.assertNotContains(response, "hidden")
+
+    def test_view_load_more(self):
+        with self.settings(LIBRARY_DIRECTORY_PAGE_SIZE=2):
+            response = self.client.get(reverse("users_list"), {"q": "reader"})
+
+        self.assertContains(response, 'href="?q=reader&after=reader1"')
@@ -0,0 +1,244 @@
+from django.core.files.base import ContentFile
+from django.http import Http404
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import reverse
+
+from users.models import User, UserFollowing
+from library.models import Book, BookCategory
+from library.downloads import RangeNotSatisfiable, parse_range
+from library.views import serve_media
+
+import hashlib
+import os
+import shutil
+import tempfile
+
+MEDIA_ROOT = tempfile.mkdtemp()
+CONTENT = bytes(range(256)) * 1000
+
+
+class ParseRangeTest(TestCase):
+    def test_range(self):
+        self.assertEqual(parse_range("bytes=0-99", 1000), (0, 99))
+
+    def test_open_range(self):
+        self.assertEqual(parse_range("bytes=900-", 1000), (900, 999))
+
+    def test_suffix(self):
+        self.assertEqual(parse_range("bytes=-100", 1000), (900, 999))
+        self.assertEqual(parse_range("bytes=-5000", 1000), (0, 999))
+
+    def test_end_after_file_end(self):
+        self.assertEqual(parse_range("bytes=500-5000", 1000), (500, 999))
+
+    def test_whole_file(self):
+        self.assertIsNone(parse_range("bytes=0-1,5-10", 1000))
+        self.assertIsNone(parse_range("items=0-10", 1000))
+        self.assertIsNone(parse_range("bytes=10-5", 1000))
+
+    def test_not_satisfiable(self):
+        with self.assertRaises(RangeNotSatisfiable):
+            parse_range("bytes=1000-", 1000)
+        with self.assertRaises(RangeNotSatisfiable):
+            parse_range("bytes=-0", 1000)
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class DownloadBookTest(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)  # delete the temp dir
+        super().tearDownClass()
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user(
+            username="owner", email="owner@gmail.com", password="password1",
+        )
+        cls.follower = User.objects.create_user(
+            username="follower", email="follower@gmail.com", password="password1",
+        )
+        cls.stranger = User.objects.create_user(
+            username="stranger", email="stranger@gmail.com", password="password1",
+        )
+        UserFollowing.objects.create(who_follows=cls.follower, whom_follows=cls.owner)
+
+        category = BookCategory.objects.create(user=cls.owner, category_name="reading")
+        cls.book = Book.objects.create(
+            user=cls.owner,
+            category=category,
+            title="big",
+            author="author",
+            file=ContentFile(CONTENT, name="big.pdf"),
+        )
+        Book.objects.create(user=cls.owner, category=category, title="no file", author="author")
+
+    def setUp(self):
+        self.client.force_login(self.owner)
+
+    def url(self, title="big", user=None):
+        if user is None:
+            return reverse("your_book_download", args=[title, "author"])
+        return reverse("someones_book_download", args=[user.username, title, "author"])
+
+    def test_owner_downloads(self):
+        response = self.client.get(self.url())
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertEqual(b"".join(response.streaming_content), CONTENT)
+        self.assertEqual(response["Content-Length"], str(len(CONTENT)))
+        self.assertEqual(response["Content-Type"], "application/pdf")
+        self.assertEqual(response["Accept-Ranges"], "bytes")
+        self.assertEqual(response["Content-Disposition"], 'attachment; filename="big.pdf"')
+        self.assertIn("ETag", response)
+
+    def test_follower_downloads(self):
+        self.client.force_login(self.follower)
+
+        response = self.client.get(self.url(user=self.owner))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b"".join(response.streaming_content), CONTENT)
+
+    def test_stranger_is_forbidden(self):
+        self.client.force_login(self.stranger)
+
+        response = self.client.get(self.url(user=self.owner))
+
+        self.assertEqual(response.status_code, 403)
+
+    def test_login_required(self):
+        self.client.logout()
+
+        response = self.client.get(self.url())
+
+        self.assertEqual(response.status_code, 302)
+
+    def test_book_without_file(self):
+        response = self.client.get(self.url(title="no file"))
+
+        self.assertEqual(response.status_code, 404)
+
+    def test_missing_file(self):
+        book = Book.objects.create(
+            user=self.owner, category=self.book.category, title="lost", author="author",
+            file=ContentFile(b"lost", name="lost.pdf"),
+        )
+        os.remove(book.file.path)
+
+        response = self.client.get(self.url(title="lost"))
+
+        self.assertEqual(response.status_code, 404)
+
+    def test_range(self):
+        response = self.client.get(self.url(), headers={"Range": "bytes=1000-1999"})
+
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b"".join(response.streaming_content), CONTENT[1000:2000])
+        self.assertEqual(response["Content-Length"], "1000")
+        self.assertEqual(response["Content-Range"], f"bytes 1000-1999/{len(CONTENT)}")
+
+    def test_resume(self):
+        response = self.client.get(self.url(), headers={"Range": "bytes=200000-"})
+
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b"".join(response.streaming_content), CONTENT[200000:])
+
+    def test_range_not_satisfiable(self):
+        response = self.client.get(self.url(), headers={"Range": f"bytes={len(CONTENT)}-"})
+
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response["Content-Range"], f"bytes */{len(CONTENT)}")
+
+    def test_if_none_match(self):
+        etag = self.client.get(self.url())["ETag"]
+
+        response = self.client.get(self.url(), headers={"If-None-Match": etag})
+
+        self.assertEqual(response.status_code, 304)
+
+    def test_if_range_of_changed_file(self):
+        response = self.client.get(
+            self.url(), headers={"Range": "bytes=0-9", "If-Range": '"outdated"'},
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b"".join(response.streaming_content), CONTENT)
+
+    def test_if_range(self):
+        etag = self.client.get(self.url())["ETag"]
+
+        response = self.client.get(self.url(), headers={"Range": "bytes=0-9", "If-Range": etag})
+
+        self.assertEqual(response.status_code, 206)
+
+    @override_settings(LIBRARY_DOWNLOAD_SENDFILE="X-Sendfile")
+    def test_x_sendfile(self):
+        response = self.client.get(self.url())
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["X-Sendfile"], self.book.file.path)
+        self.assertEqual(response.content, b"")
+
+    @override_settings(
+        LIBRARY_DOWNLOAD_SENDFILE="X-Accel-Redirect",
+        LIBRARY_DOWNLOAD_ACCEL_PREFIX="/protected/",
+    )
+    def test_x_accel_redirect(self):
+        response = self.client.get(self.url())
+
+        self.assertEqual(response["X-Accel-Redirect"], "/protected/books/owner/author_big/big.pdf")
+        self.assertEqual(response.content, b"")
+
+    def test_book_page_links_download(self):
+        response = self.client.get(reverse("your_book", args=["big", "author"]))
+
+        self.assertContains(response, self.url())
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class ServeMediaTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        owner = User.objects.create_user(
+            username="mediaowner", email="mediaowner@gmail.com", password="password1",
+        )
+        category = BookCategory.objects.create(user=owner, category_name="reading")
+        cls.book = Book.objects.create(
+            user=owner,
+            category=category,
+            title="served",
+            author="author",
+            file=ContentFile(b"book", name="served.pdf"),
+            cover=ContentFile(b"cover", name="cover.jpg"),
+        )
+
+    def serve(self, path):
+        return serve_media(RequestFactory().get(f"/uploaded_files/{path}"), path)
+
+    def test_cover_is_served(self):
+        response = self.serve(self.book.cover.name)
+
+        self.assertEqual(b"".join(response.streaming_content), b"cover")
+
+    def test_book_file_is_not_served(self):
+        with self.assertRaises(Http404):
+            self.serve(self.book.file.name)
+
+    def test_blobs_are_not_served(self):
+        with self.assertRaises(Http404):
+            self.serve("blobs/")
+
+    def test_book_file_is_not_served_by_unnormalized_path(self):
+        name = self.book.file.name
+        for path in [name.replace("/", "//", 1), f"./{name}", f"/{name}", f"books/../{name}"]:
+            with self.subTest(path=path), self.assertRaises(Http404):
+                self.serve(path)
+
+    def test_blobs_are_not_served_by_unnormalized_path(self):
+        storage = self.book.file.storage
+        blob = os.path.relpath(storage.blob_path(hashlib.sha256(b"book").hexdigest()), storage.location)
+        for path in ["blobs", f"blobs//{blob[6:]}", f"./{blob}", f"covers/../{blob}"]:
+            with self.subTest(path=path), self.assertRaises(Http404):
+                self.serve(path)
@@ -0,0 +1,140 @@
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from library.exports import CSV, JSON_LINES, ZIP, ZIP_MANIFEST, export_library
+from library.imports import import_books
+from library.models import Book
+from library.tests.test_views import add_user, add_categories
+
+from io import BytesIO, StringIO
+import csv
+import datetime
+import json
+import os
+import shutil
+import tempfile
+import zipfile
+
+MEDIA_ROOT = tempfile.mkdtemp()
+CONTENT = bytes(range(256)) * 1000
+
+
+def exported(user, file_format):
+    chunks = list(export_library(user, file_format))
+    return "".join(chunks) if file_format != ZIP else b"".join(chunks)
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class ExportTest(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)  # delete the temp dir
+        super().tearDownClass()
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = add_user("exporter")
+        finished, reading = add_categories(cls.user, "finished", "reading")
+        cls.dune = Book.objects.create(
+            user=cls.user, category=finished, title="Dune", author="Frank Herbert",
+            started=datetime.date(2020, 1, 1), finished=datetime.date(2020, 2, 1), rating=9,
+            comment='sand, "spice"\nand worms',
+            file=ContentFile(CONTENT, name="dune.pdf"),
+            cover=ContentFile(b"cover", name="dune.jpg"),
+        )
+        Book.objects.create(user=cls.user, category=reading, title="Emma", author="Jane Austen", started=None)
+        Book.objects.create(user=add_user("other"), category=add_categories(add_user("x"), "x")[0], title="Not mine")
+
+    def test_csv(self):
+        rows = list(csv.DictReader(StringIO(exported(self.user, CSV))))
+
+        self.assertEqual([row["title"] for row in rows], ["Dune", "Emma"])
+        self.assertEqual(rows[0], {
+            "title": "Dune", "author": "Frank Herbert", "category": "finished",
+            "started": "2020-01-01", "finished": "2020-02-01", "rating": "9",
+            "pages": "", "comment": 'sand, "spice"\nand worms',
+        })
+        self.assertEqual(rows[1]["started"], "")
+
+    def test_json_lines(self):
+        rows = [json.loads(line) for line in exported(self.user, JSON_LINES).splitlines()]
+
+        self.assertEqual(rows[0]["rating"], 9)
+        self.assertIsNone(rows[1]["started"])
+
+    def test_export_is_imported_back(self):
+        copy = add_user("copy")
+
+        result = import_books(StringIO(exported(self.user, CSV)), copy, CSV)
+
+        self.assertEqual(result.created, 2)
+        fields = ["title", "author", "category__category_name", "started", "finished", "rating", "comment"]
+        self.assertEqual(
+            list(Book.objects.filter(user=copy).order_by("id").values_list(*fields)),
+            list(Book.objects.filter(user=self.user).order_by("id").values_list(*fields)),
+        )
+
+    def test_one_query(self):
+        with self.assertNumQueries(1):
+            exported(self.user, CSV)
+
+    def test_zip(self):
+        with zipfile.ZipFile(BytesIO(exported(self.user, ZIP))) as archive:
+            self.assertIsNone(archive.testzip())
+            self.assertEqual(
+                archive.namelist(), [ZIP_MANIFEST, self.dune.file.name, self.dune.cover.name],
+            )
+            self.assertEqual(archive.read(self.dune.file.name), CONTENT)
+            manifest = list(csv.DictReader(StringIO(archive.read(ZIP_MANIFEST).decode())))
+
+        self.assertEqual(manifest[0]["file"], self.dune.file.name)
+        self.assertEqual(manifest[1]["file"], "")
+
+    def test_zip_without_missing_files(self):
+        os.remove(self.dune.cover.path)
+
+        with zipfile.ZipFile(BytesIO(exported(self.user, ZIP))) as archive:
+            self.assertEqual(archive.namelist(), [ZIP_MANIFEST, self.dune.file.name])
+
+    @override_settings(LIBRARY_DOWNLOAD_CHUNK_SIZE=1000)
+    def test_zip_is_streamed(self):
+        chunks = list(export_library(self.user, ZIP))
+
+        # the file is read in chunks, not in one piece
+        self.assertGreater(len(chunks), len(CONTENT) // 1000)
+        self.assertLess(max(len(chunk) for chunk in chunks), 2 * 1000)
+
+    def test_view(self):
+        self.client.force_login(self.user)
+
+        response = self.client.get(reverse("export_library"), {"format": "zip"})
+
+        self.assertTrue(response.streaming)
+        self.assertEqual(response["Content-Type"], "application/zip")
+        self.assertEqual(response["Content-Disposition"], 'attachment; filename="exporter_library.zip"')
+        with zipfile.ZipFile(BytesIO(b"".join(response.streaming_content))) as archive:
+            self.assertIn(self.dune.file.name, archive.namelist())
+
+    def test_view_csv_by_default(self):
+        self.client.force_login(self.user)
+
+        response = self.client.get(reverse("export_library"))
+
+        self.assertEqual(response["Content-Type"], "text/csv; charset=utf-8")
+        self.assertIn(b"Frank Herbert", b"".join(response.streaming_content))
+
+    def test_view_unknown_format(self):
+        self.client.force_login(self.user)
+
+        self.assertEqual(self.client.get(reverse("export_library"), {"format": "xlsx"}).status_code, 400)
+
+    def test_command(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "library.jsonl")
+
+            call_command("export_library", "exporter", path, stdout=StringIO())
+
+            with open(path) as f:
+                self.assertEqual(len(f.readlines()), 2)
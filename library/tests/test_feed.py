@@ -0,0 +1,168 @@
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from users.models import UserFollowing
+from library.feed import get_feed_page
+from library.models import Book, BookActivity
+from library.tests.test_views import add_user, add_categories, add_books
+
+import datetime
+
+
+class BookActivityTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = add_user("activeuser")
+        cls.reading, = add_categories(cls.user, "reading")
+
+    def add_book(self, **kwargs):
+        return Book.objects.create(
+            user=self.user, category=self.reading, title="title", author="author", **kwargs
+        )
+
+    def kinds(self):
+        return list(BookActivity.objects.order_by("id").values_list("kind", flat=True))
+
+    def test_added(self):
+        self.add_book()
+        self.assertEqual(self.kinds(), [BookActivity.ADDED])
+
+    def test_added_finished_and_rated(self):
+        self.add_book(started=datetime.date(2024, 1, 1), finished=datetime.date(2024, 2, 1), rating=8)
+
+        self.assertEqual(self.kinds(), [BookActivity.ADDED, BookActivity.FINISHED, BookActivity.RATED])
+        self.assertEqual(BookActivity.objects.get(kind=BookActivity.RATED).rating, 8)
+
+    def test_changes_of_loaded_book(self):
+        self.add_book(started=None)
+        book = Book.objects.get(user=self.user)
+
+        book.started = datetime.date(2024, 1, 1)
+        book.save()
+        book.finished = datetime.date(2024, 2, 1)
+        book.rating = 3
+        book.save()
+
+        self.assertEqual(self.kinds(), [
+            BookActivity.ADDED, BookActivity.STARTED, BookActivity.FINISHED, BookActivity.RATED,
+        ])
+
+    def test_unchanged_save(self):
+        self.add_book()
+        book = Book.objects.get(user=self.user)
+
+        book.comment = "good"
+        book.save()
+        book.save()
+
+        self.assertEqual(self.kinds(), [BookActivity.ADDED])
+
+    def test_cleared_fields(self):
+        self.add_book(rating=5)
+        book = Book.objects.get(user=self.user)
+
+        book.rating = None
+        book.save()
+
+        self.assertEqual(self.kinds(), [BookActivity.ADDED, BookActivity.RATED])
+
+    def test_deferred_fields(self):
+        self.add_book()
+        book = Book.objects.only("title", "user", "category").get(user=self.user)
+
+        book.title = "renamed"
+        book.save()
+
+        self.assertEqual(self.kinds(), [BookActivity.ADDED])
+
+    def test_activities_are_deleted_with_book(self):
+        self.add_book().delete()
+        self.assertEqual(self.kinds(), [])
+
+
+class FeedTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = add_user("feedreader")
+        cls.followed = [add_user(f"followed{i}") for i in range(3)]
+        cls.stranger = add_user("stranger")
+        for followed in cls.followed:
+            UserFollowing.objects.create(who_follows=cls.user, whom_follows=followed)
+
+        now = timezone.now()
+        cls.activities = []
+        for user in [*cls.followed, cls.stranger, cls.user]:
+            category, = add_categories(user, "reading")
+            for i, book in enumerate(add_books(user, category, 4)):
+                cls.activities.append(BookActivity.objects.create(
+                    user=user, book=book, kind=BookActivity.ADDED,
+                    created=now - datetime.timedelta(hours=i),
+                ))
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def expected(self):
+        return sorted(
+            (activity for activity in self.activities if activity.user in self.followed),
+            key=lambda activity: (activity.created, activity.id),
+            reverse=True,
+        )
+
+    def test_only_followed_users(self):
+        page = get_feed_page(self.user)
+
+        self.assertEqual(list(page), self.expected())
+        self.assertFalse(page.has_next)
+
+    def test_cursor(self):
+        first_page = get_feed_page(self.user, page_size=5)
+        second_page = get_feed_page(self.user, cursor=first_page.next_cursor, page_size=5)
+        last_page = get_feed_page(self.user, cursor=second_page.next_cursor, page_size=5)
+
+        self.assertEqual(first_page + second_page + last_page, self.expected())
+        self.assertEqual(len(last_page), 2)
+        self.assertFalse(last_page.has_next)
+
+    def test_max_age(self):
+        page = get_feed_page(self.user, max_age=90 * 60)
+
+        self.assertEqual(list(page), [
+            activity for activity in self.expected()
+            if activity.created > timezone.now() - datetime.timedelta(minutes=90)
+        ])
+
+    def test_unfollowed_user(self):
+        UserFollowing.objects.filter(whom_follows=self.followed[0]).delete()
+
+        page = get_feed_page(self.user)
+
+        self.assertNotIn(self.followed[0], {activity.user for activity in page})
+
+    def test_view(self):
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse("following_feed"))
+
+        self.assertContains(response, reverse("someones_book", args=["followed0", "reading book 0", "author 0"]))
+        self.assertNotContains(response, "stranger")
+
+    def test_view_next_page(self):
+        with self.settings(LIBRARY_FEED_PAGE_SIZE=10):
+            first_page = self.client.get(reverse("following_feed"))
+            response = self.client.get(
+                reverse("following_feed"), {"after": first_page.context["activities"].next_cursor}
+            )
+
+        self.assertEqual(len(response.context["activities"]), 2)
+
+    def test_invalid_cursor(self):
+        response = self.client.get(reverse("following_feed"), {"after": "invalid"})
+        self.assertEqual(response.status_code, 400)
+
+    def test_login_required(self):
+        self.client.logout()
+
+        response = self.client.get(reverse("following_feed"))
+
+        self.assertEqual(response.status_code, 302)
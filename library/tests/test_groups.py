@@ -0,0 +1,121 @@
+from django.core.cache import cache
+from django.core.exceptions import PermissionDenied
+from django.http import Http404
+from django.test import TestCase
+from django.urls import reverse
+
+from library.counters import repair_counters
+from library.groups import get_group_for_member, get_group_stats, paginate_group_shelf
+from library.models import Book, LibraryGroup
+from library.tests.test_views import add_user, add_categories, add_books
+
+from users.models import User
+
+import datetime
+
+
+class GroupTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.creator = add_user("groupcreator")
+        cls.members = [add_user(f"member{i}") for i in range(3)]
+        cls.outsider = add_user("outsider")
+        cls.group = LibraryGroup.objects.create(name="readers", creator=cls.creator)
+        cls.group.users.add(*cls.members)
+
+        for i, user in enumerate([*cls.members, cls.outsider]):
+            reading, finished = add_categories(user, "reading", "finished")
+            add_books(user, reading, 2, started=datetime.date(2024, 1, 1 + i))
+            for j, (title, author, rating) in enumerate([
+                ("Dune", "Herbert", 8 + i % 2),
+                ("Emma", "Austen", 5),
+            ]):
+                Book.objects.create(
+                    user=user, category=finished, title=title, author=author, rating=rating,
+                    started=datetime.date(2023, 1, 1), finished=datetime.date(2023, 2, 1 + j),
+                )
+        # add_books() uses bulk_create
+        repair_counters(User)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_member(self):
+        with self.assertNumQueries(1):
+            group = get_group_for_member("readers", self.members[0])
+
+        self.assertEqual(group, self.group)
+
+    def test_creator(self):
+        self.assertEqual(get_group_for_member("readers", self.creator), self.group)
+
+    def test_outsider(self):
+        with self.assertRaises(PermissionDenied):
+            get_group_for_member("readers", self.outsider)
+
+    def test_missing_group(self):
+        with self.assertRaises(Http404):
+            get_group_for_member("missing", self.members[0])
+
+    def test_shelf_has_books_of_members_only(self):
+        page = paginate_group_shelf(self.group, page_size=100)
+
+        self.assertEqual(len(page), 3 * 4)
+        self.assertEqual({book.user for book in page}, set(self.members))
+        self.assertFalse(page.has_next)
+
+    def test_shelf_pages(self):
+        first_page = paginate_group_shelf(self.group, page_size=5)
+        second_page = paginate_group_shelf(self.group, cursor=first_page.next_cursor, page_size=5)
+        last_page = paginate_group_shelf(self.group, cursor=second_page.next_cursor, page_size=5)
+
+        books = first_page + second_page + last_page
+        self.assertEqual(len(books), 12)
+        self.assertEqual(len(set(books)), 12)
+
+    def test_stats(self):
+        stats = get_group_stats(self.group)
+
+        self.assertEqual(stats["members"], 3)
+        self.assertEqual(stats["books"], 12)
+        self.assertEqual(stats["finished_books"], 6)
+        self.assertEqual(stats["most_read_authors"], [
+            {"author": "Austen", "finished": 3, "readers": 3},
+            {"author": "Herbert", "finished": 3, "readers": 3},
+        ])
+        # 8, 9, 8
+        self.assertEqual(stats["top_rated_books"][0]["title"], "Dune")
+        self.assertAlmostEqual(stats["top_rated_books"][0]["average_rating"], 25 / 3)
+        self.assertEqual(stats["top_rated_books"][1]["ratings"], 3)
+        self.assertAlmostEqual(stats["average_rating"], (25 + 15) / 6)
+
+    def test_stats_are_cached(self):
+        get_group_stats(self.group)
+
+        with self.assertNumQueries(0):
+            get_group_stats(self.group)
+
+    def test_view(self):
+        self.client.force_login(self.members[0])
+
+        # user, group, shelf, 4 aggregates
+        with self.assertNumQueries(7):
+            response = self.client.get(reverse("group", args=["readers"]))
+
+        self.assertContains(response, "members: 3")
+        self.assertContains(response, "Herbert(3 finished by 3)")
+        self.assertNotContains(response, "outsider")
+
+    def test_view_of_outsider(self):
+        self.client.force_login(self.outsider)
+
+        response = self.client.get(reverse("group", args=["readers"]))
+
+        self.assertEqual(response.status_code, 403)
+
+    def test_groups_list(self):
+        self.client.force_login(self.members[0])
+
+        response = self.client.get(reverse("groups_list"))
+
+        self.assertContains(response, reverse("group", args=["readers"]))
@@ -0,0 +1,244 @@
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from library.imports import (
+    CSV, JSON, JSON_LINES, ImportFormatError, import_books, read_json,
+)
+from library.models import Book, BookCategory
+from library.search import search_books
+from library.tests.test_views import add_user, add_categories
+
+from io import StringIO
+from unittest import mock
+import datetime
+import json
+import os
+import tempfile
+
+GOODREADS_CSV = '''Book Id,Title,Author,My Rating,Number of Pages,Date Read,Exclusive Shelf,My Review
+1,Dune,Frank Herbert,5,604,2020/03/14,read,great
+2,Emma,Jane Austen,0,,,to-read,
+3,Ulysses,James Joyce,3,730,,currently-reading,
+'''
+
+
+class ImportTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = add_user("importer")
+        cls.reading, = add_categories(cls.user, "reading")
+
+    def import_csv(self, text, **kwargs):
+        return import_books(StringIO(text), self.user, CSV, **kwargs)
+
+    def test_csv(self):
+        result = self.import_csv(
+            "title,author,category,started,finished,rating,comment\n"
+            "Dune,Frank Herbert,sci-fi,2020-01-01,2020-02-01,9,great\n"
+            "Emma,Jane Austen,,2021-05-01,,,\n"
+        )
+
+        self.assertEqual((result.imported, result.created, result.error_count), (2, 2, 0))
+        dune = Book.objects.get(user=self.user, title="Dune")
+        self.assertEqual(dune.category.category_name, "sci-fi")
+        self.assertEqual(dune.finished, datetime.date(2020, 2, 1))
+        self.assertEqual((dune.rating, dune.comment), (9, "great"))
+        # category by the dates
+        self.assertEqual(Book.objects.get(user=self.user, title="Emma").category, self.reading)
+
+    def test_goodreads_export(self):
+        self.import_csv(GOODREADS_CSV)
+
+        books = {book.title: book for book in Book.objects.filter(user=self.user).select_related("category")}
+        self.assertEqual(
+            {title: book.category.category_name for title, book in books.items()},
+            {"Dune": "finished", "Emma": "to-read", "Ulysses": "reading"},
+        )
+        self.assertEqual(books["Dune"].rating, 10)
+        self.assertEqual(books["Dune"].finished, datetime.date(2020, 3, 14))
+        self.assertEqual(books["Dune"].pages, 604)
+        self.assertIsNone(books["Emma"].rating)
+        self.assertIsNone(books["Emma"].pages)
+
+    def test_existing_books_are_updated(self):
+        Book.objects.create(user=self.user, category=self.reading, title="Dune", author="Frank Herbert")
+
+        result = self.import_csv(
+            "title,author,rating\n"
+            "Dune,Frank Herbert,7\n"
+            "Dune,Frank Herbert,8\n"
+        )
+
+        self.assertEqual((result.imported, result.created, result.updated), (1, 0, 1))
+        self.assertEqual(Book.objects.get(user=self.user, title="Dune").rating, 8)
+
+    def test_invalid_rows_are_reported(self):
+        result = self.import_csv(
+            "title,author,started,finished,rating\n"
+            "Dune,Frank Herbert,,,11\n"
+            ",nobody,,,\n"
+            "Emma,Jane Austen,2020-02-01,2020-01-01,\n"
+            "Ulysses,James Joyce,someday,,\n"
+            "Hamlet,William Shakespeare,,,\n",
+            max_errors=3,
+        )
+
+        self.assertEqual((result.imported, result.error_count), (1, 4))
+        self.assertEqual([error.row for error in result.errors], [2, 3, 4])
+        self.assertIn("rating", result.errors[0].message)
+        self.assertTrue(Book.objects.filter(user=self.user, title="Hamlet").exists())
+
+    def test_batches(self):
+        rows = "".join(f"book {i},author,sci-fi\n" for i in range(25))
+
+        # 3 batches of 3 queries(the INSERT in a savepoint), the new category,
+        # the counts of the books, the counters and the summaries don't depend on the rows
+        with self.assertNumQueries(28):
+            result = self.import_csv("title,author,category\n" + rows, batch_size=10)
+
+        self.assertEqual(result.created, 25)
+        self.assertEqual(BookCategory.objects.filter(user=self.user, category_name="sci-fi").count(), 1)
+
+    def test_counters_and_search_are_updated(self):
+        self.import_csv("title,author,finished\nDune,Frank Herbert,2020-01-01\nEmma,Jane Austen,\n")
+
+        self.user.refresh_from_db()
+        self.assertEqual((self.user.books_count, self.user.finished_books_count), (2, 1))
+        self.assertEqual([book.title for book in search_books("herbert", self.user)], ["Dune"])
+        self.assertEqual(
+            list(self.user.reading_summaries.values_list("year", "month", "finished_count")), [(2020, 1, 1)],
+        )
+
+    def test_json(self):
+        books = [{"title": f"book {i}", "author": "x" * (i % 7), "rating": i % 10 + 1} for i in range(300)]
+        stream = StringIO(json.dumps(books, indent=2))
+
+        result = import_books(stream, self.user, JSON)
+
+        self.assertEqual(result.created, 300)
+        self.assertEqual(Book.objects.get(user=self.user, title="book 12").rating, 3)
+
+    def test_json_is_read_in_chunks(self):
+        books = [{"title": f"book {i}", "comment": "ü" * 50} for i in range(100)]
+
+        with mock.patch("library.imports.JSON_READ_SIZE", 64):
+            rows = list(read_json(StringIO(json.dumps(books))))
+
+        self.assertEqual([row for _, row in rows], books)
+
+    def test_broken_json(self):
+        with self.assertRaises(ImportFormatError) as broken:
+            import_books(StringIO('[{"title": "Dune"}, {"title": '), self.user, JSON, batch_size=1)
+        with self.assertRaises(ImportFormatError):
+            import_books(StringIO('{"title": "Dune"}'), self.user, JSON)
+
+        # the batches before the broken part are imported and reported
+        self.assertTrue(Book.objects.filter(user=self.user, title="Dune").exists())
+        self.assertEqual((broken.exception.result.imported, broken.exception.result.created), (1, 1))
+
+    @override_settings(LIBRARY_IMPORT_BATCH_SIZE=1)
+    def test_view_reports_rows_before_broken_part(self):
+        self.client.force_login(self.user)
+
+        response = self.client.post(reverse("import_books"), {
+            "file": SimpleUploadedFile("library.json", b'[{"title": "Dune"}, {"title": '),
+        })
+
+        self.assertContains(response, "Invalid JSON at the object 2")
+        self.assertContains(response, "Imported 1 books before the error")
+
+    def test_reimport_keeps_missing_columns(self):
+        finished, = add_categories(self.user, "read")
+        Book.objects.create(
+            user=self.user, category=finished, title="Dune", author="Frank Herbert",
+            started=datetime.date(2020, 1, 1), finished=datetime.date(2020, 2, 1),
+            rating=9, pages=604, comment="great",
+        )
+
+        result = self.import_csv("title,author\nDune,Frank Herbert\nEmma,Jane Austen\n")
+        self.import_csv("title,author,rating\nDune,Frank Herbert,7\n")
+
+        self.assertEqual((result.created, result.updated), (1, 1))
+        dune = Book.objects.get(user=self.user, title="Dune")
+        self.assertEqual(
+            (dune.category, dune.finished, dune.rating, dune.pages, dune.comment),
+            (finished, datetime.date(2020, 2, 1), 7, 604, "great"),
+        )
+        self.assertEqual(Book.objects.get(user=self.user, title="Emma").category.category_name, "to-read")
+
+    def test_goodreads_reimport_keeps_started(self):
+        Book.objects.create(
+            user=self.user, category=self.reading, title="Dune", author="Frank Herbert",
+            started=datetime.date(2020, 3, 1),
+        )
+
+        self.import_csv(GOODREADS_CSV)
+
+        self.assertEqual(Book.objects.get(user=self.user, title="Dune").started, datetime.date(2020, 3, 1))
+
+    def test_reimport_can_not_finish_book_before_started(self):
+        Book.objects.create(
+            user=self.user, category=self.reading, title="Dune", author="Herbert",
+            started=datetime.date(2024, 6, 1),
+        )
+
+        result = self.import_csv(
+            "Title,Author,Exclusive Shelf,Date Read,My Rating,My Review\n"
+            "Emma,Austen,read,2023/01/01,,\n"
+            "Dune,Herbert,read,2023/01/01,,\n"
+            "Ulysses,Joyce,read,,,\n"
+            "Ulysses,Joyce,read,2023/01/01,,\n",
+        )
+
+        self.assertEqual((result.imported, result.error_count), (2, 1))
+        self.assertEqual(result.errors[0].row, 3)
+        self.assertIn("finished", result.errors[0].message)
+        dune = Book.objects.get(user=self.user, title="Dune")
+        self.assertEqual((dune.started, dune.finished), (datetime.date(2024, 6, 1), None))
+        self.assertEqual(
+            Book.objects.get(user=self.user, title="Ulysses").finished, datetime.date(2023, 1, 1),
+        )
+
+    def test_json_lines(self):
+        result = import_books(
+            StringIO('{"title": "Dune"}\n\nnot json\n["Emma"]\n'), self.user, JSON_LINES,
+        )
+
+        self.assertEqual(result.imported, 1)
+        self.assertEqual([error.row for error in result.errors], [3, 4])
+
+    def test_view(self):
+        self.client.force_login(self.user)
+
+        response = self.client.post(reverse("import_books"), {
+            "file": SimpleUploadedFile("goodreads_library_export.csv", ("\ufeff" + GOODREADS_CSV).encode()),
+        })
+
+        self.assertContains(response, "Imported 3 books: 3 new")
+        self.assertEqual(Book.objects.filter(user=self.user).count(), 3)
+
+    def test_view_unknown_format(self):
+        self.client.force_login(self.user)
+
+        response = self.client.post(reverse("import_books"), {
+            "file": SimpleUploadedFile("library.xlsx", b"..."),
+        })
+
+        self.assertContains(response, "Expected a csv, json, jsonl file")
+        self.assertFalse(Book.objects.filter(user=self.user).exists())
+
+    def test_command(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "books.jsonl")
+            with open(path, "w") as f:
+                f.write('{"title": "Dune", "author": "Frank Herbert"}\n')
+
+            stdout = StringIO()
+            call_command("import_books", "importer", path, stdout=stdout, stderr=StringIO())
+
+            self.assertIn("Imported 1 books", stdout.getvalue())
+            with self.assertRaises(CommandError):
+                call_command("import_books", "nobody", path, stdout=StringIO())
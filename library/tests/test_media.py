@@ -0,0 +1,306 @@
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.db import DatabaseError
+from django.test import TestCase, override_settings
+
+from unittest import mock
+
+from users.models import User
+from library.models import Book, BookCategory, BookUpload
+from library.media import (
+    MediaCollector, collect_media, misplaced_fields, relocate_all_book_files, relocate_book_files,
+)
+from library.storage import get_book_file_storage
+from library.uploads import start_upload, staging_path
+
+from io import StringIO
+import datetime
+import os
+import shutil
+import tempfile
+
+with open("library/tests/media/simple_book_cover.jpg", "rb") as cover_file:
+    COVER = cover_file.read()
+
+
+class MediaTestMixin():
+    @classmethod
+    def setUpClass(cls):
+        cls.media_root = tempfile.mkdtemp()
+        cls.staging_dir = tempfile.mkdtemp()
+        cls.settings_override = override_settings(
+            MEDIA_ROOT=cls.media_root,
+            LIBRARY_UPLOAD_STAGING_DIR=cls.staging_dir,
+        )
+        cls.settings_override.enable()
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        cls.settings_override.disable()
+        shutil.rmtree(cls.media_root, ignore_errors=True)  # delete the temp dirs
+        shutil.rmtree(cls.staging_dir, ignore_errors=True)
+
+    def setUp(self):
+        # thumbnails are generated in another thread, the tests move and delete the covers
+        patcher = mock.patch("library.signals.schedule_thumbnail")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username="mediauser", email="mediauser@gmail.com", password="password1",
+        )
+        cls.category = BookCategory.objects.create(user=cls.user, category_name="reading")
+
+    def add_book(self, title="book", file_content=b"book file", cover_content=None):
+        return Book.objects.create(
+            user=self.user,
+            category=self.category,
+            title=title,
+            author="author",
+            file=ContentFile(file_content, name="book.epub") if file_content else None,
+            cover=ContentFile(cover_content, name="cover.jpg") if cover_content else None,
+        )
+
+    def media_path(self, name):
+        return os.path.join(self.media_root, name)
+
+    def blobs(self):
+        return [
+            name
+            for _, _, names in os.walk(os.path.join(self.media_root, "blobs"))
+            for name in names
+        ]
+
+
+class BookFilesTest(MediaTestMixin, TestCase):
+    def test_files_are_moved_on_rename(self):
+        book = self.add_book(cover_content=COVER)
+        old_file, old_cover = book.file.path, book.cover.path
+        inode = os.stat(old_file).st_ino
+
+        book.title = "renamed"
+        with self.captureOnCommitCallbacks(execute=True):
+            book.save()
+
+        book.refresh_from_db()
+        self.assertEqual(book.file.name, "books/mediauser/author_renamed/book.epub")
+        self.assertEqual(book.cover.name, "books/mediauser/author_renamed/cover.jpg")
+        self.assertFalse(os.path.exists(old_file))
+        self.assertFalse(os.path.exists(old_cover))
+        self.assertFalse(os.path.exists(os.path.dirname(old_file)))
+        # still the same blob
+        self.assertEqual(os.stat(book.file.path).st_ino, inode)
+        with book.file.open("rb") as file:
+            self.assertEqual(file.read(), b"book file")
+
+    def test_failed_update_keeps_old_files(self):
+        book = self.add_book(title="failed", file_content=b"failed update")
+        self.addCleanup(book.file.storage.delete, book.file.name)
+        Book.objects.filter(pk=book.pk).update(title="failed renamed")
+
+        with mock.patch("django.db.models.QuerySet.update", side_effect=DatabaseError):
+            with self.assertRaises(DatabaseError):
+                relocate_book_files(book.pk)
+
+        book.refresh_from_db()
+        self.assertEqual(book.file.name, "books/mediauser/author_failed/book.epub")
+        self.assertTrue(os.path.exists(book.file.path))
+        self.assertFalse(os.path.exists(self.media_path("books/mediauser/author_failed renamed")))
+
+    def test_files_changed_meanwhile_are_not_moved(self):
+        book = self.add_book(title="changed", file_content=b"changed meanwhile")
+        self.addCleanup(book.file.storage.delete, book.file.name)
+        Book.objects.filter(pk=book.pk).update(title="changed renamed")
+
+        def replace_file(book):
+            # the file is replaced between the read and the update of the book
+            Book.objects.filter(pk=book.pk).update(file="books/mediauser/replaced.epub")
+            return misplaced_fields(book)
+
+        with mock.patch("library.media.misplaced_fields", replace_file):
+            self.assertEqual(relocate_book_files(book.pk), {})
+
+        self.assertTrue(os.path.exists(book.file.path))
+        self.assertFalse(os.path.exists(self.media_path("books/mediauser/author_changed renamed")))
+
+    def test_other_changes_dont_move_files(self):
+        book = self.add_book()
+        name = book.file.name
+
+        book.rating = 5
+        with self.captureOnCommitCallbacks(execute=True):
+            book.save()
+
+        book.refresh_from_db()
+        self.assertEqual(book.file.name, name)
+
+    def test_files_are_deleted_with_book(self):
+        book = self.add_book(file_content=b"deleted with book", cover_content=COVER)
+        file_path, cover_path = book.file.path, book.cover.path
+
+        with self.captureOnCommitCallbacks(execute=True):
+            book.delete()
+
+        self.assertFalse(os.path.exists(file_path))
+        self.assertFalse(os.path.exists(cover_path))
+        self.assertEqual(self.blobs(), [])
+
+    def test_files_are_not_deleted_before_commit(self):
+        book = self.add_book(file_content=b"rolled back")
+
+        with self.captureOnCommitCallbacks(execute=False):
+            book.delete()
+
+        self.assertTrue(os.path.exists(book.file.path))
+
+    def test_files_are_deleted_with_user(self):
+        user = User.objects.create_user(
+            username="leaving", email="leaving@gmail.com", password="password1",
+            profile_picture=ContentFile(b"picture", name="me.jpg"),
+        )
+        category = BookCategory.objects.create(user=user, category_name="reading")
+        book = Book.objects.create(
+            user=user, category=category, title="left", author="author",
+            file=ContentFile(b"left book", name="left.epub"),
+        )
+
+        with self.captureOnCommitCallbacks(execute=True):
+            user.delete()
+
+        self.assertFalse(os.path.exists(book.file.path))
+        self.assertFalse(os.path.exists(user.profile_picture.path))
+
+    def test_shared_content_is_kept(self):
+        first = self.add_book(title="first", file_content=b"shared")
+        second = self.add_book(title="second", file_content=b"shared")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+
+        with second.file.open("rb") as file:
+            self.assertEqual(file.read(), b"shared")
+
+    def test_relocate_all(self):
+        book = self.add_book(title="old title")
+        # update() sends no signals
+        Book.objects.filter(pk=book.pk).update(title="new title")
+
+        relocated = relocate_all_book_files()
+
+        book.refresh_from_db()
+        self.assertEqual(relocated, 1)
+        self.assertEqual(book.file.name, "books/mediauser/author_new title/book.epub")
+        self.assertTrue(os.path.exists(book.file.path))
+
+
+class CollectMediaTest(MediaTestMixin, TestCase):
+    def orphan(self, name, content=b"orphan"):
+        os.makedirs(os.path.dirname(self.media_path(name)), exist_ok=True)
+        with open(self.media_path(name), "wb") as file:
+            file.write(content)
+
+    def test_unreferenced_files_are_deleted(self):
+        book = self.add_book(cover_content=COVER)
+        self.orphan("books/mediauser/author_gone/gone.epub")
+
+        result = collect_media(min_age=0)
+
+        self.assertEqual(result.deleted, 1)
+        self.assertTrue(os.path.exists(book.file.path))
+        self.assertTrue(os.path.exists(book.cover.path))
+        self.assertFalse(os.path.exists(self.media_path("books/mediauser/author_gone")))
+
+    def test_unreferenced_book_file_and_its_blob(self):
+        storage = get_book_file_storage()
+        name = storage.save("books/mediauser/author_gone/gone.epub", ContentFile(b"gone"))
+
+        collect_media(min_age=0)
+
+        self.assertFalse(storage.exists(name))
+        self.assertEqual(self.blobs(), [])
+
+    def test_new_files_are_kept(self):
+        self.orphan("books/mediauser/author_new/new.epub")
+
+        result = collect_media(min_age=60 * 60)
+
+        self.assertEqual(result.deleted, 0)
+        self.assertTrue(os.path.exists(self.media_path("books/mediauser/author_new/new.epub")))
+
+    def test_dry_run(self):
+        self.orphan("books/mediauser/author_gone/gone.epub")
+
+        result = collect_media(min_age=0, dry_run=True)
+
+        self.assertEqual(result.deleted, 1)
+        self.assertTrue(os.path.exists(self.media_path("books/mediauser/author_gone/gone.epub")))
+
+    def test_thumbnails_of_deleted_originals(self):
+        book = self.add_book(cover_content=COVER)
+        self.orphan(f"{os.path.dirname(book.cover.name)}/thumbnails/kept_160x240.jpg")
+        self.orphan("books/mediauser/author_gone/cover.jpg")
+        self.orphan("books/mediauser/author_gone/thumbnails/gone_160x240.jpg")
+
+        collect_media(min_age=0)
+
+        self.assertTrue(os.path.exists(
+            self.media_path(f"{os.path.dirname(book.cover.name)}/thumbnails/kept_160x240.jpg")
+        ))
+        self.assertFalse(os.path.exists(self.media_path("books/mediauser/author_gone")))
+
+    def test_files_are_checked_in_batches(self):
+        for i in range(5):
+            self.orphan(f"books/mediauser/author_gone/gone{i}.epub")
+        self.add_book()
+
+        collector = MediaCollector(min_age=0, batch_size=2)
+
+        # 3 for every batch of 2 files
+        with self.assertNumQueries(3 * 3):
+            collector.collect_files()
+
+        self.assertEqual(collector.result.deleted, 5)
+
+    def test_blob_without_names(self):
+        self.orphan("blobs/aa/bb/aabb")
+
+        collect_media(min_age=0)
+
+        self.assertEqual(self.blobs(), [])
+
+    def test_expired_uploads(self):
+        book = self.add_book(file_content=None)
+        upload = start_upload(book, "scanned.pdf", 100)
+        BookUpload.objects.filter(pk=upload.pk).update(
+            updated=datetime.datetime.now() - datetime.timedelta(days=30),
+        )
+        active = start_upload(book, "active.pdf", 100)
+
+        collect_media(min_age=0, upload_expiration=60 * 60)
+
+        self.assertFalse(BookUpload.objects.filter(pk=upload.pk).exists())
+        self.assertFalse(os.path.exists(staging_path(upload)))
+        self.assertTrue(os.path.exists(staging_path(active)))
+
+    def test_staging_files_without_uploads(self):
+        book = self.add_book(file_content=None)
+        upload = start_upload(book, "scanned.pdf", 100)
+        path = staging_path(upload)
+        BookUpload.objects.filter(pk=upload.pk).delete()
+
+        collect_media(min_age=0)
+
+        self.assertFalse(os.path.exists(path))
+
+    def test_command(self):
+        self.orphan("books/mediauser/author_gone/gone.epub", content=b"12345")
+        stdout = StringIO()
+
+        call_command("collect_media", "--min-age", "0", "--dry-run", stdout=stdout)
+
+        self.assertIn("books/mediauser/author_gone/gone.epub", stdout.getvalue())
+        self.assertIn("Would delete 1 files(5 bytes)", stdout.getvalue())
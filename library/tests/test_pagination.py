@@ -0,0 +1,97 @@
+from django.test import TestCase
+
+from users.models import User
+from library.models import Book, BookCategory
+from library.pagination import (
+    decode_cursor,
+    encode_cursor,
+    first_pages_by_category,
+    paginate_shelf,
+)
+from library import pagination
+
+from unittest import mock
+import datetime
+
+
+class ShelfPaginationTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username="paginator",
+            email="paginator@gmail.com",
+            password="password1",
+        )
+        cls.shelf = BookCategory.objects.create(user=cls.user, category_name="shelf")
+        cls.empty_shelf = BookCategory.objects.create(user=cls.user, category_name="empty")
+
+        # some books share "started" and some don't have it at all
+        # to check that the ordering is stable
+        started_dates = [None, None, datetime.date(2024, 1, 2), datetime.date(2024, 1, 1)]
+        Book.objects.bulk_create([
+            Book(
+                user=cls.user,
+                category=cls.shelf,
+                title=f"book {i}",
+                author="author",
+                started=started_dates[i % len(started_dates)],
+            )
+            for i in range(23)
+        ])
+
+    def shelf_books(self):
+        return Book.objects.filter(category=self.shelf)
+
+    def test_cursor_roundtrip(self):
+        for book in self.shelf_books():
+            self.assertEqual(decode_cursor(encode_cursor(book)), (book.started, book.id))
+
+    def test_pages_cover_the_shelf_in_order(self):
+        expected = list(self.shelf_books().order_by("started", "id"))
+
+        seen = []
+        page = paginate_shelf(self.shelf_books(), page_size=5)
+        seen += page
+        while page.has_next:
+            page = paginate_shelf(self.shelf_books(), cursor=page.next_cursor, page_size=5)
+            seen += page
+
+        self.assertEqual(seen, expected)
+
+    def test_last_page_has_no_cursor(self):
+        page = paginate_shelf(self.shelf_books(), page_size=23)
+        self.assertEqual(len(page), 23)
+        self.assertIsNone(page.next_cursor)
+
+    def test_each_page_is_one_query(self):
+        with self.assertNumQueries(1):
+            paginate_shelf(self.shelf_books(), page_size=5)
+
+    def test_first_pages_of_many_shelves(self):
+        other_shelf = BookCategory.objects.create(user=self.user, category_name="other")
+        book = Book.objects.create(user=self.user, category=other_shelf, title="other", author="author")
+        shelves = [self.shelf.pk, self.empty_shelf.pk, other_shelf.pk]
+
+        with mock.patch.object(pagination, "FIRST_PAGES_SHELVES_PER_QUERY", 2), self.assertNumQueries(2):
+            pages = first_pages_by_category(Book.objects.all(), shelves, page_size=10)
+
+        self.assertEqual(list(pages), [self.shelf.pk, other_shelf.pk])
+        self.assertEqual(pages[self.shelf.pk], paginate_shelf(self.shelf_books(), page_size=10))
+        self.assertEqual(pages[other_shelf.pk], [book])
+
+    def test_no_shelves(self):
+        with self.assertNumQueries(0):
+            self.assertEqual(first_pages_by_category(Book.objects.all(), []), {})
+
+    def test_first_pages_by_category(self):
+        with self.assertNumQueries(1):
+            pages = first_pages_by_category(
+                Book.objects.all(), [self.shelf.pk, self.empty_shelf.pk], page_size=10,
+            )
+
+        self.assertEqual(list(pages), [self.shelf.pk])
+        self.assertEqual(pages[self.shelf.pk], paginate_shelf(self.shelf_books(), page_size=10))
+        self.assertEqual(
+            pages[self.shelf.pk].next_cursor,
+            paginate_shelf(self.shelf_books(), page_size=10).next_cursor,
+        )
@@ -0,0 +1,148 @@
+'''Query budgets of the library views.
+
+Every view must fit into its budget whatever the size of the library,
+so the budgets are checked against generated libraries of different sizes.
+Budgets are for a cold shelf cache and include the query for request.user.
+'''
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+
+from users.models import User
+from library.models import Book, BookCategory
+from library.pagination import encode_cursor
+from utils import QueryBudgetTestUtils
+
+import datetime
+
+QUERY_BUDGETS = {
+    "your_all_books": 3,
+    "someones_all_books": 4,
+    "your_category": 3,
+    "your_category_next_page": 3,
+    "someones_category": 4,
+    "your_book": 2,
+    "someones_book": 3,
+    "categories_order": 2,
+    "new_book": 3,
+    "new_category": 1,
+    "users_list": 2,
+    "following_feed": 2,
+}
+
+CATEGORY_NAMES = ["to-read", "reading", "finished", "abandoned"]
+
+
+def generate_library(user, num_books):
+    categories = [
+        BookCategory.objects.create(user=user, category_name=category_name)
+        for category_name in CATEGORY_NAMES
+    ]
+    Book.objects.bulk_create(
+        [
+            Book(
+                user=user,
+                category=categories[i % len(categories)],
+                title=f"book {i}",
+                author=f"author {i % 100}",
+                started=datetime.date(2020, 1, 1) + datetime.timedelta(days=i % 1000),
+            )
+            for i in range(num_books)
+        ],
+        batch_size=1000,
+    )
+
+
+class QueryBudgetTestMixin(QueryBudgetTestUtils):
+    BOOKS = None
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username="budgeted",
+            email="budgeted@gmail.com",
+            password="password1",
+        )
+        cls.other_user = User.objects.create_user(
+            username="budgetedother",
+            email="budgetedother@gmail.com",
+            password="password1",
+        )
+        generate_library(cls.user, cls.BOOKS)
+        generate_library(cls.other_user, cls.BOOKS)
+
+        cls.cursor = encode_cursor(
+            Book.objects.filter(user=cls.user, category__category_name="reading").first()
+        )
+
+    def setUp(self):
+        # shelves must not be cached by the previous tests
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def assertWithinBudget(self, budget_name, url, data=None):
+        with self.assertMaxQueries(QUERY_BUDGETS[budget_name]):
+            response = self.client.get(url, data)
+
+        self.assertEqual(response.status_code, 200)
+
+    def test_your_all_books(self):
+        self.assertWithinBudget("your_all_books", reverse("your_all_books"))
+
+    def test_someones_all_books(self):
+        self.assertWithinBudget(
+            "someones_all_books",
+            reverse("someones_all_books", args=[self.other_user.username]),
+        )
+
+    def test_your_category(self):
+        self.assertWithinBudget("your_category", reverse("your_category", args=["reading"]))
+
+    def test_your_category_next_page(self):
+        self.assertWithinBudget(
+            "your_category_next_page",
+            reverse("your_category", args=["reading"]),
+            {"after": self.cursor},
+        )
+
+    def test_someones_category(self):
+        self.assertWithinBudget(
+            "someones_category",
+            reverse("someones_category", args=[self.other_user.username, "reading"]),
+        )
+
+    def test_your_book(self):
+        self.assertWithinBudget("your_book", reverse("your_book", args=["book 1", "author 1"]))
+
+    def test_someones_book(self):
+        self.assertWithinBudget(
+            "someones_book",
+            reverse("someones_book", args=[self.other_user.username, "book 1", "author 1"]),
+        )
+
+    def test_categories_order(self):
+        self.assertWithinBudget("categories_order", reverse("categories_order"))
+
+    def test_new_book(self):
+        self.assertWithinBudget("new_book", reverse("new_book"), {"category": "reading"})
+
+    def test_new_category(self):
+        self.assertWithinBudget("new_category", reverse("new_category"))
+
+    def test_users_list(self):
+        self.assertWithinBudget("users_list", reverse("users_list"))
+
+    def test_following_feed(self):
+        self.assertWithinBudget("following_feed", reverse("following_feed"))
+
+
+class SmallLibraryQueryBudgetTest(QueryBudgetTestMixin, TestCase):
+    BOOKS = 10
+
+
+class MediumLibraryQueryBudgetTest(QueryBudgetTestMixin, TestCase):
+    BOOKS = 1000
+
+
+class LargeLibraryQueryBudgetTest(QueryBudgetTestMixin, TestCase):
+    BOOKS = 10000
@@ -0,0 +1,233 @@
+'''Query plans of the library views.
+
+Every query made by a view is run again with EXPLAIN QUERY PLAN and the
+test fails if SQLite has to scan a whole table of the project for it,
+so a lost or unused index is noticed before deploying.
+'''
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from unittest import skipUnless
+
+from users.models import User, UserFollowing
+from library.models import Book, BookCategory, LibraryGroup
+from library.pagination import encode_cursor
+from library.media import referenced_names
+
+import datetime
+import re
+
+# "SCAN library_book" or "SCAN library_book USING COVERING INDEX ..." means
+# that every row(or index entry) is read. "SCAN (subquery-1)" only
+# reads the result of another step of the plan, so it is not a table scan
+TABLE_SCAN = re.compile(r"^SCAN (?P<table>(library|users|django)_\w+)")
+
+
+@skipUnless(connection.vendor == "sqlite", "EXPLAIN QUERY PLAN is SQLite specific")
+class QueryPlanTestMixin():
+    def explain(self, sql):
+        with connection.cursor() as cursor:
+            cursor.execute(f"EXPLAIN QUERY PLAN {sql}")
+            return [row[3] for row in cursor.fetchall()]
+
+    def assertNoTableScans(self, captured_queries, limited_scans=()):
+        '''limited_scans are the indexes that may be scanned by a query with
+        a LIMIT, it reads them in their order and stops at the limit'''
+        for query in captured_queries:
+            sql = query["sql"]
+            if not sql.startswith("SELECT"):
+                continue
+
+            for step in self.explain(sql):
+                match = TABLE_SCAN.match(step)
+                if match and " LIMIT " in sql and any(step.endswith(f" INDEX {index}") for index in limited_scans):
+                    continue
+                if match:
+                    self.fail(f"{match['table']} is scanned by:\n{sql}\nplan step: {step}")
+
+    def assertIndexUsed(self, captured_queries, index):
+        '''index is the index name or the searched columns as SQLite shows
+        them, e.g. "(user_id=? AND position=?)". The latter is needed for
+        UniqueConstraints, SQLite names their indexes itself'''
+        plans = [step for query in captured_queries for step in self.explain(query["sql"])]
+        self.assertTrue(
+            any(index in step for step in plans),
+            f"{index} is not used, plans:\n" + "\n".join(plans),
+        )
+
+    def get_queries(self, url, data=None, method="get"):
+        cache.clear()
+        with CaptureQueriesContext(connection) as captured:
+            response = getattr(self.client, method)(url, data)
+        self.assertLess(response.status_code, 400)
+
+        return captured
+
+
+class LibraryViewsQueryPlanTest(QueryPlanTestMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username="planner",
+            email="planner@gmail.com",
+            password="password1",
+        )
+        cls.other_user = User.objects.create_user(
+            username="plannedreader",
+            email="plannedreader@gmail.com",
+            password="password1",
+        )
+        UserFollowing.objects.create(who_follows=cls.user, whom_follows=cls.other_user)
+
+        for user in [cls.user, cls.other_user]:
+            for category_name in ["to-read", "reading", "finished"]:
+                category = BookCategory.objects.create(user=user, category_name=category_name)
+                Book.objects.bulk_create([
+                    Book(
+                        user=user,
+                        category=category,
+                        title=f"{category_name} {i}",
+                        author=f"author {i % 7}",
+                        started=datetime.date(2024, 1, 1 + i % 28) if i % 3 else None,
+                    )
+                    for i in range(30)
+                ])
+
+        cls.cursor = encode_cursor(Book.objects.filter(user=cls.user).order_by("id")[5])
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def test_all_books(self):
+        captured = self.get_queries(reverse("your_all_books"))
+
+        self.assertNoTableScans(captured)
+        # the first page of every shelf is read from the shelf index,
+        # then its books are looked up by the ids
+        self.assertIndexUsed(captured, "library_book_shelf_idx (category_id=?)")
+        self.assertIndexUsed(captured, "library_book USING INTEGER PRIMARY KEY")
+
+    def test_someones_all_books(self):
+        captured = self.get_queries(reverse("someones_all_books", args=[self.other_user.username]))
+        self.assertNoTableScans(captured)
+
+    def test_category(self):
+        captured = self.get_queries(reverse("your_category", args=["reading"]))
+
+        self.assertNoTableScans(captured)
+        self.assertIndexUsed(captured, "(user_id=? AND category_name=?)")
+        self.assertIndexUsed(captured, "library_book_shelf_idx")
+
+    def test_category_next_page(self):
+        captured = self.get_queries(
+            reverse("your_category", args=["reading"]), {"after": self.cursor}
+        )
+        self.assertNoTableScans(captured)
+
+    def test_someones_category(self):
+        captured = self.get_queries(
+            reverse("someones_category", args=[self.other_user.username, "finished"])
+        )
+        self.assertNoTableScans(captured)
+
+    def test_book(self):
+        captured = self.get_queries(reverse("your_book", args=["reading 1", "author 1"]))
+
+        self.assertNoTableScans(captured)
+        self.assertIndexUsed(captured, "(user_id=? AND title=? AND author=?)")
+
+    def test_someones_book(self):
+        captured = self.get_queries(
+            reverse("someones_book", args=[self.other_user.username, "reading 1", "author 1"])
+        )
+        self.assertNoTableScans(captured)
+
+    def test_categories_order(self):
+        captured = self.get_queries(reverse("categories_order"))
+        self.assertNoTableScans(captured)
+
+    def test_categories_order_post(self):
+        captured = self.get_queries(reverse("categories_order"), {
+            "bookcategory_select_1": "finished",
+            "bookcategory_select_2": "reading",
+            "bookcategory_select_3": "to-read",
+        }, method="post")
+        self.assertNoTableScans(captured)
+
+    def test_new_book(self):
+        captured = self.get_queries(reverse("new_book"), {"category": "reading"})
+        self.assertNoTableScans(captured)
+
+    def test_new_category(self):
+        captured = self.get_queries(reverse("new_category"), {"category_name": "new"}, method="post")
+        self.assertNoTableScans(captured)
+
+    def test_following_feed(self):
+        captured = self.get_queries(reverse("following_feed"))
+
+        self.assertNoTableScans(captured)
+        self.assertIndexUsed(captured, "library_activity_user_idx")
+
+
+class DirectoryQueryPlanTest(QueryPlanTestMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        for i in range(3):
+            User.objects.create_user(
+                username=f"listed{i}", email=f"listed{i}@gmail.com", password="password1",
+            )
+
+    def test_first_page(self):
+        captured = self.get_queries(reverse("users_list"))
+
+        # the first page is read in the index order until the limit,
+        # so it is a SCAN of the index, not of the table
+        self.assertNoTableScans(captured, limited_scans=["users_user_listed_idx"])
+        self.assertIndexUsed(captured, "users_user_listed_idx")
+
+    def test_next_page(self):
+        captured = self.get_queries(reverse("users_list"), {"after": "listed0"})
+
+        self.assertNoTableScans(captured)
+        self.assertIndexUsed(captured, "users_user_listed_idx (username>?)")
+
+    def test_search(self):
+        captured = self.get_queries(reverse("users_list"), {"q": "listed"})
+
+        self.assertNoTableScans(captured)
+        self.assertIndexUsed(captured, "users_user_listed_idx (username>? AND username<?)")
+
+
+class GroupQueryPlanTest(QueryPlanTestMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username="groupplanner", email="groupplanner@gmail.com", password="password1",
+        )
+        group = LibraryGroup.objects.create(name="planners", creator=cls.user)
+        group.users.add(cls.user)
+        category = BookCategory.objects.create(user=cls.user, category_name="reading")
+        Book.objects.create(user=cls.user, category=category, title="title", author="author")
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def test_group(self):
+        captured = self.get_queries(reverse("group", args=["planners"]))
+
+        self.assertNoTableScans(captured)
+        # membership check and the members' books
+        self.assertIndexUsed(captured, "(librarygroup_id=? AND user_id=?)")
+        self.assertIndexUsed(captured, "library_book_user_shelf_idx")
+
+
+class MediaQueryPlanTest(QueryPlanTestMixin, TestCase):
+    def test_referenced_names(self):
+        with CaptureQueriesContext(connection) as captured:
+            referenced_names(["books/planner/author_title/book.epub", "profile_pictures/me.jpg"])
+
+        self.assertNoTableScans(captured)
+        self.assertIndexUsed(captured, "library_book_file_idx")
+        self.assertIndexUsed(captured, "library_book_cover_idx")
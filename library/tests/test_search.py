@@ -0,0 +1,133 @@
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from unittest import skipUnless
+
+from users.models import UserFollowing
+from library.models import Book
+from library.search import FOLLOWING, get_search_backend, search_books
+from library.tests.test_views import add_user, add_categories
+
+from io import StringIO
+
+
+class SearchTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = add_user("searcher")
+        cls.followed = add_user("searched_user")
+        cls.stranger = add_user("stranger")
+        UserFollowing.objects.create(who_follows=cls.user, whom_follows=cls.followed)
+
+        for user in [cls.user, cls.followed, cls.stranger]:
+            category, = add_categories(user, "reading")
+            Book.objects.bulk_create([
+                Book(user=user, category=category, title="Dune", author="Frank Herbert"),
+                Book(user=user, category=category, title="Children of Dune", author="Frank Herbert"),
+                Book(user=user, category=category, title="Emma", author="Jane Austen",
+                     comment="reminded me of dune"),
+                Book(user=user, category=category, title="Les Misérables", author="Victor Hugo"),
+            ])
+
+    def titles(self, books):
+        return [book.title for book in books]
+
+    def test_ranking(self):
+        books = search_books("dune", self.user)
+
+        # title matches are better than comment ones, shorter titles are better
+        self.assertEqual(self.titles(books), ["Dune", "Children of Dune", "Emma"])
+        self.assertEqual({book.user for book in books}, {self.user})
+        self.assertGreater(books[0].search_rank, books[-1].search_rank)
+
+    def test_all_words_must_match(self):
+        self.assertEqual(self.titles(search_books("children herbert", self.user)), ["Children of Dune"])
+        self.assertEqual(search_books("children austen", self.user), [])
+
+    def test_whole_words_only(self):
+        self.assertEqual(search_books("jane aus", self.user), [])
+
+    @override_settings(LIBRARY_SEARCH_CANDIDATES=2)
+    def test_only_newest_candidates_are_ranked(self):
+        self.assertEqual(self.titles(search_books("dune", self.user)), ["Children of Dune", "Emma"])
+
+    def test_diacritics(self):
+        self.assertEqual(self.titles(search_books("miserables", self.user)), ["Les Misérables"])
+
+    def test_syntax_is_not_interpreted(self):
+        self.assertEqual(search_books('"dune OR NOT *', self.user), [])
+        self.assertEqual(search_books("   ", self.user), [])
+
+    def test_following(self):
+        books = search_books("dune", self.user, scope=FOLLOWING)
+
+        self.assertEqual({book.user for book in books}, {self.followed})
+
+    def test_following_nobody(self):
+        self.assertEqual(search_books("dune", self.stranger, scope=FOLLOWING), [])
+
+    def test_limit(self):
+        self.assertEqual(len(search_books("frank", self.user, limit=1)), 1)
+
+    def test_index_follows_changes(self):
+        book = Book.objects.get(user=self.user, title="Emma")
+        book.title = "Persuasion"
+        book.save()
+        Book.objects.filter(user=self.user, title="Dune").update(comment="sandworms")
+        Book.objects.filter(user=self.user, title="Children of Dune").delete()
+
+        self.assertEqual(self.titles(search_books("persuasion", self.user)), ["Persuasion"])
+        self.assertEqual(self.titles(search_books("sandworms", self.user)), ["Dune"])
+        self.assertEqual(self.titles(search_books("children", self.user)), [])
+
+    def test_two_queries(self):
+        with self.assertNumQueries(2):
+            search_books("dune", self.user)
+
+    @skipUnless(connection.vendor == "sqlite", "FTS5 triggers are SQLite specific")
+    def test_triggers_are_reinstalled(self):
+        with connection.cursor() as cursor:
+            cursor.execute("DROP TRIGGER library_book_fts_update")
+        Book.objects.filter(user=self.user, title="Emma").update(title="Persuasion")
+
+        self.assertTrue(get_search_backend().install(connection))
+
+        self.assertEqual(self.titles(search_books("persuasion", self.user)), ["Persuasion"])
+        self.assertEqual(search_books("emma", self.user), [])
+
+    def test_rebuild_command(self):
+        stdout = StringIO()
+        call_command("rebuild_search_index", stdout=stdout)
+
+        self.assertIn("Rebuilt", stdout.getvalue())
+        self.assertEqual(len(search_books("dune", self.user)), 3)
+
+    def test_view(self):
+        self.client.force_login(self.user)
+
+        response = self.client.get(reverse("your_search"), {"q": "herbert"})
+
+        self.assertContains(response, reverse("your_book", args=["Dune", "Frank Herbert"]))
+        self.assertNotContains(response, "searched_user")
+
+    def test_view_following(self):
+        self.client.force_login(self.user)
+
+        response = self.client.get(reverse("your_search"), {"q": "herbert", "scope": "following"})
+
+        self.assertContains(response, reverse("someones_book", args=["searched_user", "Dune", "Frank Herbert"]))
+
+    def test_view_of_someones_library(self):
+        self.client.force_login(self.user)
+
+        response = self.client.get(reverse("someones_search", args=["stranger"]), {"q": "emma"})
+
+        self.assertContains(response, reverse("someones_book", args=["stranger", "Emma", "Jane Austen"]))
+
+    def test_view_unknown_scope(self):
+        self.client.force_login(self.user)
+
+        response = self.client.get(reverse("your_search"), {"q": "dune", "scope": "everyone"})
+
+        self.assertEqual(response.status_code, 400)
@@ -0,0 +1,136 @@
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+
+from library.models import Book
+from library.stats import finished_per_month, get_reading_stats
+from library.summaries import rebuild_reading_summaries
+from library.tests.test_views import add_user, add_categories
+
+import datetime
+
+D = datetime.date
+
+
+class ReadingStatsTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = add_user("reader")
+        cls.finished, cls.to_read = add_categories(cls.user, "finished", "to-read")
+        books = [
+            # (title, author, started, finished, rating, pages)
+            ("a", "Frank Herbert", D(2021, 1, 1), D(2021, 1, 11), 8, 400),
+            ("b", "Frank Herbert", D(2021, 1, 5), D(2021, 2, 4), 6, None),
+            ("c", "Jane Austen", D(2021, 3, 1), D(2021, 3, 2), 10, 300),
+            ("d", "Jane Austen", None, D(2021, 6, 1), None, None),
+            ("e", "Jane Austen", D(2022, 12, 1), D(2022, 12, 31), 9, None),
+            ("f", "Jane Austen", D(2023, 1, 1), D(2023, 1, 2), None, 50),
+        ]
+        Book.objects.bulk_create([
+            Book(user=cls.user, category=cls.finished, title=title, author=author,
+                 started=started, finished=finished, rating=rating, pages=pages)
+            for title, author, started, finished, rating, pages in books
+        ] + [
+            Book(user=cls.user, category=cls.to_read, title="g", author="", started=None, rating=2),
+        ])
+        Book.objects.create(
+            user=add_user("someone else"), category=add_categories(add_user("x"), "x")[0],
+            title="other", started=None, finished=D(2021, 4, 1),
+        )
+        rebuild_reading_summaries()
+
+    def setUp(self):
+        cache.clear()
+
+    def test_totals(self):
+        stats = get_reading_stats(self.user)
+
+        self.assertEqual((stats["books"], stats["finished"], stats["rated"]), (7, 6, 5))
+        self.assertEqual(stats["average_rating"], 7)
+        self.assertEqual(stats["pages"], 750)
+        # (10 + 30 + 1 + 30 + 1) / 5, the book without started is skipped
+        self.assertEqual(stats["average_days_to_finish"], 14.4)
+
+    def test_finished_per_month_and_year(self):
+        stats = get_reading_stats(self.user)
+
+        self.assertEqual(
+            stats["finished_per_year"],
+            [{"year": 2021, "finished": 4}, {"year": 2022, "finished": 1}, {"year": 2023, "finished": 1}],
+        )
+        self.assertEqual(
+            [(month["month"], month["finished"]) for month in stats["finished_per_month"]],
+            [(D(2021, 1, 1), 1), (D(2021, 2, 1), 1), (D(2021, 3, 1), 1),
+             (D(2021, 6, 1), 1), (D(2022, 12, 1), 1), (D(2023, 1, 1), 1)],
+        )
+
+    def test_streaks(self):
+        stats = get_reading_stats(self.user)
+
+        self.assertEqual(
+            [(streak["start"], streak["end"], streak["months"]) for streak in stats["streaks"]],
+            [(D(2021, 1, 1), D(2021, 3, 1), 3), (D(2021, 6, 1), D(2021, 6, 1), 1),
+             (D(2022, 12, 1), D(2023, 1, 1), 2)],
+        )
+        self.assertEqual(stats["longest_streak"]["months"], 3)
+        self.assertIsNone(stats["current_streak"])
+
+    def test_current_streak(self):
+        this_month = datetime.date.today().replace(day=1)
+        Book.objects.create(
+            user=self.user, category=self.finished, title="now", started=this_month, finished=this_month,
+        )
+
+        self.assertEqual(get_reading_stats(self.user)["current_streak"]["end"], this_month)
+
+    def test_shelves_and_authors(self):
+        stats = get_reading_stats(self.user)
+
+        self.assertEqual(stats["shelves"], [
+            {"category_name": "finished", "books": 6, "rated": 4, "average_rating": 8.25},
+            {"category_name": "to-read", "books": 1, "rated": 1, "average_rating": 2},
+        ])
+        self.assertEqual(stats["top_authors"], [
+            {"author": "Jane Austen", "books": 4, "finished": 4, "rated": 2, "average_rating": 9.5},
+            {"author": "Frank Herbert", "books": 2, "finished": 2, "rated": 2, "average_rating": 7},
+        ])
+
+    def test_empty_library(self):
+        stats = get_reading_stats(add_user("new"))
+
+        self.assertEqual(stats["books"], 0)
+        self.assertIsNone(stats["average_rating"])
+        self.assertEqual(stats["streaks"], [])
+        self.assertIsNone(stats["longest_streak"])
+
+    def test_cached_until_books_change(self):
+        get_reading_stats(self.user)
+        with self.assertNumQueries(0):
+            get_reading_stats(self.user)
+
+        book = Book.objects.get(user=self.user, title="g")
+        book.finished = D(2021, 6, 5)
+        book.save()
+
+        self.assertEqual(get_reading_stats(self.user)["finished"], 7)
+
+    def test_finished_books_are_one_query(self):
+        with self.assertNumQueries(1):
+            list(finished_per_month(self.user))
+
+    def test_view(self):
+        self.client.force_login(self.user)
+
+        response = self.client.get(reverse("your_stats"))
+
+        self.assertContains(response, "longest streak: 3 months")
+        self.assertContains(response, "Jane Austen: 4 books")
+
+    def test_view_json(self):
+        self.client.force_login(add_user("viewer"))
+
+        response = self.client.get(reverse("someones_stats", args=["reader"]), {"format": "json"})
+
+        stats = response.json()
+        self.assertEqual(stats["finished"], 6)
+        self.assertEqual(stats["longest_streak"]["start"], "2021-01-01")
@@ -0,0 +1,176 @@
+from django.core.files import File
+from django.core.files.base import ContentFile
+from django.test import TestCase, override_settings
+
+from users.models import User
+from library.models import Book, BookCategory
+from library.storage import ContentAddressedStorage, get_book_file_storage
+
+from unittest import mock
+import hashlib
+import os
+import shutil
+import tempfile
+
+BOOK_FILE = "library/tests/media/epubtestfile.epub"
+
+
+class ContentAddressedStorageTest(TestCase):
+    def setUp(self):
+        self.location = tempfile.mkdtemp()
+        self.storage = ContentAddressedStorage(location=self.location)
+
+    def tearDown(self):
+        shutil.rmtree(self.location, ignore_errors=True)
+
+    def blobs(self):
+        blobs_dir = os.path.join(self.location, self.storage.BLOBS_DIR)
+        return sorted(
+            name
+            for directory, _, names in os.walk(blobs_dir)
+            if not directory.endswith("tmp")
+            for name in names
+        )
+
+    def test_same_content_is_stored_once(self):
+        first = self.storage.save("a/book.epub", ContentFile(b"same content"))
+        second = self.storage.save("b/book.epub", ContentFile(b"same content"))
+
+        self.assertEqual(self.blobs(), [hashlib.sha256(b"same content").hexdigest()])
+        self.assertEqual(
+            os.stat(self.storage.path(first)).st_ino,
+            os.stat(self.storage.path(second)).st_ino,
+        )
+
+    def test_different_content(self):
+        self.storage.save("a/book.epub", ContentFile(b"first"))
+        self.storage.save("a/other.epub", ContentFile(b"second"))
+
+        self.assertEqual(len(self.blobs()), 2)
+
+    def test_file_is_readable_by_its_name(self):
+        name = self.storage.save("books/user/author_title/book.epub", ContentFile(b"content"))
+
+        self.assertEqual(name, "books/user/author_title/book.epub")
+        with self.storage.open(name) as file:
+            self.assertEqual(file.read(), b"content")
+
+    def test_taken_name_gets_another_one(self):
+        first = self.storage.save("a/book.epub", ContentFile(b"content"))
+        second = self.storage.save("a/book.epub", ContentFile(b"content"))
+
+        self.assertNotEqual(first, second)
+        self.assertTrue(self.storage.exists(first))
+        self.assertTrue(self.storage.exists(second))
+
+    def test_blob_is_kept_while_referenced(self):
+        first = self.storage.save("a/book.epub", ContentFile(b"content"))
+        second = self.storage.save("b/book.epub", ContentFile(b"content"))
+
+        self.storage.delete(first)
+
+        self.assertFalse(self.storage.exists(first))
+        self.assertEqual(len(self.blobs()), 1)
+        with self.storage.open(second) as file:
+            self.assertEqual(file.read(), b"content")
+
+    def test_last_reference_deletes_blob(self):
+        first = self.storage.save("a/book.epub", ContentFile(b"content"))
+        second = self.storage.save("b/book.epub", ContentFile(b"content"))
+
+        self.storage.delete(first)
+        self.storage.delete(second)
+
+        self.assertEqual(self.blobs(), [])
+
+    def test_delete_missing(self):
+        self.storage.delete("not/there.epub")
+
+    def test_upload_is_read_once(self):
+        content = ContentFile(b"x" * 10**6)
+
+        with mock.patch.object(content, "chunks", wraps=content.chunks) as chunks:
+            self.storage.save("big.epub", content)
+
+        self.assertEqual(chunks.call_count, 1)
+
+    def test_no_temporary_files_are_left(self):
+        self.storage.save("a/book.epub", ContentFile(b"content"))
+        self.storage.save("b/book.epub", ContentFile(b"content"))
+
+        self.assertEqual(os.listdir(os.path.join(self.location, "blobs", "tmp")), [])
+
+    def test_file_system_without_hard_links(self):
+        real_link = os.link
+
+        def link(source, target):
+            if "blobs" not in str(target):
+                raise OSError(1, "Operation not permitted")  # EPERM
+            return real_link(source, target)
+
+        with mock.patch("library.storage.os.link", link):
+            name = self.storage.save("a/book.epub", ContentFile(b"copied"))
+            other = self.storage.save("b/book.epub", ContentFile(b"copied"))
+
+        with self.storage.open(name) as file:
+            self.assertEqual(file.read(), b"copied")
+        # the copies don't reference the blob, it isn't left behind
+        self.assertEqual(self.blobs(), [])
+
+        self.storage.delete(name)
+        self.storage.delete(other)
+        self.assertFalse(self.storage.exists(other))
+
+    def test_copy_keeps_blob_of_linked_names(self):
+        linked = self.storage.save("a/book.epub", ContentFile(b"content"))
+
+        real_link = os.link
+
+        def link(source, target):
+            if "blobs" not in str(target):
+                raise OSError(31, "Too many links")  # EMLINK
+            return real_link(source, target)
+
+        with mock.patch("library.storage.os.link", link):
+            copied = self.storage.save("b/book.epub", ContentFile(b"content"))
+
+        self.assertEqual(len(self.blobs()), 1)
+        self.storage.delete(copied)
+        self.assertEqual(len(self.blobs()), 1)
+        self.storage.delete(linked)
+        self.assertEqual(self.blobs(), [])
+
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class BookFileStorageTest(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)  # delete the temp dir
+        super().tearDownClass()
+
+    def test_book_files_are_deduplicated(self):
+        books = []
+        for username in ["reader1", "reader2"]:
+            user = User.objects.create_user(
+                username=username, email=f"{username}@gmail.com", password="password1",
+            )
+            category = BookCategory.objects.create(user=user, category_name="to-read")
+            with open(BOOK_FILE, "rb") as book_file:
+                books.append(Book.objects.create(
+                    user=user,
+                    category=category,
+                    title="popular",
+                    author="author",
+                    file=File(book_file, name="epubtestfile.epub"),
+                ))
+
+        self.assertIsInstance(books[0].file.storage, ContentAddressedStorage)
+        self.assertIs(books[0].file.storage, get_book_file_storage())
+        self.assertEqual(books[0].file.name, "books/reader1/author_popular/epubtestfile.epub")
+        self.assertEqual(
+            os.stat(books[0].file.path).st_ino,
+            os.stat(books[1].file.path).st_ino,
+        )
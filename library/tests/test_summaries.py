@@ -0,0 +1,169 @@
+from django.core.management import call_command
+from django.test import TestCase, TransactionTestCase
+
+from users.models import User
+from library.models import Book, ReadingSummary
+from library.summaries import SUMMARY_FIELDS, rebuild_reading_summaries
+from library.tests.test_views import add_user, add_categories
+
+from io import StringIO
+import datetime
+
+D = datetime.date
+
+
+class ReadingSummaryTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = add_user("summarized")
+        cls.finished, = add_categories(cls.user, "finished")
+
+    def add_book(self, title="book", **kwargs):
+        return Book.objects.create(
+            user=self.user, category=self.finished, title=title, author="author", **kwargs
+        )
+
+    def summaries(self):
+        return {
+            (row["year"], row["month"]): {field_name: row[field_name] for field_name in SUMMARY_FIELDS}
+            for row in ReadingSummary.objects.filter(user=self.user).values()
+            if row["finished_count"]
+        }
+
+    def summary(self, finished_count=0, rated_count=0, rating_sum=0,
+                pages_count=0, pages_sum=0, timed_count=0, days_sum=0):
+        return {
+            "finished_count": finished_count, "rated_count": rated_count, "rating_sum": rating_sum,
+            "pages_count": pages_count, "pages_sum": pages_sum, "timed_count": timed_count, "days_sum": days_sum,
+        }
+
+    def test_new_books(self):
+        self.add_book("a", started=D(2024, 1, 1), finished=D(2024, 1, 11), rating=8, pages=300)
+        self.add_book("b", started=None, finished=D(2024, 1, 20), rating=6)
+        self.add_book("c", started=None)
+
+        self.assertEqual(self.summaries(), {
+            (2024, 1): self.summary(finished_count=2, rated_count=2, rating_sum=14,
+                                    pages_count=1, pages_sum=300, timed_count=1, days_sum=10),
+        })
+
+    def test_changed_book_moves_between_months(self):
+        book = self.add_book(started=D(2024, 1, 1), finished=D(2024, 1, 11), rating=8)
+
+        book = Book.objects.get(pk=book.pk)
+        book.finished = D(2024, 3, 1)
+        book.rating = 9
+        book.pages = 100
+        book.save()
+
+        self.assertEqual(self.summaries(), {
+            (2024, 3): self.summary(finished_count=1, rated_count=1, rating_sum=9,
+                                    pages_count=1, pages_sum=100, timed_count=1, days_sum=60),
+        })
+
+    def test_book_given_to_another_user(self):
+        other_user = add_user("receiving")
+        other_shelf, = add_categories(other_user, "finished")
+        book = Book.objects.get(pk=self.add_book(started=None, finished=D(2024, 1, 11), rating=8).pk)
+
+        book.user = other_user
+        book.category = other_shelf
+        book.save()
+
+        self.assertEqual(self.summaries(), {})
+        self.assertEqual(
+            list(ReadingSummary.objects.filter(user=other_user).values_list("month", "finished_count", "rating_sum")),
+            [(1, 1, 8)],
+        )
+
+    def test_unfinished_and_deleted_books(self):
+        book = self.add_book(started=D(2024, 1, 1), finished=D(2024, 1, 11))
+        self.add_book("other", started=None, finished=D(2024, 1, 5))
+
+        book = Book.objects.get(pk=book.pk)
+        book.finished = None
+        book.save()
+        Book.objects.get(title="other").delete()
+
+        self.assertEqual(self.summaries(), {})
+
+    def test_unchanged_book_takes_no_queries(self):
+        book = Book.objects.get(pk=self.add_book(started=None, finished=D(2024, 1, 5)).pk)
+        book.comment = "changed"
+
+        # only the UPDATE of the book
+        with self.assertNumQueries(1):
+            book.save(update_fields=["comment"])
+
+    def test_book_not_loaded_from_database_is_skipped(self):
+        book = self.add_book(started=None, finished=D(2024, 1, 5))
+
+        Book(pk=book.pk, user=self.user, category=self.finished, title="book",
+             author="author", started=None, finished=D(2024, 2, 5)).save()
+
+        self.assertEqual(list(self.summaries()), [(2024, 1)])
+
+    def test_rebuild_matches_incremental(self):
+        book = self.add_book("a", started=D(2023, 12, 20), finished=D(2024, 1, 11), rating=8, pages=300)
+        self.add_book("b", started=None, finished=D(2024, 2, 1), rating=3)
+        book = Book.objects.get(pk=book.pk)
+        book.finished = D(2024, 2, 3)
+        book.save()
+        incremental = self.summaries()
+
+        ReadingSummary.objects.all().delete()
+        inserted = rebuild_reading_summaries(batch_size=1)
+
+        self.assertEqual(inserted, 1)
+        self.assertEqual(self.summaries(), incremental)
+
+    def test_rebuild_fixes_bulk_created_books(self):
+        Book.objects.bulk_create([
+            Book(user=self.user, category=self.finished, title=str(i), started=None, finished=D(2024, 5, i + 1))
+            for i in range(3)
+        ])
+        self.assertEqual(self.summaries(), {})
+
+        rebuild_reading_summaries()
+
+        self.assertEqual(self.summaries(), {(2024, 5): self.summary(finished_count=3)})
+
+    def test_command(self):
+        Book.objects.bulk_create([
+            Book(user=self.user, category=self.finished, title="a", started=None, finished=D(2024, 5, 1)),
+        ])
+        out = StringIO()
+
+        call_command("rebuild_reading_summaries", stdout=out)
+
+        self.assertIn("Rebuilt 1 reading summary rows", out.getvalue())
+        self.assertEqual(list(self.summaries()), [(2024, 5)])
+
+
+class DeletedUserSummaryTest(TransactionTestCase):
+    def test_user_with_finished_books_is_deleted(self):
+        user = add_user("leaving")
+        finished, = add_categories(user, "finished")
+        for i in range(3):
+            Book.objects.create(user=user, category=finished, title=str(i), started=None, finished=D(2024, 1, 1))
+        other_book = Book.objects.create(
+            user=add_user("staying"), category=add_categories(add_user("x"), "x")[0],
+            title="other", started=None, finished=D(2024, 1, 1),
+        )
+
+        # the foreign keys are checked at the commit
+        User.objects.get(pk="leaving").delete()
+
+        self.assertFalse(ReadingSummary.objects.filter(user_id="leaving").exists())
+        self.assertTrue(ReadingSummary.objects.filter(user=other_book.user, finished_count=1).exists())
+
+    def test_removing_from_missing_row_inserts_nothing(self):
+        user = add_user("drifted")
+        finished, = add_categories(user, "finished")
+        Book.objects.bulk_create([
+            Book(user=user, category=finished, title="a", started=None, finished=D(2024, 1, 1)),
+        ])
+
+        Book.objects.get(title="a").delete()
+
+        self.assertFalse(ReadingSummary.objects.exists())
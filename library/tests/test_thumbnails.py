@@ -0,0 +1,203 @@
+from django.core.cache import cache
+from django.core.files import File
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from PIL import Image
+
+from unittest import mock
+
+from users.models import User
+from library.models import Book, BookCategory
+from library.thumbnails import (
+    generate_thumbnail,
+    get_cached_thumbnail,
+    get_thumbnail_url,
+    schedule_thumbnail,
+)
+
+import hashlib
+import io
+import os
+import shutil
+import tempfile
+
+MEDIA_ROOT = tempfile.mkdtemp()
+COVER = "library/tests/media/simple_book_cover.jpg"
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class ThumbnailTest(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)  # delete the temp dir
+        super().tearDownClass()
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username="thumbnailer",
+            email="thumbnailer@gmail.com",
+            password="password1",
+        )
+        cls.category = BookCategory.objects.create(user=cls.user, category_name="covers")
+
+    def setUp(self):
+        cache.clear()
+        # the same cover in the same directory has the same thumbnail
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def add_book_with_cover(self, title="covered"):
+        with open(COVER, "rb") as cover:
+            return Book.objects.create(
+                user=self.user,
+                category=self.category,
+                title=title,
+                author="author",
+                cover=File(cover, name="cover.jpg"),
+            )
+
+    def test_thumbnail_is_stored_next_to_original(self):
+        book = self.add_book_with_cover()
+
+        thumbnail = generate_thumbnail(default_storage, book.cover.name, book.cover_digest, "cover")
+
+        self.assertEqual(
+            os.path.dirname(thumbnail),
+            os.path.join(os.path.dirname(book.cover.name), "thumbnails"),
+        )
+        self.assertTrue(thumbnail.endswith("_160x240.jpg"))
+
+    def test_thumbnail_fits_into_size(self):
+        book = self.add_book_with_cover()
+
+        thumbnail = generate_thumbnail(default_storage, book.cover.name, book.cover_digest, "cover")
+
+        with default_storage.open(thumbnail) as file:
+            width, height = Image.open(file).size
+        self.assertLessEqual(width, 160)
+        self.assertLessEqual(height, 240)
+
+    def test_same_original_is_resized_once(self):
+        book = self.add_book_with_cover()
+
+        first = generate_thumbnail(default_storage, book.cover.name, book.cover_digest, "cover")
+        with mock.patch.object(default_storage, "save") as save:
+            second = generate_thumbnail(default_storage, book.cover.name, book.cover_digest, "cover")
+
+        self.assertEqual(first, second)
+        save.assert_not_called()
+
+    @override_settings(LIBRARY_THUMBNAIL_FORMAT="WEBP")
+    def test_webp(self):
+        book = self.add_book_with_cover()
+
+        thumbnail = generate_thumbnail(default_storage, book.cover.name, book.cover_digest, "cover")
+
+        self.assertTrue(thumbnail.endswith(".webp"))
+        with default_storage.open(thumbnail) as file:
+            self.assertEqual(Image.open(file).format, "WEBP")
+
+    def test_original_url_until_generated(self):
+        book = self.add_book_with_cover()
+
+        # the worker would write the thumbnail during the next tests
+        with mock.patch("library.thumbnails.schedule_thumbnail") as schedule:
+            self.assertEqual(get_thumbnail_url(book.cover, "cover"), book.cover.url)
+        schedule.assert_called_once_with(book.cover, "cover")
+
+    def test_thumbnail_url_when_generated(self):
+        book = self.add_book_with_cover()
+        thumbnail = generate_thumbnail(default_storage, book.cover.name, book.cover_digest, "cover")
+
+        self.assertEqual(get_thumbnail_url(book.cover, "cover"), default_storage.url(thumbnail))
+
+    def test_generated_thumbnail_is_found_after_cache_miss(self):
+        book = self.add_book_with_cover()
+        thumbnail = generate_thumbnail(default_storage, book.cover.name, book.cover_digest, "cover")
+        cache.clear()
+
+        with mock.patch("library.thumbnails.schedule_thumbnail") as schedule, \
+                mock.patch.object(default_storage, "open") as storage_open:
+            url = get_thumbnail_url(book.cover, "cover")
+
+        self.assertEqual(url, default_storage.url(thumbnail))
+        schedule.assert_not_called()
+        storage_open.assert_not_called()
+        self.assertEqual(get_cached_thumbnail(book.cover, "cover"), thumbnail)
+
+    def test_digest_is_stored_with_cover(self):
+        book = self.add_book_with_cover()
+
+        with open(COVER, "rb") as cover:
+            self.assertEqual(book.cover_digest, hashlib.sha256(cover.read()).hexdigest())
+        book.cover = None
+        book.save()
+        self.assertEqual(Book.objects.get(pk=book.pk).cover_digest, "")
+
+    def test_new_cover_under_old_name_gets_new_thumbnail(self):
+        book = self.add_book_with_cover()
+        name = book.cover.name
+        first = generate_thumbnail(default_storage, name, book.cover_digest, "cover")
+        with self.captureOnCommitCallbacks(execute=True):
+            book.delete()
+
+        # the same name is free again, the new cover gets it
+        other = Image.new("RGB", (300, 300), "red")
+        output = io.BytesIO()
+        other.save(output, format="JPEG")
+        book = Book.objects.create(
+            user=self.user, category=self.category, title="covered", author="author",
+            cover=ContentFile(output.getvalue(), name="cover.jpg"),
+        )
+
+        self.assertEqual(book.cover.name, name)
+        self.assertIsNone(get_cached_thumbnail(book.cover, "cover"))
+        with mock.patch("library.thumbnails.schedule_thumbnail"):
+            self.assertEqual(get_thumbnail_url(book.cover, "cover"), book.cover.url)
+        self.assertNotEqual(generate_thumbnail(default_storage, name, book.cover_digest, "cover"), first)
+
+    def test_thumbnails_are_deleted_with_original(self):
+        book = self.add_book_with_cover()
+        thumbnail = generate_thumbnail(default_storage, book.cover.name, book.cover_digest, "cover")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            book.delete()
+
+        self.assertFalse(default_storage.exists(thumbnail))
+        self.assertFalse(default_storage.exists(book.cover.name))
+
+    def test_worker_generates_thumbnail(self):
+        book = self.add_book_with_cover()
+
+        future = schedule_thumbnail(book.cover, "cover")
+
+        self.assertEqual(future.result(timeout=10), get_cached_thumbnail(book.cover, "cover"))
+
+    def test_upload_schedules_thumbnail_after_commit(self):
+        with mock.patch("library.signals.schedule_thumbnail") as schedule:
+            with self.captureOnCommitCallbacks(execute=False) as callbacks:
+                self.add_book_with_cover()
+            schedule.assert_not_called()
+
+            for callback in callbacks:
+                callback()
+            schedule.assert_called_once()
+
+    @override_settings(LIBRARY_THUMBNAIL_QUEUE_SIZE=0)
+    def test_full_queue_is_not_waited_for(self):
+        book = self.add_book_with_cover()
+
+        self.assertIsNone(schedule_thumbnail(book.cover, "cover"))
+
+    def test_all_books_shows_thumbnail(self):
+        book = self.add_book_with_cover()
+        thumbnail = generate_thumbnail(default_storage, book.cover.name, book.cover_digest, "cover")
+        self.client.force_login(self.user)
+
+        response = self.client.get(reverse("your_all_books"))
+
+        self.assertContains(response, default_storage.url(thumbnail))
+        self.assertNotContains(response, f'src="{book.cover.url}"')
@@ -0,0 +1,254 @@
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from users.models import User
+from library.models import Book, BookCategory, BookUpload
+from library.uploads import OffsetMismatch, append_chunk, staging_path
+
+from io import BytesIO
+from unittest import mock
+import base64
+import hashlib
+import os
+import shutil
+import tempfile
+
+MEDIA_ROOT = tempfile.mkdtemp()
+STAGING_DIR = tempfile.mkdtemp()
+CONTENT = os.urandom(10000)
+CHUNK = 4000
+
+
+def checksum(data):
+    return "sha256 " + base64.b64encode(hashlib.sha256(data).digest()).decode()
+
+
+@override_settings(
+    MEDIA_ROOT=MEDIA_ROOT,
+    LIBRARY_UPLOAD_STAGING_DIR=STAGING_DIR,
+    LIBRARY_UPLOAD_CHUNK_SIZE=CHUNK,
+    LIBRARY_UPLOAD_MAX_SIZE=10**6,
+)
+class BookUploadTest(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)  # delete the temp dirs
+        shutil.rmtree(STAGING_DIR, ignore_errors=True)
+        super().tearDownClass()
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username="uploader", email="uploader@gmail.com", password="password1",
+        )
+        cls.other_user = User.objects.create_user(
+            username="otheruploader", email="otheruploader@gmail.com", password="password1",
+        )
+        cls.category = BookCategory.objects.create(user=cls.user, category_name="reading")
+        cls.book = Book.objects.create(
+            user=cls.user, category=cls.category, title="scanned", author="author",
+        )
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def start(self, size=len(CONTENT), filename="scanned.pdf"):
+        response = self.client.post(
+            reverse("start_book_upload", args=["scanned", "author"]),
+            {"filename": filename, "size": size},
+        )
+        self.assertEqual(response.status_code, 201)
+        return response.json()["id"]
+
+    def put(self, upload_id, offset, data, checksum_data=None):
+        return self.client.put(
+            reverse("book_upload", args=[upload_id]),
+            data,
+            content_type="application/octet-stream",
+            headers={
+                "Upload-Offset": str(offset),
+                "Upload-Checksum": checksum(data if checksum_data is None else checksum_data),
+            },
+        )
+
+    def upload_all(self, upload_id, start=0):
+        for offset in range(start, len(CONTENT), CHUNK):
+            response = self.put(upload_id, offset, CONTENT[offset:offset + CHUNK])
+            self.assertEqual(response.status_code, 200)
+
+    def finish(self, upload_id):
+        return self.client.post(reverse("finish_book_upload", args=[upload_id]))
+
+    def test_start(self):
+        upload_id = self.start()
+
+        upload = BookUpload.objects.get(pk=upload_id)
+        self.assertEqual((upload.book, upload.offset, upload.size), (self.book, 0, len(CONTENT)))
+        self.assertEqual(os.path.getsize(staging_path(upload)), 0)
+
+    def test_start_too_big(self):
+        response = self.client.post(
+            reverse("start_book_upload", args=["scanned", "author"]),
+            {"filename": "huge.pdf", "size": 10**7},
+        )
+
+        self.assertEqual(response.status_code, 400)
+
+    def test_start_for_another_users_book(self):
+        self.client.force_login(self.other_user)
+
+        response = self.client.post(
+            reverse("start_book_upload", args=["scanned", "author"]),
+            {"filename": "scanned.pdf", "size": 10},
+        )
+
+        self.assertEqual(response.status_code, 404)
+
+    def test_chunks_are_appended(self):
+        upload_id = self.start()
+
+        response = self.put(upload_id, 0, CONTENT[:CHUNK])
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Upload-Offset"], str(CHUNK))
+        with open(staging_path(BookUpload.objects.get(pk=upload_id)), "rb") as file:
+            self.assertEqual(file.read(), CONTENT[:CHUNK])
+
+    def test_upload(self):
+        upload_id = self.start()
+        staged = staging_path(BookUpload.objects.get(pk=upload_id))
+        self.upload_all(upload_id)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.finish(upload_id)
+
+        self.assertEqual(response.status_code, 200)
+        self.book.refresh_from_db()
+        with self.book.file.open("rb") as file:
+            self.assertEqual(file.read(), CONTENT)
+        self.assertRegex(self.book.file.name, r"^books/uploader/author_scanned/scanned.*\.pdf$")
+        self.assertFalse(BookUpload.objects.filter(pk=upload_id).exists())
+        self.assertFalse(os.path.exists(staged))
+
+    def test_resume(self):
+        upload_id = self.start()
+        self.put(upload_id, 0, CONTENT[:CHUNK])
+
+        # the connection was lost, the client asks where to continue from
+        response = self.client.get(reverse("book_upload", args=[upload_id]))
+        offset = response.json()["offset"]
+        self.upload_all(upload_id, start=offset)
+
+        self.assertEqual(offset, CHUNK)
+        self.assertEqual(self.finish(upload_id).status_code, 200)
+
+    def test_wrong_offset(self):
+        upload_id = self.start()
+        self.put(upload_id, 0, CONTENT[:CHUNK])
+
+        response = self.put(upload_id, 0, CONTENT[:CHUNK])
+
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response["Upload-Offset"], str(CHUNK))
+
+    def test_concurrent_chunk_at_the_same_offset(self):
+        upload = BookUpload.objects.get(pk=self.start())
+        other_data = bytes(reversed(CONTENT[:CHUNK]))
+        stream = BytesIO(CONTENT[:CHUNK])
+
+        def read(size):
+            if stream.tell() == 0:
+                # the other request appends its chunk while this one is received
+                append_chunk(upload, 0, BytesIO(other_data), CHUNK, checksum(other_data))
+            return BytesIO.read(stream, size)
+
+        with mock.patch.object(stream, "read", read):
+            with self.assertRaises(OffsetMismatch):
+                append_chunk(upload, 0, stream, CHUNK, checksum(CONTENT[:CHUNK]))
+
+        upload.refresh_from_db()
+        self.assertEqual(upload.offset, CHUNK)
+        with open(staging_path(upload), "rb") as file:
+            self.assertEqual(file.read(), other_data)
+        # the files of the chunks are deleted
+        self.assertFalse([name for name in os.listdir(STAGING_DIR) if name.endswith(".chunk")])
+
+    def test_wrong_checksum(self):
+        upload_id = self.start()
+        self.put(upload_id, 0, CONTENT[:CHUNK])
+
+        response = self.put(upload_id, CHUNK, CONTENT[CHUNK:2 * CHUNK], checksum_data=b"other")
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response["Upload-Offset"], str(CHUNK))
+        upload = BookUpload.objects.get(pk=upload_id)
+        self.assertEqual(os.path.getsize(staging_path(upload)), CHUNK)
+
+    def test_leftovers_of_interrupted_chunk_are_overwritten(self):
+        upload_id = self.start()
+        self.put(upload_id, 0, CONTENT[:CHUNK])
+        # the process died while writing the next chunk
+        with open(staging_path(BookUpload.objects.get(pk=upload_id)), "ab") as file:
+            file.write(b"broken" * 1000)
+
+        self.upload_all(upload_id, start=CHUNK)
+        self.finish(upload_id)
+
+        self.book.refresh_from_db()
+        with self.book.file.open("rb") as file:
+            self.assertEqual(file.read(), CONTENT)
+
+    def test_chunk_past_the_end(self):
+        upload_id = self.start(size=10)
+
+        response = self.put(upload_id, 0, CONTENT[:20])
+
+        self.assertEqual(response.status_code, 400)
+
+    def test_chunk_too_big(self):
+        upload_id = self.start()
+
+        response = self.put(upload_id, 0, CONTENT[:CHUNK + 1])
+
+        self.assertEqual(response.status_code, 413)
+
+    def test_finish_incomplete(self):
+        upload_id = self.start()
+        self.put(upload_id, 0, CONTENT[:CHUNK])
+
+        response = self.finish(upload_id)
+
+        self.assertEqual(response.status_code, 400)
+        self.book.refresh_from_db()
+        self.assertFalse(self.book.file)
+
+    def test_another_users_upload(self):
+        upload_id = self.start()
+        self.client.force_login(self.other_user)
+
+        response = self.put(upload_id, 0, CONTENT[:CHUNK])
+
+        self.assertEqual(response.status_code, 404)
+
+    def test_cancel(self):
+        upload_id = self.start()
+        upload = BookUpload.objects.get(pk=upload_id)
+
+        response = self.client.delete(reverse("book_upload", args=[upload_id]))
+
+        self.assertEqual(response.status_code, 204)
+        self.assertFalse(BookUpload.objects.filter(pk=upload_id).exists())
+        self.assertFalse(os.path.exists(staging_path(upload)))
+
+    def test_new_book_with_file(self):
+        self.client.post(reverse("new_book"), {
+            "title": "small",
+            "author": "author",
+            "category": self.category.pk,
+            "file": SimpleUploadedFile("small.epub", b"small book"),
+        })
+
+        book = Book.objects.get(user=self.user, title="small")
+        with book.file.open("rb") as file:
+            self.assertEqual(file.read(), b"small book")
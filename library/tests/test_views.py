@@ -0,0 +1,233 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from users.models import User
+from library.caching import bump_shelves_version
+from library.models import Book, BookCategory
+from library.views import _sort_user_books_by_categories
+
+
+def add_user(username):
+    user = User.objects.create_user(
+        username=username,
+        email=f"{username}@gmail.com",
+        password="password1",
+    )
+
+    return user
+
+
+def add_categories(user, *category_names):
+    return [
+        BookCategory.objects.create(user=user, category_name=category_name)
+        for category_name in category_names
+    ]
+
+
+def add_books(user, category, num, **kwargs):
+    return Book.objects.bulk_create([
+        Book(
+            user=user,
+            category=category,
+            title=f"{category.category_name} book {i}",
+            author=f"author {i}",
+            **kwargs,
+        )
+        for i in range(num)
+    ])
+
+
+class ShelfLoaderTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = add_user("shelfowner")
+        cls.to_read, cls.reading, cls.finished = add_categories(
+            cls.user, "to-read", "reading", "finished"
+        )
+
+    def test_categories_are_ordered_by_position(self):
+        BookCategory.set_positions({self.to_read: 30, self.reading: 20, self.finished: 10})
+
+        books_by_categories = _sort_user_books_by_categories(self.user)
+
+        self.assertEqual(list(books_by_categories), ["finished", "reading", "to-read"])
+
+    def test_empty_categories_are_present(self):
+        add_books(self.user, self.reading, 2)
+
+        books_by_categories = _sort_user_books_by_categories(self.user)
+
+        self.assertEqual(books_by_categories["to-read"], [])
+        self.assertEqual(books_by_categories["finished"], [])
+        self.assertEqual(len(books_by_categories["reading"]), 2)
+
+    def test_books_are_grouped_by_category(self):
+        add_books(self.user, self.to_read, 3)
+        add_books(self.user, self.finished, 2)
+
+        books_by_categories = _sort_user_books_by_categories(self.user)
+
+        for category_name, books in books_by_categories.items():
+            for book in books:
+                self.assertEqual(book.category.category_name, category_name)
+
+    def test_other_users_books_are_not_loaded(self):
+        other_user = add_user("otheruser")
+        other_category = add_categories(other_user, "to-read")[0]
+        add_books(other_user, other_category, 3)
+
+        books_by_categories = _sort_user_books_by_categories(self.user)
+
+        self.assertEqual(sum(len(books) for books in books_by_categories.values()), 0)
+
+    def test_number_of_queries_does_not_depend_on_library_size(self):
+        add_books(self.user, self.to_read, 50)
+        add_books(self.user, self.finished, 50)
+
+        with self.assertNumQueries(2):
+            books_by_categories = _sort_user_books_by_categories(self.user)
+            for books in books_by_categories.values():
+                for book in books:
+                    str(book)
+                    book.category.category_name
+
+
+class AllBooksViewTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = add_user("allbooksowner")
+        cls.to_read, cls.finished = add_categories(cls.user, "to-read", "finished")
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def test_all_books_query_count_is_constant(self):
+        add_books(self.user, self.to_read, 1)
+        with self.assertNumQueries(3):  # user, categories, books
+            self.client.get(reverse("your_all_books"))
+
+        add_books(self.user, self.finished, 100)
+        # bulk_create sends no signals to invalidate shelves
+        bump_shelves_version(self.user.pk)
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse("your_all_books"))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            len(response.context["books_by_categories"]["finished"]),
+            settings.LIBRARY_SHELF_PAGE_SIZE,
+        )
+
+    @override_settings(LIBRARY_SHELF_PAGE_SIZE=5)
+    def test_all_books_shows_first_page_of_every_shelf(self):
+        add_books(self.user, self.to_read, 3)
+        add_books(self.user, self.finished, 12)
+
+        response = self.client.get(reverse("your_all_books"))
+        to_read = response.context["books_by_categories"]["to-read"]
+        finished = response.context["books_by_categories"]["finished"]
+
+        self.assertEqual(len(to_read), 3)
+        self.assertFalse(to_read.has_next)
+        self.assertEqual(len(finished), 5)
+        self.assertTrue(finished.has_next)
+        self.assertContains(response, f"?after={finished.next_cursor}")
+
+
+class CategoryViewTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = add_user("categoryowner")
+        cls.to_read, cls.finished = add_categories(cls.user, "to-read", "finished")
+        add_books(cls.user, cls.to_read, 3)
+        add_books(cls.user, cls.finished, 30)
+
+        cls.other_user = add_user("categoryviewer")
+        add_categories(cls.other_user, "someones-only")
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def test_your_category_shows_only_its_books(self):
+        response = self.client.get(reverse("your_category", args=["to-read"]))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context["books"]), 3)
+        for book in response.context["books"]:
+            self.assertEqual(book.category_id, self.to_read.pk)
+
+    def test_someones_category(self):
+        self.client.force_login(self.other_user)
+        response = self.client.get(
+            reverse("someones_category", args=[self.user.username, "finished"])
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context["viewed_user"], self.user)
+        self.assertEqual(len(response.context["books"]), settings.LIBRARY_SHELF_PAGE_SIZE)
+
+    def test_unknown_category_is_404(self):
+        response = self.client.get(reverse("your_category", args=["unknown"]))
+        self.assertEqual(response.status_code, 404)
+
+    def test_other_users_category_is_404(self):
+        response = self.client.get(reverse("your_category", args=["someones-only"]))
+        self.assertEqual(response.status_code, 404)
+
+    def test_unknown_user_is_404(self):
+        response = self.client.get(reverse("someones_category", args=["nobody", "to-read"]))
+        self.assertEqual(response.status_code, 404)
+
+    def test_only_requested_category_is_loaded(self):
+        # user, category, its books
+        with self.assertNumQueries(3):
+            self.client.get(reverse("your_category", args=["to-read"]))
+
+    @override_settings(LIBRARY_SHELF_PAGE_SIZE=7)
+    def test_load_more_walks_through_the_whole_shelf(self):
+        url = reverse("your_category", args=["finished"])
+        seen = []
+        cursor = None
+        while True:
+            response = self.client.get(url, {"after": cursor} if cursor else {})
+            books = response.context["books"]
+            self.assertLessEqual(len(books), 7)
+            seen += [book.pk for book in books]
+            if not books.has_next:
+                break
+            cursor = books.next_cursor
+
+        self.assertEqual(sorted(seen), sorted(
+            Book.objects.filter(category=self.finished).values_list("pk", flat=True)
+        ))
+        self.assertEqual(len(seen), len(set(seen)))
+
+    def test_invalid_cursor_is_400(self):
+        response = self.client.get(
+            reverse("your_category", args=["to-read"]), {"after": "garbage"}
+        )
+        self.assertEqual(response.status_code, 400)
+
+
+class NewBookViewTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = add_user("newbookowner")
+        add_categories(cls.user, "to-read", "finished")
+        add_categories(add_user("newbookother"), "not yours")
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def test_only_users_categories_can_be_chosen(self):
+        response = self.client.get(reverse("new_book"), {"category": "to-read"})
+
+        categories = response.context["new_book_form"].fields["category"].queryset
+        self.assertEqual(
+            [category.category_name for category in categories],
+            ["to-read", "finished"],
+        )
@@ -0,0 +1,207 @@
+'''Thumbnails of the uploaded images(Book.cover, User.profile_picture).
+
+Thumbnails are stored next to the original image:
+
+    <directory of the original>/thumbnails/<content hash>_<width>x<height>.<ext>
+
+The content hash(sha256) of the original is computed while it is saved
+and stored next to the file field, in its "<field name>_digest" field
+(see library.signals), so a page render never reads the original.
+The names of the generated thumbnails are kept in the cache under the
+original's name and content hash, a cache miss looks for the thumbnail
+in the storage before it is scheduled. A new original saved under an
+old name gets a new thumbnail. Thumbnails are deleted with their
+original by library.media.delete_files.
+They are generated by a bounded pool of worker threads, so neither
+upload nor page requests wait for the resizing: until the thumbnail is
+ready the original image is shown.
+'''
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.db import connections
+
+from PIL import Image, ImageOps, features
+
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import io
+import logging
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+
+FORMAT_EXTENSIONS = {"JPEG": "jpg", "WEBP": "webp", "PNG": "png"}
+
+_executor = None
+_pending = set()
+_lock = threading.Lock()
+
+
+def get_format():
+    image_format = settings.LIBRARY_THUMBNAIL_FORMAT
+    if image_format == "WEBP" and not features.check("webp"):
+        return "JPEG"
+    return image_format
+
+
+def content_digest(file):
+    '''sha256 of the file, read in chunks'''
+    digest = hashlib.sha256()
+    for chunk in file.chunks():
+        digest.update(chunk)
+
+    return digest.hexdigest()
+
+
+def image_digest(field_file):
+    '''Returns the stored content hash of the image, "" if it is unknown'''
+    return getattr(field_file.instance, f"{field_file.field.name}_digest", None) or ""
+
+
+def update_image_digest(field_file):
+    '''Sets the content hash field of the image that is going to be saved,
+    the stored images keep their hash'''
+    digest_field = f"{field_file.field.name}_digest"
+    if not field_file:
+        setattr(field_file.instance, digest_field, "")
+    elif not field_file._committed:
+        # the file is saved to the storage by the FileField after pre_save
+        setattr(field_file.instance, digest_field, content_digest(field_file))
+
+
+def _cache_key(name, digest, size_name):
+    # the name can have any characters and length
+    key = hashlib.sha256(f"{name}:{digest}".encode()).hexdigest()
+    return f"library:thumbnail:{size_name}:{key}"
+
+
+def thumbnail_name(name, digest, size_name):
+    width, height = settings.LIBRARY_THUMBNAIL_SIZES[size_name]
+    extension = FORMAT_EXTENSIONS[get_format()]
+    directory = os.path.dirname(name)
+
+    return os.path.join(directory, "thumbnails", f"{digest[:32]}_{width}x{height}.{extension}")
+
+
+def _resize(storage, name, size_name):
+    image_format = get_format()
+    with storage.open(name, "rb") as file:
+        image = ImageOps.exif_transpose(Image.open(file))
+        image.thumbnail(settings.LIBRARY_THUMBNAIL_SIZES[size_name])
+        if image_format == "JPEG" and image.mode != "RGB":
+            image = image.convert("RGB")
+
+        output = io.BytesIO()
+        image.save(output, format=image_format)
+
+    return ContentFile(output.getvalue())
+
+
+def generate_thumbnail(storage, name, digest, size_name):
+    '''Generates the thumbnail of the stored image with the content hash
+    if there is no thumbnail for its content yet.
+
+    Returns name of the thumbnail'''
+    thumbnail = thumbnail_name(name, digest, size_name)
+    if not storage.exists(thumbnail):
+        # storage.save can change the name if the file appeared meanwhile
+        thumbnail = storage.save(thumbnail, _resize(storage, name, size_name))
+
+    cache.set(_cache_key(name, digest, size_name), thumbnail, timeout=None)
+    return thumbnail
+
+
+def _generate_in_worker(storage, name, digest, size_name):
+    try:
+        return generate_thumbnail(storage, name, digest, size_name)
+    except Exception:
+        logger.exception("Thumbnail %s of %s was not generated", size_name, name)
+    finally:
+        with _lock:
+            _pending.discard((name, digest, size_name))
+        # the cache can be database backed
+        connections.close_all()
+
+
+def _get_executor():
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.LIBRARY_THUMBNAIL_WORKERS,
+                thread_name_prefix="thumbnails",
+            )
+    return _executor
+
+
+def schedule_thumbnail(field_file, size_name):
+    '''Generates the thumbnail in a worker thread.
+
+    Returns concurrent.futures.Future with the thumbnail name or None if
+    it is already being generated, the content hash of the image is
+    unknown or too many thumbnails are waiting, in this case it will be
+    scheduled again when it is requested'''
+    digest = image_digest(field_file)
+    if not digest:
+        return None
+
+    key = (field_file.name, digest, size_name)
+    with _lock:
+        if key in _pending or len(_pending) >= settings.LIBRARY_THUMBNAIL_QUEUE_SIZE:
+            return None
+        _pending.add(key)
+
+    try:
+        return _get_executor().submit(_generate_in_worker, field_file.storage, *key)
+    except RuntimeError:
+        # executor is shut down, the interpreter is exiting
+        with _lock:
+            _pending.discard(key)
+        return None
+
+
+def get_cached_thumbnail(field_file, size_name):
+    '''Returns name of the generated thumbnail or None'''
+    return cache.get(_cache_key(field_file.name, image_digest(field_file), size_name))
+
+
+def find_thumbnail(field_file, size_name):
+    '''Returns name of the thumbnail generated before(and caches it)
+    or None, the original is not read'''
+    digest = image_digest(field_file)
+    if not digest:
+        return None
+
+    thumbnail = thumbnail_name(field_file.name, digest, size_name)
+    if not field_file.storage.exists(thumbnail):
+        return None
+
+    cache.set(_cache_key(field_file.name, digest, size_name), thumbnail, timeout=None)
+    return thumbnail
+
+
+def delete_thumbnails(field_file):
+    '''Deletes the thumbnails of the image in all the sizes'''
+    digest = image_digest(field_file)
+    if not digest:
+        return
+
+    for size_name in settings.LIBRARY_THUMBNAIL_SIZES:
+        cache.delete(_cache_key(field_file.name, digest, size_name))
+        field_file.storage.delete(thumbnail_name(field_file.name, digest, size_name))
+
+
+def get_thumbnail_url(field_file, size_name):
+    '''Returns url of the thumbnail of the image.
+    If it is not generated yet, schedules it and returns url of the original'''
+    if not field_file:
+        return ""
+
+    thumbnail = get_cached_thumbnail(field_file, size_name) or find_thumbnail(field_file, size_name)
+    if thumbnail is None:
+        schedule_thumbnail(field_file, size_name)
+        return field_file.url
+
+    return field_file.storage.url(thumbnail)
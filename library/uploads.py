@@ -0,0 +1,191 @@
+'''Resumable uploads of the book files in chunks.
+
+    POST book/<title> by <author>/upload/  filename, size
+        starts the upload, returns its id
+    GET uploads/<id>/
+        returns the offset to continue from, e.g. after lost connection
+    PUT uploads/<id>/  the chunk in the body, headers:
+        Upload-Offset: <offset of the chunk>
+        Upload-Checksum: sha256 <base64 of sha256 of the chunk>
+    POST uploads/<id>/finish/
+        attaches the uploaded file to the book
+    DELETE uploads/<id>/
+        cancels the upload
+
+Chunks are appended to a staging file in LIBRARY_UPLOAD_STAGING_DIR.
+Every chunk is verified by its checksum while it's written to a file of
+its own, then the offset is moved by an UPDATE that checks it's still
+where the chunk starts and only the chunk that moved it is copied to the
+staging file, in the same transaction. So of the concurrent chunks at
+the same offset one is appended and the others get 409, and a broken
+chunk is just sent again.
+'''
+from django.conf import settings
+from django.core.files import File
+from django.db import connection, transaction
+from django.utils import timezone
+
+from library.models import BookUpload
+
+import base64
+import binascii
+import hashlib
+import os
+import shutil
+import uuid
+
+READ_SIZE = 64 * 2**10
+
+
+class UploadError(Exception):
+    status = 400
+
+
+class OffsetMismatch(UploadError):
+    '''The chunk doesn't start where the previous one ended'''
+    status = 409
+
+
+class ChecksumMismatch(UploadError):
+    pass
+
+
+def staging_path(upload):
+    return os.path.join(settings.LIBRARY_UPLOAD_STAGING_DIR, f"{upload.pk}.part")
+
+
+def parse_checksum(header):
+    '''Returns sha256 digest from "sha256 <base64 digest>"'''
+    try:
+        algorithm, encoded = header.split()
+        digest = base64.b64decode(encoded, validate=True)
+    except (ValueError, binascii.Error):
+        raise UploadError("Upload-Checksum must be 'sha256 <base64 digest>'")
+
+    if algorithm.lower() != "sha256":
+        raise UploadError("Only sha256 checksums are supported")
+
+    return digest
+
+
+def start_upload(book, filename, size):
+    if size < 0 or size > settings.LIBRARY_UPLOAD_MAX_SIZE:
+        raise UploadError(f"The file must be at most {settings.LIBRARY_UPLOAD_MAX_SIZE} bytes")
+
+    filename = os.path.basename(filename)
+    if not filename:
+        raise UploadError("The file name is empty")
+
+    upload = BookUpload.objects.create(book=book, filename=filename, size=size)
+    os.makedirs(settings.LIBRARY_UPLOAD_STAGING_DIR, exist_ok=True)
+    open(staging_path(upload), "wb").close()
+
+    return upload
+
+
+def _lock(upload):
+    '''Returns the upload locked for the transaction on databases with
+    row locking. On SQLite it's only read, nothing stops another request
+    from changing it before the commit'''
+    uploads = BookUpload.objects.select_related("book")
+    if connection.features.has_select_for_update:
+        uploads = uploads.select_for_update(of=("self",))
+
+    return uploads.get(pk=upload.pk)
+
+
+def _write_chunk(file, stream, length, expected_digest):
+    digest = hashlib.sha256()
+    left = length
+    while left > 0:
+        data = stream.read(min(READ_SIZE, left))
+        if not data:
+            raise UploadError("The chunk is shorter than its Content-Length")
+        digest.update(data)
+        file.write(data)
+        left -= len(data)
+
+    if digest.digest() != expected_digest:
+        raise ChecksumMismatch("The chunk doesn't match its checksum")
+
+
+def _chunk_path(upload):
+    # next to the staging file, so collect_media deletes it with the upload
+    return f"{staging_path(upload)[:-len('.part')]}.{uuid.uuid4().hex}.chunk"
+
+
+def append_chunk(upload, offset, stream, length, checksum):
+    '''Appends length bytes read from stream at offset.
+
+    Returns the upload with the new offset.
+    raises UploadError(or subclass) if the chunk is not appended,
+    the offset to continue from is upload.offset then'''
+    expected_digest = parse_checksum(checksum)
+
+    upload = BookUpload.objects.get(pk=upload.pk)
+    if offset != upload.offset:
+        raise OffsetMismatch(f"The next chunk must start at {upload.offset}")
+    if upload.offset + length > upload.size:
+        raise UploadError("The chunk goes past the end of the file")
+
+    chunk_path = _chunk_path(upload)
+    try:
+        with open(chunk_path, "wb") as chunk:
+            _write_chunk(chunk, stream, length, expected_digest)
+
+        with transaction.atomic():
+            # the first query of the transaction is the write, so on SQLite
+            # it waits for the concurrent chunk's commit and sees its offset
+            moved = (
+                BookUpload.objects
+                .filter(pk=upload.pk, offset=offset)
+                .update(offset=offset + length, updated=timezone.now())
+            )
+            if not moved:
+                upload.refresh_from_db(fields=["offset"])
+                raise OffsetMismatch(f"The next chunk must start at {upload.offset}")
+
+            with open(chunk_path, "rb") as chunk, open(staging_path(upload), "r+b") as file:
+                # the bytes after the offset are left by the failed chunks
+                file.seek(offset)
+                shutil.copyfileobj(chunk, file, READ_SIZE)
+                file.truncate()
+                file.flush()
+                os.fsync(file.fileno())
+    finally:
+        os.remove(chunk_path)
+
+    upload.refresh_from_db(fields=["offset", "updated"])
+    return upload
+
+
+def finish_upload(upload):
+    '''Attaches the uploaded file to the book and deletes the upload.
+
+    Returns the book'''
+    with transaction.atomic():
+        upload = _lock(upload)
+        if upload.offset != upload.size:
+            raise UploadError(f"Only {upload.offset} of {upload.size} bytes are uploaded")
+
+        book = upload.book
+        old_file = book.file.name
+        path = staging_path(upload)
+        with open(path, "rb") as file:
+            book.file.save(upload.filename, File(file), save=True)
+        upload.delete()
+
+        transaction.on_commit(lambda: os.remove(path))
+        if old_file and old_file != book.file.name:
+            transaction.on_commit(lambda: book.file.storage.delete(old_file))
+
+    return book
+
+
+def delete_upload(upload):
+    path = staging_path(upload)
+    upload.delete()
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
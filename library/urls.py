@@ -7,13 +7,32 @@ urlpatterns = [
 
     path("new_book/", views.new_book, name="new_book"),
     path("new_category/", views.new_category, name="new_category"),
+    path("import/", views.import_books, name="import_books"),
+    path("export/", views.export_library, name="export_library"),
     path("categories_order/", views.categories_order, name="categories_order"),
     path("book/<str:book_title> by <str:author>/", views.book, name="your_book"),
+    path("book/<str:book_title> by <str:author>/download/", views.download_book, name="your_book_download"),
+    path("book/<str:book_title> by <str:author>/upload/", views.start_book_upload, name="start_book_upload"),
+    path("uploads/<uuid:upload_id>/", views.book_upload, name="book_upload"),
+    path("uploads/<uuid:upload_id>/finish/", views.finish_book_upload, name="finish_book_upload"),
+
+    path("feed/", views.following_feed, name="following_feed"),
+    path("groups/", views.groups_list, name="groups_list"),
+    path("groups/<str:group_name>/", views.group, name="group"),
+    path("search/", views.search_books, name="your_search"),
+    path("stats/", views.reading_stats, name="your_stats"),
 
     path("users/", views.users_list, name="users_list"),
     path("users/<str:username>/", views.all_books, name="someones_all_books"),
+    path("users/<str:username>/search/", views.search_books, name="someones_search"),
+    path("users/<str:username>/stats/", views.reading_stats, name="someones_stats"),
     path("users/<str:username>/<str:category>/", views.category, name="someones_category"),
     path("users/<str:username>/book/<str:book_title> by <str:author>/", views.book, name="someones_book"),
+    path(
+        "users/<str:username>/book/<str:book_title> by <str:author>/download/",
+        views.download_book,
+        name="someones_book_download",
+    ),
 
     path("<str:category>/", views.category, name="your_category"),
 ]
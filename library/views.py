@@ -1,40 +1,67 @@
 from django.shortcuts import render, redirect, get_object_or_404
+from django.urls import reverse
 from django.contrib.auth.decorators import login_required
-from django.http import Http404
-
-from library.models import BookCategory, Book
-from library.forms import NewBookForm, NewCategoryForm
-
-from users.models import User
+from django.core.exceptions import BadRequest, ValidationError, PermissionDenied
+from django.http import Http404, HttpResponse, JsonResponse
+from django.views.decorators.http import require_POST, require_http_methods
+from django.views.static import serve
+from django.conf import settings
+
+from library.models import BookCategory, Book, BookUpload
+from library.forms import ImportBooksForm, NewBookForm, NewCategoryForm
+from library.caching import get_or_compute_shelves
+from library.pagination import ShelfPage, first_pages_by_category, paginate_shelf
+from library.downloads import file_response
+from library.directory import get_directory_page
+from library.feed import get_feed_page
+from library import exports, groups, imports, search, stats
+from library import uploads
+
+from users.models import User, UserFollowing
 
 from collections import OrderedDict
+import posixpath
 
 
 def _sort_user_books_by_categories(user):
-    books = user.books.all()
-    books_by_categories = OrderedDict()
+    '''Returns OrderedDict {category_name: ShelfPage} with all the user's
+    categories ordered by position. Every ShelfPage holds only the first
+    page of the category's books.
 
-    # make all the possible for this user categories empty lists
-    # so when there is no books in some category(ies) you can still access this
-    # category dict key in category() view
-    category_objs = BookCategory.objects.filter(user=user).order_by("position")
-    for category in [category_obj.category_name for category_obj in category_objs]:
-        books_by_categories[category] = []
+    Categories without books are present too(with empty pages),
+    so you can still access this category dict key in category() view.
 
-    for book in books:
-        category_obj = book.category
-        books_by_categories[category_obj.category_name] += [book]
+    Takes 2 queries whatever the library size: one for the categories and
+    one for the first pages of all of their books, which reads only the
+    first pages from the shelf index'''
+    category_objs = list(BookCategory.objects.filter(user=user).order_by("position"))
+    # user is selected because Book.__str__ uses it
+    books = Book.objects.select_related("user", "category")
+    pages = first_pages_by_category(books, [category_obj.pk for category_obj in category_objs])
+
+    books_by_categories = OrderedDict()
+    for category_obj in category_objs:
+        page = pages.get(category_obj.pk, ShelfPage())
+        page.total = category_obj.books_count
+        books_by_categories[category_obj.category_name] = page
 
     return books_by_categories
 
 
-def _get_books_by_categories_and_viewed_user(request, username):
+def _get_viewed_user(request, username):
+    '''Returns (user whose library is viewed, viewed_user for the context)'''
     if username is None:
-        books_by_categories = _sort_user_books_by_categories(request.user)
-        viewed_user = None
-    else:
-        viewed_user = get_object_or_404(User, username=username)
-        books_by_categories = _sort_user_books_by_categories(viewed_user)
+        return request.user, None
+
+    viewed_user = get_object_or_404(User, username=username)
+    return viewed_user, viewed_user
+
+
+def _get_books_by_categories_and_viewed_user(request, username):
+    owner, viewed_user = _get_viewed_user(request, username)
+    books_by_categories = get_or_compute_shelves(
+        owner.pk, "all_books", lambda: _sort_user_books_by_categories(owner)
+    )
 
     return books_by_categories, viewed_user
 
@@ -55,11 +82,20 @@ def all_books(request, username=None):
 
 @login_required
 def category(request, category, username=None):
-    books_by_categories, viewed_user = _get_books_by_categories_and_viewed_user(request, username)
-    try:
-        books = books_by_categories[category]
-    except KeyError:
-        raise Http404
+    owner, viewed_user = _get_viewed_user(request, username)
+    cursor = request.GET.get("after")
+
+    def load_category_page():
+        category_obj = get_object_or_404(BookCategory, user=owner, category_name=category)
+        page = paginate_shelf(category_obj.book_set.select_related("user"), cursor=cursor)
+        page.total = category_obj.books_count
+        return page
+
+    if cursor:
+        # only the first pages are cached, the cursors are chosen by the client
+        books = load_category_page()
+    else:
+        books = get_or_compute_shelves(owner.pk, f"category:{category}", load_category_page)
 
     context = {
         "user": request.user,
@@ -72,29 +108,58 @@ def category(request, category, username=None):
     return render(request, "category.html", context=context)
 
 
-# TODO redirect
-@login_required
-def categories_order(request):
-    if request.method == "POST":
-        positions = {}
-        book_categoires = request.user.book_categories.all()
+def _get_categories_positions(user, post_data):
+    '''Returns {BookCategory: position} from categories_order form data
+    with one query for all the user's categories
 
-        for key, value in request.POST.items():
-            if key.startswith("bookcategory_select_"):
-                book_category = book_categoires.get(category_name=value)
-                position = int(key.split("bookcategory_select_")[1])
-                positions[book_category] = position
+    raises django.core.exceptions.ValidationError if form data is invalid'''
+    categories_by_name = {
+        category.category_name: category for category in user.book_categories.all()
+    }
+
+    positions = {}
+    for key, value in post_data.items():
+        if not key.startswith("bookcategory_select_"):
+            continue
 
-        BookCategory.set_positions(positions)
+        try:
+            book_category = categories_by_name[value]
+            position = int(key.split("bookcategory_select_")[1])
+        except (KeyError, ValueError):
+            raise ValidationError(f"Invalid category '{value}'")
 
-        return redirect("your_all_books")
+        if book_category in positions:
+            raise ValidationError(f"Category '{value}' is selected twice")
+        positions[book_category] = position
 
-    if request.method == "GET":
-        categories = _sort_user_books_by_categories(user=request.user).keys()
+    return positions
+
+
+@login_required
+def categories_order(request):
+    errors = []
+    if request.method == "POST":
+        try:
+            BookCategory.set_positions(_get_categories_positions(request.user, request.POST))
+        except ValidationError as error:
+            errors = error.messages
+        else:
+            return redirect("your_all_books")
+
+    categories = get_or_compute_shelves(
+        request.user.pk,
+        "categories",
+        lambda: list(
+            request.user.book_categories
+            .order_by("position")
+            .values_list("category_name", flat=True)
+        ),
+    )
 
     context = {
         "user": request.user,
         "categories": categories,
+        "errors": errors,
     }
 
     return render(request, "categories_order.html", context=context)
@@ -102,12 +167,11 @@ def categories_order(request):
 
 @login_required
 def book(request, book_title, author, username=None):
-    if username is None:
-        book = get_object_or_404(Book, user=request.user, title=book_title, author=author)
-        viewed_user = None
-    else:
-        viewed_user = get_object_or_404(User, username=username)
-        book = get_object_or_404(Book, user=viewed_user, title=book_title, author=author)
+    owner, viewed_user = _get_viewed_user(request, username)
+    book = get_object_or_404(
+        Book.objects.select_related("user", "category"),
+        user=owner, title=book_title, author=author,
+    )
 
     context = {
         "user": request.user,
@@ -119,12 +183,43 @@ def book(request, book_title, author, username=None):
     return render(request, "book.html", context=context)
 
 
+def _can_download_files(user, owner):
+    '''Book files are available to their owner and the owner's followers'''
+    return user == owner or UserFollowing.objects.filter(
+        who_follows=user, whom_follows=owner,
+    ).exists()
+
+
+@login_required
+def download_book(request, book_title, author, username=None):
+    owner, _ = _get_viewed_user(request, username)
+    book = get_object_or_404(Book, user=owner, title=book_title, author=author)
+    if not book.file:
+        raise Http404("The book has no file")
+
+    if not _can_download_files(request.user, owner):
+        raise PermissionDenied
+
+    return file_response(request, book.file)
+
+
+def serve_media(request, path):
+    '''Serves MEDIA_ROOT in development, except for the book files'''
+    # the same normalization as serve() does, so "books//..." or "./books/..."
+    # is checked as the name of the file it is going to serve
+    name = posixpath.normpath(path).lstrip("/")
+    if name == "blobs" or name.startswith("blobs/") or Book.objects.filter(file=name).exists():
+        raise Http404("Book files are downloaded by download_book")
+
+    return serve(request, name, document_root=settings.MEDIA_ROOT)
+
+
 # TODO if form is NOT valid
 # TODO redirect back
 @login_required
 def new_book(request):
     if request.method == "POST":
-        new_book_form = NewBookForm(request.POST)
+        new_book_form = NewBookForm(request.POST, request.FILES, user=request.user)
         if new_book_form.is_valid():
             new_book_obj = new_book_form.save(commit=False)
 
@@ -160,7 +255,7 @@ def new_book(request):
         except KeyError:
             pass
 
-        new_book_form = NewBookForm(initial=initial)
+        new_book_form = NewBookForm(initial=initial, user=request.user)
 
     context = {
         "new_book_form": new_book_form,
@@ -170,6 +265,94 @@ def new_book(request):
     return render(request, "new_book.html", context=context)
 
 
+def _upload_response(upload, status=200):
+    response = JsonResponse({
+        "id": upload.pk,
+        "offset": upload.offset,
+        "size": upload.size,
+        "chunk_size": settings.LIBRARY_UPLOAD_CHUNK_SIZE,
+    }, status=status)
+    response["Upload-Offset"] = upload.offset
+
+    return response
+
+
+def _upload_error_response(error, upload=None):
+    response = JsonResponse({"error": str(error)}, status=error.status)
+    if upload is not None:
+        # the client continues from here
+        response["Upload-Offset"] = upload.offset
+
+    return response
+
+
+@login_required
+@require_POST
+def start_book_upload(request, book_title, author):
+    book = get_object_or_404(Book, user=request.user, title=book_title, author=author)
+    try:
+        filename = request.POST["filename"]
+        size = int(request.POST["size"])
+    except (KeyError, ValueError):
+        return JsonResponse({"error": "filename and size are required"}, status=400)
+
+    try:
+        upload = uploads.start_upload(book, filename, size)
+    except uploads.UploadError as error:
+        return _upload_error_response(error)
+
+    return _upload_response(upload, status=201)
+
+
+@login_required
+@require_http_methods(["GET", "HEAD", "PUT", "DELETE"])
+def book_upload(request, upload_id):
+    upload = get_object_or_404(BookUpload, pk=upload_id, book__user=request.user)
+
+    if request.method == "DELETE":
+        uploads.delete_upload(upload)
+        return HttpResponse(status=204)
+
+    if request.method == "PUT":
+        try:
+            offset = int(request.headers["Upload-Offset"])
+            length = int(request.headers["Content-Length"])
+        except (KeyError, ValueError):
+            return JsonResponse(
+                {"error": "Upload-Offset and Content-Length are required"}, status=400,
+            )
+        if length > settings.LIBRARY_UPLOAD_CHUNK_SIZE:
+            return JsonResponse(
+                {"error": f"The chunk must be at most {settings.LIBRARY_UPLOAD_CHUNK_SIZE} bytes"},
+                status=413,
+            )
+
+        try:
+            # the chunk is read from the request stream, not loaded in memory
+            upload = uploads.append_chunk(
+                upload, offset, request, length, request.headers.get("Upload-Checksum", ""),
+            )
+        except uploads.UploadError as error:
+            upload.refresh_from_db()
+            return _upload_error_response(error, upload)
+
+    return _upload_response(upload)
+
+
+@login_required
+@require_POST
+def finish_book_upload(request, upload_id):
+    upload = get_object_or_404(BookUpload, pk=upload_id, book__user=request.user)
+    try:
+        book = uploads.finish_upload(upload)
+    except uploads.UploadError as error:
+        return _upload_error_response(error, upload)
+
+    return JsonResponse({
+        "download": reverse("your_book_download", args=[book.title, book.author]),
+    })
+
+
 # TODO if form is NOT valid
 # TODO redirect back
 @login_required
@@ -196,5 +379,132 @@ def new_category(request):
     return render(request, "new_category.html", context=context)
 
 
+@login_required
+def import_books(request):
+    result = None
+    if request.method == "POST":
+        import_form = ImportBooksForm(request.POST, request.FILES)
+        if import_form.is_valid():
+            uploaded = import_form.cleaned_data["file"]
+            file_format = imports.format_of(uploaded.name)
+            if file_format is None:
+                import_form.add_error("file", f"Expected a {', '.join(imports.FORMATS)} file")
+            else:
+                stream = imports.text_stream(uploaded.file)
+                try:
+                    result = imports.import_books(stream, request.user, file_format)
+                except imports.ImportFormatError as error:
+                    import_form.add_error("file", str(error))
+                    # the rows before the broken part are imported
+                    result = error.result
+                finally:
+                    # the uploaded file is closed by Django
+                    stream.detach()
+    else:
+        import_form = ImportBooksForm()
+
+    context = {
+        "user": request.user,
+
+        "import_form": import_form,
+        "errors": import_form.errors,
+        "result": result,
+    }
+
+    return render(request, "import_books.html", context=context)
+
+
+@login_required
+def export_library(request):
+    file_format = request.GET.get("format", exports.CSV)
+    if file_format not in exports.FORMATS:
+        raise BadRequest(f"Unknown export format {file_format!r}")
+
+    return exports.export_response(request.user, file_format)
+
+
 def users_list(request):
-    return render(request, "users_list.html")
+    query = request.GET.get("q", "").strip()
+    users = get_directory_page(prefix=query, after=request.GET.get("after"))
+
+    context = {
+        "query": query,
+        "users": users,
+    }
+
+    return render(request, "users_list.html", context=context)
+
+
+@login_required
+def following_feed(request):
+    context = {
+        "user": request.user,
+
+        "activities": get_feed_page(request.user, cursor=request.GET.get("after")),
+    }
+
+    return render(request, "feed.html", context=context)
+
+
+@login_required
+def groups_list(request):
+    context = {
+        "user": request.user,
+
+        "groups": request.user.library_groups.order_by("name"),
+    }
+
+    return render(request, "groups.html", context=context)
+
+
+@login_required
+def group(request, group_name):
+    group = groups.get_group_for_member(group_name, request.user)
+
+    context = {
+        "user": request.user,
+
+        "group": group,
+        "books": groups.paginate_group_shelf(group, cursor=request.GET.get("after")),
+        "stats": groups.get_group_stats(group),
+    }
+
+    return render(request, "group.html", context=context)
+
+
+@login_required
+def reading_stats(request, username=None):
+    owner, viewed_user = _get_viewed_user(request, username)
+    reading_stats = stats.get_reading_stats(owner)
+    if request.GET.get("format") == "json":
+        return JsonResponse(reading_stats)
+
+    context = {
+        "user": request.user,
+
+        "viewed_user": viewed_user,
+        "stats": reading_stats,
+    }
+
+    return render(request, "stats.html", context=context)
+
+
+@login_required
+def search_books(request, username=None):
+    owner, viewed_user = _get_viewed_user(request, username)
+    query = request.GET.get("q", "").strip()
+    # someone's library is only searched by itself
+    scope = search.OWN if username is not None else request.GET.get("scope", search.OWN)
+    if scope not in (search.OWN, search.FOLLOWING):
+        raise BadRequest(f"Unknown search scope {scope!r}")
+
+    context = {
+        "user": request.user,
+
+        "viewed_user": viewed_user,
+        "query": query,
+        "scope": scope,
+        "books": search.search_books(query, owner, scope) if query else [],
+    }
+
+    return render(request, "search.html", context=context)
@@ -0,0 +1,130 @@
+from django.conf import settings
+from django.db import connections
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+
+from contextlib import ExitStack
+from contextvars import ContextVar
+import json
+import logging
+import time
+
+logger = logging.getLogger("my_lib.query_stats")
+
+
+class QueryStats():
+    '''Database execute wrapper that counts queries and their time.
+
+    Use it with connection.execute_wrapper(). If keep_queries is True
+    sql of all the queries is kept in "queries", otherwise only the slowest
+    one is kept'''
+    def __init__(self, keep_queries=False):
+        self.count = 0
+        self.total_time = 0.0
+        self.slowest_time = 0.0
+        self.slowest_sql = None
+        self.queries = [] if keep_queries else None
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - start
+            self.count += 1
+            self.total_time += duration
+            if duration >= self.slowest_time:
+                self.slowest_time = duration
+                self.slowest_sql = sql
+            if self.queries is not None:
+                self.queries.append(sql)
+
+    def track(self):
+        '''Returns context manager that collects stats of all the connections'''
+        stack = ExitStack()
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(self))
+        return stack
+
+    def as_dict(self):
+        return {
+            "queries": self.count,
+            "db_time_ms": round(self.total_time * 1000, 3),
+            "slowest_query_ms": round(self.slowest_time * 1000, 3),
+            "slowest_query": self.slowest_sql,
+        }
+
+
+# QueryStats of the async request being handled, see QueryStatsMiddleware.__acall__
+_async_request_stats = ContextVar("async_request_stats", default=None)
+
+
+def _track_async_request(execute, sql, params, many, context):
+    stats = _async_request_stats.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    return stats(execute, sql, params, many, context)
+
+
+def _install_async_request_wrapper():
+    '''Installs _track_async_request on the connections of this thread,
+    once, it stays installed'''
+    for connection in connections.all():
+        if _track_async_request not in connection.execute_wrappers:
+            connection.execute_wrappers.append(_track_async_request)
+
+
+class QueryStatsMiddleware():
+    '''Measures SQL queries made while handling each request.
+
+    In DEBUG they are returned in X-DB-* response headers, otherwise they are
+    logged to "my_lib.query_stats" logger as one JSON line per request.
+    Put it first in MIDDLEWARE to count queries of the other middleware too'''
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        stats = QueryStats()
+        with stats.track():
+            response = self.get_response(request)
+
+        return self._add_stats(request, response, stats)
+
+    async def __acall__(self, request):
+        # the async views make their queries with sync_to_async, so all the
+        # concurrent requests share the connections of its thread. One
+        # wrapper stays installed on them and counts the queries to the
+        # stats of the request in the context, which sync_to_async copies
+        # to the thread
+        stats = QueryStats()
+        await sync_to_async(_install_async_request_wrapper)()
+        token = _async_request_stats.set(stats)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _async_request_stats.reset(token)
+
+        return self._add_stats(request, response, stats)
+
+    def _add_stats(self, request, response, stats):
+        if settings.DEBUG:
+            response["X-DB-Query-Count"] = str(stats.count)
+            response["X-DB-Time-Ms"] = f"{stats.total_time * 1000:.3f}"
+            response["X-DB-Slowest-Query-Ms"] = f"{stats.slowest_time * 1000:.3f}"
+        else:
+            logger.info(json.dumps({
+                "method": request.method,
+                "path": request.path,
+                "status": response.status_code,
+                **stats.as_dict(),
+            }))
+
+        return response
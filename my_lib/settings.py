@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.2/ref/settings/
 """
 import os
+import sys
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -43,6 +44,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # first, so it counts queries of the other middleware too
+    'my_lib.middleware.QueryStatsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -80,6 +83,14 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'TEST': {
+            # on-disk test database, so that concurrency tests can write
+            # to it from several connections(in-memory SQLite database
+            # fails instead of waiting for the lock). It is named by the
+            # process, so test runs don't overwrite each other's database
+            # or ask to delete it
+            'NAME': BASE_DIR / f'test_db_{os.getpid()}.sqlite3',
+        },
     }
 }
 
@@ -103,6 +114,46 @@ AUTH_PASSWORD_VALIDATORS = [
 ]
 
 
+# Cache
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+
+# sessions are read from the cache, so requests don't query the session table
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+
+
+# Logging
+# https://docs.djangoproject.com/en/4.2/topics/logging/
+
+TESTING = len(sys.argv) > 1 and sys.argv[1] == "test"
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        # one JSON line with SQL stats per request when DEBUG is False,
+        # see my_lib.middleware.QueryStatsMiddleware
+        'my_lib.query_stats': {
+            'handlers': ['console'],
+            # every request of the tests would be logged otherwise
+            'level': 'WARNING' if TESTING else 'INFO',
+            'propagate': False,
+        },
+    },
+}
+
+
 # Internationalization
 # https://docs.djangoproject.com/en/4.2/topics/i18n/
 
@@ -118,6 +169,21 @@ USE_TZ = False
 MEDIA_ROOT = os.path.join(BASE_DIR, 'uploaded_files')
 MEDIA_URL = "uploaded_files/"
 
+# https://docs.djangoproject.com/en/4.2/ref/settings/#storages
+
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage',
+    },
+    # Book.file, stores the same content once, see library.storage
+    'books': {
+        'BACKEND': 'library.storage.ContentAddressedStorage',
+    },
+}
+
 # Static files (CSS, JavaScript, Images)
 # https://docs.djangoproject.com/en/4.2/howto/static-files/
 
@@ -132,3 +198,68 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 AUTH_USER_MODEL = "users.User"
 
 LOGIN_URL = "/login/"
+
+# number of books shown on one page of a shelf
+LIBRARY_SHELF_PAGE_SIZE = 20
+# number of users shown on one page of the users directory
+LIBRARY_DIRECTORY_PAGE_SIZE = 50
+# number of activities shown on one page of the following feed
+LIBRARY_FEED_PAGE_SIZE = 30
+# seconds for which the activities are shown in the following feed
+LIBRARY_FEED_MAX_AGE = 30 * 24 * 60 * 60
+
+# seconds for which the aggregates of the library groups are cached,
+# they are not invalidated on changes
+LIBRARY_GROUP_STATS_CACHE_TIMEOUT = 10 * 60
+
+# max number of the results of the full-text search, see library.search
+LIBRARY_SEARCH_RESULTS = 50
+# max number of the newest matches that are ranked, see library.search
+LIBRARY_SEARCH_CANDIDATES = 1000
+
+# rows of the imported file written by one bulk_create, see library.imports
+LIBRARY_IMPORT_BATCH_SIZE = 1000
+# max number of the invalid rows reported by one import, the rest are only counted
+LIBRARY_IMPORT_MAX_ERRORS = 100
+# books read by one query of the streaming export, see library.exports
+LIBRARY_EXPORT_CHUNK_SIZE = 2000
+
+# seconds for which shelves are cached.
+# Cached shelves are invalidated on any change in the library anyway
+LIBRARY_SHELF_CACHE_TIMEOUT = 60 * 60
+
+# thumbnails of the uploaded images, see library.thumbnails
+# {size name: (max width, max height)}
+LIBRARY_THUMBNAIL_SIZES = {
+    "cover": (160, 240),
+    "avatar": (96, 96),
+}
+# "JPEG", "PNG" or "WEBP"(falls back to JPEG if Pillow has no WebP support)
+LIBRARY_THUMBNAIL_FORMAT = "JPEG"
+# threads that generate thumbnails
+LIBRARY_THUMBNAIL_WORKERS = 2
+# thumbnails waiting for a worker, the rest are scheduled when requested again
+LIBRARY_THUMBNAIL_QUEUE_SIZE = 100
+
+# downloads of the book files, see library.downloads
+# bytes read from the file at once
+LIBRARY_DOWNLOAD_CHUNK_SIZE = 64 * 2**10
+# None to stream the files by django,
+# "X-Sendfile" or "X-Accel-Redirect" to let the web server send them
+LIBRARY_DOWNLOAD_SENDFILE = None
+# internal nginx location of MEDIA_ROOT for "X-Accel-Redirect"
+LIBRARY_DOWNLOAD_ACCEL_PREFIX = "/protected/"
+
+# resumable uploads of the book files, see library.uploads
+# directory of the files being uploaded
+LIBRARY_UPLOAD_STAGING_DIR = os.path.join(BASE_DIR, "upload_staging")
+# max bytes in one chunk
+LIBRARY_UPLOAD_CHUNK_SIZE = 8 * 2**20
+# max size of an uploaded book file
+LIBRARY_UPLOAD_MAX_SIZE = 2 * 2**30
+# seconds after which the not continued uploads are deleted by collect_media
+LIBRARY_UPLOAD_EXPIRATION = 7 * 24 * 60 * 60
+
+# collect_media command deletes unreferenced files older than this(seconds),
+# so the files of not yet committed transactions are kept
+LIBRARY_MEDIA_GC_MIN_AGE = 24 * 60 * 60
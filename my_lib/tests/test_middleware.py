@@ -0,0 +1,125 @@
+from django.db import connection
+from django.http import HttpResponse
+from django.test import AsyncRequestFactory, RequestFactory, TestCase, override_settings
+from django.urls import reverse
+
+from my_lib.middleware import QueryStats, QueryStatsMiddleware
+from users.models import User
+from library.models import BookCategory
+
+import asyncio
+import json
+
+
+def view_with_queries(num):
+    def view(request):
+        for _ in range(num):
+            User.objects.exists()
+        return HttpResponse()
+
+    return view
+
+
+class QueryStatsTest(TestCase):
+    def test_counts_queries(self):
+        stats = QueryStats()
+        with stats.track():
+            view_with_queries(3)(None)
+
+        self.assertEqual(stats.count, 3)
+        self.assertGreater(stats.total_time, 0)
+        self.assertGreaterEqual(stats.total_time, stats.slowest_time)
+        self.assertIn("users_user", stats.slowest_sql)
+        self.assertIsNone(stats.queries)
+
+    def test_keeps_queries(self):
+        stats = QueryStats(keep_queries=True)
+        with stats.track():
+            view_with_queries(2)(None)
+
+        self.assertEqual(len(stats.queries), 2)
+
+    def test_stops_tracking_after_the_block(self):
+        stats = QueryStats()
+        with stats.track():
+            pass
+        User.objects.exists()
+
+        self.assertEqual(stats.count, 0)
+        self.assertNotIn(stats, connection.execute_wrappers)
+
+
+class QueryStatsMiddlewareTest(TestCase):
+    def get(self, num_queries):
+        middleware = QueryStatsMiddleware(view_with_queries(num_queries))
+        return middleware(RequestFactory().get("/some/path/"))
+
+    @override_settings(DEBUG=True)
+    def test_headers_in_debug(self):
+        response = self.get(4)
+
+        self.assertEqual(response["X-DB-Query-Count"], "4")
+        self.assertGreater(float(response["X-DB-Time-Ms"]), 0)
+        self.assertIn("X-DB-Slowest-Query-Ms", response)
+
+    @override_settings(DEBUG=False)
+    def test_log_line_without_debug(self):
+        with self.assertLogs("my_lib.query_stats", level="INFO") as logs:
+            response = self.get(2)
+
+        self.assertNotIn("X-DB-Query-Count", response)
+        self.assertEqual(len(logs.records), 1)
+        line = json.loads(logs.records[0].getMessage())
+        self.assertEqual(line["path"], "/some/path/")
+        self.assertEqual(line["method"], "GET")
+        self.assertEqual(line["status"], 200)
+        self.assertEqual(line["queries"], 2)
+        self.assertIn("users_user", line["slowest_query"])
+
+
+class AsyncQueryStatsMiddlewareTest(TestCase):
+    @override_settings(DEBUG=True)
+    async def test_counts_queries_of_async_view(self):
+        async def view(request):
+            for _ in range(3):
+                await User.objects.aexists()
+            return HttpResponse()
+
+        middleware = QueryStatsMiddleware(view)
+        response = await middleware(AsyncRequestFactory().get("/some/path/"))
+
+        self.assertEqual(response["X-DB-Query-Count"], "3")
+
+    @override_settings(DEBUG=True)
+    async def test_concurrent_requests_count_own_queries(self):
+        def async_view_with_queries(num):
+            async def view(request):
+                for _ in range(num):
+                    await User.objects.aexists()
+                    # let the other requests make their queries meanwhile
+                    await asyncio.sleep(0)
+                return HttpResponse()
+
+            return view
+
+        responses = await asyncio.gather(*(
+            QueryStatsMiddleware(async_view_with_queries(num))(AsyncRequestFactory().get("/some/path/"))
+            for num in [3, 1, 5]
+        ))
+
+        self.assertEqual([response["X-DB-Query-Count"] for response in responses], ["3", "1", "5"])
+
+
+class QueryStatsMiddlewareInstalledTest(TestCase):
+    @override_settings(DEBUG=True)
+    def test_counts_queries_of_whole_request(self):
+        user = User.objects.create_user(
+            username="headers", email="headers@gmail.com", password="password1",
+        )
+        BookCategory.objects.create(user=user, category_name="reading")
+        self.client.force_login(user)
+
+        response = self.client.get(reverse("your_all_books"))
+
+        # user, categories, books of the shelves
+        self.assertEqual(response["X-DB-Query-Count"], "3")
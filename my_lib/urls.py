@@ -15,13 +15,26 @@ Including another URLconf
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, re_path, include
 from django.conf import settings
-from django.conf.urls.static import static
+
+from library.views import serve_media
+
+import re
 
 urlpatterns = [
     path('admin/', admin.site.urls),
 
     path("", include("users.urls")),
+    # async versions of the read-only library views for ASGI, before
+    # library.urls, "async" is a reserved category name
+    path("async/", include("library.async_urls")),
     path("", include("library.urls")),
-] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+]
+
+if settings.DEBUG:
+    # the same as django.conf.urls.static.static(), but without book files,
+    # they are served only by library.views.download_book that checks the access
+    urlpatterns += [
+        re_path(r"^%s(?P<path>.*)$" % re.escape(settings.MEDIA_URL.lstrip("/")), serve_media),
+    ]
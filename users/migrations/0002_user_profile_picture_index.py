@@ -0,0 +1,19 @@
+# Generated by Django 4.2.30 on 2026-10-18 06:18
+
+from django.db import migrations, models
+import users.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='user',
+            name='profile_picture',
+            field=models.ImageField(blank=True, db_index=True, default=None, help_text='profile picture', max_length=255, null=True, upload_to=users.models.User.get_profile_picture_upload_path, verbose_name='profile picture'),
+        ),
+    ]
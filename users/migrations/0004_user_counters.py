@@ -0,0 +1,33 @@
+# Generated by Django 4.2.30 on 2026-10-18 06:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0003_user_listed_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='books_count',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text="number of books in the user's library", verbose_name='books count'),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='finished_books_count',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='number of books the user has finished', verbose_name='finished books count'),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='followers_count',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='number of users following this user', verbose_name='followers count'),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='following_count',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='number of users this user follows', verbose_name='following count'),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 4.2.30 on 2026-10-18 08:06
+
+from django.db import migrations, models
+
+import hashlib
+
+
+def digest_profile_pictures(apps, schema_editor):
+    '''The stored profile pictures get their content hash, the missing files keep ""'''
+    User = apps.get_model("users", "User")
+
+    stored = User.objects.exclude(profile_picture="").exclude(profile_picture=None).values_list("pk", "profile_picture")
+    # the rows are updated while they are read, so they are fetched first
+    for pk, name in list(stored):
+        field_file = User(pk=pk, profile_picture=name).profile_picture
+        digest = hashlib.sha256()
+        try:
+            with field_file.open("rb") as file:
+                for chunk in file.chunks():
+                    digest.update(chunk)
+        except FileNotFoundError:
+            continue
+
+        User.objects.filter(pk=pk, profile_picture=name).update(profile_picture_digest=digest.hexdigest())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0004_user_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='profile_picture_digest',
+            field=models.CharField(blank=True, default='', editable=False, max_length=64),
+        ),
+        migrations.RunPython(digest_profile_pictures, migrations.RunPython.noop),
+    ]
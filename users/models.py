@@ -73,7 +73,11 @@ class User(AbstractBaseUser, PermissionsMixin):
         blank=True,
         null=True,
         default=None,
+        # referenced files lookups of library.media
+        db_index=True,
     )
+    # sha256 of the profile picture, set when it is saved, see library.thumbnails
+    profile_picture_digest = models.CharField(max_length=64, blank=True, default="", editable=False)
 
     # library_groups            from library.models.Book
 
@@ -83,6 +87,33 @@ class User(AbstractBaseUser, PermissionsMixin):
     # books                     from library.Book model
     # book_catagories     from library.models.Book
 
+    # counters of the related rows, kept up to date by library.counters,
+    # so showing them needs no COUNT(*)
+    followers_count = models.PositiveIntegerField(
+        verbose_name="followers count",
+        help_text="number of users following this user",
+        default=0,
+        editable=False,
+    )
+    following_count = models.PositiveIntegerField(
+        verbose_name="following count",
+        help_text="number of users this user follows",
+        default=0,
+        editable=False,
+    )
+    books_count = models.PositiveIntegerField(
+        verbose_name="books count",
+        help_text="number of books in the user's library",
+        default=0,
+        editable=False,
+    )
+    finished_books_count = models.PositiveIntegerField(
+        verbose_name="finished books count",
+        help_text="number of books the user has finished",
+        default=0,
+        editable=False,
+    )
+
     to_show = models.BooleanField(
         verbose_name="to show",
         help_text="if this flag is set to False "
@@ -100,6 +131,16 @@ class User(AbstractBaseUser, PermissionsMixin):
 
     objects = UserManager()
 
+    class Meta:
+        indexes = [
+            # users directory(library.directory) lists only these users
+            models.Index(
+                fields=["username"],
+                condition=models.Q(to_show=True, is_active=True),
+                name="users_user_listed_idx",
+            ),
+        ]
+
     def __str__(self):
         return self.username
 
@@ -0,0 +1,31 @@
+from django.test import TestCase
+from django.urls import reverse
+
+from users.models import User
+from utils import QueryBudgetTestUtils
+
+
+class LoginViewTest(TestCase, QueryBudgetTestUtils):
+    @classmethod
+    def setUpTestData(cls):
+        User.objects.create_user(
+            username="loginuser",
+            email="loginuser@gmail.com",
+            password="password1",
+        )
+
+    def test_login_page_makes_no_queries(self):
+        with self.assertMaxQueries(0):
+            response = self.client.get(reverse("login"))
+
+        self.assertEqual(response.status_code, 200)
+
+    def test_login_query_budget(self):
+        # user, last_login update, session creation and update
+        # and the savepoints of the session writes
+        with self.assertMaxQueries(9):
+            response = self.client.post(
+                reverse("login"), {"username": "loginuser", "password": "password1"}
+            )
+
+        self.assertEqual(response.status_code, 302)
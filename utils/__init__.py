@@ -1,6 +1,9 @@
 from django.db.models.fields import CharField, TextField, EmailField
 from django.core.exceptions import ValidationError
 
+from my_lib.middleware import QueryStats
+
+from contextlib import contextmanager
 from sys import _getframe
 
 
@@ -124,3 +127,24 @@ class ModelTestUtils():
                 field_name=field,
                 length=max_length
             )
+
+
+class QueryBudgetTestUtils():
+    '''Adds assertMaxQueries to TestCase.
+
+    Unlike TestCase.assertNumQueries it checks that the number of queries
+    is not bigger than the budget, so a view can become cheaper without
+    breaking its tests'''
+
+    @contextmanager
+    def assertMaxQueries(self, budget):
+        stats = QueryStats(keep_queries=True)
+        with stats.track():
+            yield stats
+
+        self.assertLessEqual(
+            stats.count,
+            budget,
+            f"{stats.count} queries executed, budget is {budget}. Queries:\n"
+            + "\n".join(f"{i}. {sql}" for i, sql in enumerate(stats.queries, start=1)),
+        )